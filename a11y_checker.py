@@ -1,6 +1,20 @@
-import os, sys, re
-from github import Github
+import os, sys, re, threading, time
+import requests
+from crew.github_client import GitHubClient
+from crew.ollama_runtime import OllamaError, ensure_ollama
+from crew.tracing import enable_tracing, run_traced, span
 from crew.rule_validation import validate_rule, PRSchema
+from crew.rule_engine import RuleOutcome, evaluate_rules
+from crew.comment_reporter import CommentReporter
+from crew.diff_routing import DiffRouter
+from crew.diff_stream import DiffStreamStats, iter_diff
+from crew.diff_provider import get_diff_provider
+from crew.verdict import Verdict
+from crew.result_cache import get_result_cache
+from crew.ui_signals import preclassifier_stats
+from crew.prompt_budget import PromptBudget, count_tokens
+from crew.batch_validation import BatchEvaluator, cache_modes, get_batch_size, plan_batches
+from crew.review_state import ReviewState, RuleState, find_review_state, is_incremental, rule_key
 from dataclasses import dataclass, field
 
 @dataclass
@@ -8,10 +22,9 @@ class CheckListItem:
     text: str
     type: str
 
-def read_markdown_file(repo, branch, file_path):
+def read_markdown_file(provider, branch, file_path):
     try:
-        file_content = repo.get_contents(file_path, ref=branch)
-        return file_content.decoded_content.decode('utf-8')
+        return provider.read_file(branch, file_path)
     except Exception as e:
         print(f"Error reading markdown file: {e}")
         return None
@@ -33,27 +46,38 @@ def parse_checklist_items(content) -> list[CheckListItem]:
 
     return checklist_items
 
-def get_diff(repo, base_branch, compare_branch):
+def get_diff(provider, base_branch, compare_branch):
     # return as a list of tuples
     try:
-        comparison = repo.compare(base_branch, compare_branch)
         diffs = []
-        for file in comparison.files:
-            if file.patch:
-                diffs.append((file.filename, file.patch))
-                #diffs.append(f"Filename: {file.filename}\nDiff:\n{file.patch}\n")
+        for filename, patch in provider.iter_files(base_branch, compare_branch):
+            if patch:
+                diffs.append((filename, patch))
+                #diffs.append(f"Filename: {filename}\nDiff:\n{patch}\n")
         #return "\n".join(diffs)
         return diffs
     except Exception as e:
         print(f"Error getting diff: {e}")
         return None
 
-def post_comment(pr, comment_body):
+def stream_diff(provider, base_branch, compare_branch, stats):
+    # yields (filename, patch) pairs file by file, see crew.diff_stream.iter_diff
     try:
-        pr.create_issue_comment(body=comment_body)
-        print("Comment posted on the PR.")
+        yield from iter_diff(provider.iter_files(base_branch, compare_branch), stats)
     except Exception as e:
-        print(f"Error posting comment: {e}")
+        print(f"Error getting diff: {e}")
+
+def get_incremental_diff(provider, last_sha, head_sha):
+    # returns the diff of the commits pushed since last_sha, or None when a full review is needed
+    try:
+        incremental_diff = provider.incremental_diff(last_sha, head_sha)
+        # a force-push or rebase makes the last reviewed commit diverge from the new head
+        if incremental_diff is None:
+            print(f"Last reviewed commit {last_sha} is not an ancestor of {head_sha}, running a full review")
+        return incremental_diff
+    except Exception as e:
+        print(f"Error getting incremental diff: {e}")
+        return None
 
 def escape_text(text):
     # Enclose spaces and underscores in braces
@@ -73,86 +97,33 @@ def animated_rule(type="success",rule="",score=100,speed=3000):
         return f"[![{rule}](https://readme-typing-svg.demolab.com?font=Fira+Code&size=12&duration={speed}&pause=1500&color=FF5F15&repeat=true&random=false&width=550&height=18&lines=-+%E2%9D%8C+{escaped_text}+(score+{score}%2F100))](https://github.com/puntorigen/pr-rules)"
     return f"[![{rule}](https://readme-typing-svg.demolab.com?font=Fira+Code&size=12&duration={speed}&pause=1500&color=FF0000&repeat=true&random=false&width=550&height=18&lines=-+%E2%9D%8C+{escaped_text}+(score+{score}%2F100))](https://github.com/puntorigen/pr-rules)"
 
-def main():
-    # test inputs source
-    rules_file_path = os.getenv('FILE_PATH')
-    # Get inputs from args if rules_file_path is not set
-    if not rules_file_path:
-        token = sys.argv[1]
-        rules_file_path = sys.argv[2]
-        openai_api_key = sys.argv[3] if len(sys.argv) > 3 else None
-    else:
-        # get from environment variables
-        token = os.getenv('GITHUB_TOKEN')
-        openai_api_key = os.getenv('OPENAI_API_KEY')
-
-    # set OpenAI api key or install & use Ollama
-    if openai_api_key:
-        os.environ["LLM_TYPE"] = "openai"
-        os.environ["OPENAI_API_KEY"] = openai_api_key
-        os.environ["OPENAI_MODEL_NAME"] = "gpt-4" # the best model for these tasks
-    else:
-        os.environ["LLM_TYPE"] = "ollama"
-        os.environ["OPENAI_API_BASE"] = "http://127.0.0.1:11434" # Ollama API base URL; use docker instance name inside actions
-        os.environ["OPENAI_API_KEY"] = "ollama"
-        #os.environ["OPENAI_MODEL_NAME"] = "phi3:3.8b-mini-128k-instruct-q8_0"
-
-    # GitHub repository details from environment variables
-    repository = os.getenv('GITHUB_REPOSITORY')
-    ref = os.getenv('GITHUB_REF')
-    pull_number = ref.split('/')[-2]
-    owner, repo_name = repository.split('/')
-
-    # Initialize GitHub API
-    g = Github(token)
-    repo = g.get_repo(f"{owner}/{repo_name}")
-
-    # Get the pull request details
-    pr = repo.get_pull(int(pull_number))
-    base_branch = pr.base.ref
-    compare_branch = pr.head.ref
-
-    # Read rules from markdown file
-    rules_content = read_markdown_file(repo, base_branch, rules_file_path)
-    if rules_content is None:
-        print("Failed to read the rules file. Exiting.")
-        return
-
-    checklist_items = parse_checklist_items(rules_content)
-
-    # Get the diff of the modified files between the base branch and the compare branch
-    print(f"Getting diff between {base_branch} and {compare_branch}...")
-    diff = get_diff(repo, base_branch, compare_branch)
-
+def build_comment(outcomes, ollama=False, notes=None):
     # Build comment content
     comment_content = "# PR Rules Checklist\n"
-    if not openai_api_key:
+    if ollama:
         comment_content += "(ollama version)\n\n"
     comment_content += "\n"
 
     processed_items_count = 0
-    for rule in checklist_items:
-        print(f"------------------------------")
-        print(f"Checking rule: {rule.text}")
-
-        llm_response = validate_rule(PRSchema(
-            title = pr.title,
-            body = pr.body,
-            files_diff = diff
-        ), rule.text)
-
-        print(f"LLM Crew Response received for rule: {rule.text}", llm_response)
+    pending_items = []
+    for outcome in outcomes:
+        rule, llm_response = outcome.rule, outcome.response
+        if not outcome.evaluated:
+            pending_items.append(rule)
+            continue
+        # label verdicts that were not produced by the LLM in this run (e.g. cached)
+        text = f"{rule.text} ({notes[rule.text]})" if notes and rule.text in notes else rule.text
 
         if llm_response.complies:
             #comment_content += f"- ✅ {color_text(rule, 'ForestGreen')} (score: {llm_response.score}/100)\n"
-            comment_content += animated_rule("success",rule.text,llm_response.score,3000+(processed_items_count*500))
+            comment_content += animated_rule("success",text,llm_response.score,3000+(processed_items_count*500))
         else:
             #comment_content += f"- ❌ {color_text(rule, 'Red')} (score: {llm_response.score}/100)\n"
             if rule.type == 'mandatory':
-                comment_content += animated_rule("failure",rule.text,llm_response.score,3000+(processed_items_count*500))
+                comment_content += animated_rule("failure",text,llm_response.score,3000+(processed_items_count*500))
                 comment_content += "\n- **Reason for failure:**\n"
             else:
-                comment_content += animated_rule("warning",rule.text,llm_response.score,3000+(processed_items_count*500))
+                comment_content += animated_rule("warning",text,llm_response.score,3000+(processed_items_count*500))
                 comment_content += "\n- **Reason for warning:**\n"
             for reasoning in llm_response.affected_sections or []:
                 if reasoning.file:
@@ -168,25 +139,285 @@ def main():
                 #    comment_content += f"  - **Example Code Improvements:**\n"
                 #    for fix in reasoning.example_fix:
                 #        comment_content += f"    - {fix}\n"
-            # Stop processing further rules on failure, only if rule.type is mandatory
-            if rule.type == 'mandatory':
-                break  
         processed_items_count += 1
 
-    # Add remaining unchecked items
-    remaining_items = checklist_items[processed_items_count+1:]
+    # Add remaining unchecked items (not reached, cancelled or timed out)
     comment_content += "\n"
-    for rule in remaining_items:
-        comment_content += animated_rule("pending",rule.text,100,3000) + "\n"
-        #comment_content += f"- [ ] {rule}\n" 
+    for rule in pending_items:
+        text = f"{rule.text} ({notes[rule.text]})" if notes and rule.text in notes else rule.text
+        comment_content += animated_rule("pending",text,100,3000) + "\n"
+        #comment_content += f"- [ ] {rule}\n"
+
+    return comment_content
+
+# note of the rules left unchecked because the PR has no changes that could be reviewed for them
+NO_REVIEWABLE_CHANGES = "no reviewable changes"
+
+@dataclass
+class ReviewResult:
+    """Summary of the review of one PR"""
+    repository: str
+    number: int
+    rules: int = 0
+    evaluated: int = 0
+    failed_mandatory: int = 0
+    pending: int = 0  # not reached, cancelled, timed out or over the token budget
+    skipped: int = 0  # no reviewable changes for the rule
+    cached: int = 0
+    carried: int = 0
+    seconds: float = 0.0
+    error: str = ""
+
+def configure_llm(openai_api_key):
+    # set OpenAI api key or install & use Ollama
+    if openai_api_key:
+        os.environ["LLM_TYPE"] = "openai"
+        os.environ["OPENAI_API_KEY"] = openai_api_key
+        os.environ["OPENAI_MODEL_NAME"] = "gpt-4" # the best model for these tasks
+    else:
+        os.environ["LLM_TYPE"] = "ollama"
+        os.environ["OPENAI_API_BASE"] = "http://127.0.0.1:11434" # Ollama API base URL; use docker instance name inside actions
+        os.environ["OPENAI_API_KEY"] = "ollama"
+        #os.environ["OPENAI_MODEL_NAME"] = "phi3:3.8b-mini-128k-instruct-q8_0"
+        # reuse or start the server, pull the model if needed and load it before the first rule
+        try:
+            ensure_ollama()
+        except (OllamaError, requests.RequestException) as e:
+            print(f"Error preparing the local model: {e}")
+
+class ReviewCancelled(Exception):
+    """The review was superseded (e.g. by a newer push to the PR) and stopped"""
+
+def review_pr(repo, pr, rules_file_path, ollama=False, cache=None, provider=None, cancel=None):
+    """
+    Review one PR against the rules file and post (or update) its comment.
+
+    The result cache and the diff provider can be passed in so several reviews share them
+    (see batch_review.py); by default the provider is chosen with A11Y_DIFF_SOURCE. When the
+    cancel event (a threading.Event) is set, the rules not started yet are skipped and the
+    final comment is left to the review that superseded this one.
+    Returns a ReviewResult, or None when the rules file can't be read.
+    """
+    with span("review", repository=repo.full_name, pr=pr.number):
+        return _review_pr(repo, pr, rules_file_path, ollama, cache, provider, cancel)
+
+def _review_pr(repo, pr, rules_file_path, ollama, cache, provider, cancel):
+    started = time.perf_counter()
+    # The diff and the rules file come from the local checkout or the GitHub API (A11Y_DIFF_SOURCE)
+    if provider is None:
+        provider = get_diff_provider(repo, pr)
+    base_branch, compare_branch = provider.refs(pr)
+
+    # Read rules from markdown file
+    with span("rules.fetch", "io"):
+        rules_content = read_markdown_file(provider, base_branch, rules_file_path)
+    if rules_content is None:
+        print("Failed to read the rules file. Exiting.")
+        return None
+
+    checklist_items = parse_checklist_items(rules_content)
+
+    # In incremental mode, carry forward the verdicts of rules not affected by the commits since the last review
+    head_sha = pr.head.sha
+    state = ReviewState(head_sha=head_sha)
+    carried = {}
+    previous_state = find_review_state(pr) if is_incremental() else None
+    if previous_state:
+        print(f"Getting diff since last reviewed commit {previous_state.head_sha}...")
+        incremental_diff = get_incremental_diff(provider, previous_state.head_sha, head_sha)
+        if incremental_diff is not None:
+            carried = previous_state.carry_forward(checklist_items, incremental_diff)
+            print(f"Carrying forward {len(carried)} of {len(checklist_items)} rule verdicts")
+
+    # Stream the diff of the modified files between the base branch and the compare branch
+    diff = []
+    diff_stats = DiffStreamStats()
+    if len(carried) < len(checklist_items):
+        print(f"Getting diff between {base_branch} and {compare_branch}...")
+        diff = stream_diff(provider, base_branch, compare_branch, diff_stats)
+
+    # Split the diff into shards and only send each rule the files that could matter to it
+    with span("diff.fetch", "io") as fetch:
+        router = DiffRouter(diff)
+        fetch.set(files=diff_stats.files_seen, tokens_in=diff_stats.tokens)
+    print(f"Diff: {diff_stats.files_seen} files, {diff_stats.files_yielded} kept (~{diff_stats.tokens} tokens)")
+    # Strip noise from the routed patches and fit them to the model's token budget
+    budget = PromptBudget()
+    reserved_tokens = count_tokens(f"{pr.title}\n{pr.body}")
+    # Reuse verdicts for rules whose relevant patches were already reviewed
+    diffs = {}
+    cached_verdicts = {}
+    with span("diff.route") as routing:
+        for rule in checklist_items:
+            if rule.text in carried:
+                continue
+            diffs[rule.text] = budget.fit(rule.text, router.route(rule.text), reserved_tokens)
+            if diffs[rule.text] and cache and (cached := cache.get(rule.text, diffs[rule.text], cache_modes())):
+                cached_verdicts[rule.text] = cached
+        routing.set(rules=len(diffs), cache_hits=len(cached_verdicts))
+
+    def validate_single(rule_text, files_diff):
+        with span("llm.validate_rule", "llm", rule=rule_text) as call:
+            response = validate_rule(PRSchema(
+                title = pr.title,
+                body = pr.body,
+                files_diff = files_diff
+            ), rule_text)
+            # the prompt itself is built by the crew; count what we send and get back
+            call.set(tokens_in=reserved_tokens + count_tokens(rule_text) + sum(count_tokens(patch) for _, patch in files_diff),
+                     tokens_out=count_tokens(Verdict.from_response(response).model_dump_json()))
+            return response
+
+    # Rules left for the LLM are evaluated a few at a time over their merged diff (A11Y_BATCH_SIZE)
+    llm_rules = [(text, files_diff) for text, files_diff in diffs.items() if files_diff and text not in cached_verdicts]
+    batcher = BatchEvaluator(
+        pr.title, pr.body, diffs, plan_batches(llm_rules, get_batch_size(), budget.budget - reserved_tokens),
+        validate_single=validate_single
+    )
+    notes = {}
+    record_lock = threading.Lock()
+
+    def record(abandoned, rule_text, note=None, rule_state=None) -> bool:
+        # a timed-out or discarded rule keeps running in its thread; drop what it finds afterwards
+        with record_lock:
+            if abandoned.is_set():
+                return False
+            if note:
+                notes[rule_text] = note
+            if rule_state:
+                state.rules[rule_key(rule_text)] = rule_state
+            return True
+
+    def evaluate(rule, abandoned):
+        if cancel is not None and cancel.is_set():
+            raise ReviewCancelled("superseded")
+        if abandoned.is_set():
+            # discarded before a worker got to it: don't spend an LLM call on it
+            return None
+        with span("rule", rule=rule.text) as rule_span:
+            if rule.text in carried:
+                record(abandoned, rule.text, "carried forward", carried[rule.text])
+                rule_span.set(source="carried", cache_hits=1)
+                return carried[rule.text].verdict
+            print(f"Checking rule: {rule.text}")
+            files_diff = diffs[rule.text]
+            if budget.over_budget(rule.text):
+                # related changes exist but none fit the budget: the rule stays pending, it doesn't pass
+                print(f"Changes related to rule don't fit the token budget: {rule.text}")
+                record(abandoned, rule.text, "over the token budget")
+                rule_span.set(source="over budget")
+                return None
+            if not files_diff:
+                # nothing reviewable (only lockfiles, server code, excluded or whitespace-only files):
+                # the rule is reported as not checked rather than as passing
+                print(f"No reviewable changes for rule: {rule.text}")
+                record(abandoned, rule.text, NO_REVIEWABLE_CHANGES)
+                rule_span.set(source="no changes")
+                return None
+            if rule.text in cached_verdicts:
+                print(f"Using cached verdict for rule: {rule.text}")
+                llm_response = cached_verdicts[rule.text]
+                record(abandoned, rule.text, "cached", RuleState.create(files_diff, llm_response))
+                rule_span.set(source="cached", cache_hits=1)
+            else:
+                llm_response = batcher.evaluate(rule.text)
+                print(f"LLM Crew Response received for rule: {rule.text}", llm_response)
+                rule_span.set(source="llm")
+                if record(abandoned, rule.text, rule_state=RuleState.create(files_diff, llm_response)) and cache:
+                    cache.set(rule.text, files_diff, llm_response, batcher.mode(rule.text))
+            return llm_response
+
+    # Keep a single bot comment on the PR, updated as the verdicts arrive
+    reporter = CommentReporter(pr)
+    finished = {}
+
+    def report_progress(outcome=None):
+        if outcome is not None:
+            finished[outcome.index] = outcome
+        progress = [finished.get(i) or RuleOutcome(index=i, rule=rule) for i, rule in enumerate(checklist_items)]
+        body = build_comment(progress, ollama=ollama, notes=notes)
+        body += f"\n_Checked {len(finished)} of {len(checklist_items)} rules, this comment is updated as the review progresses..._\n"
+        reporter.update(body)
 
-    # Post the comment on the PR
-    post_comment(pr, comment_content)
+    report_progress()
+    outcomes = evaluate_rules(checklist_items, evaluate, on_result=report_progress)
+    if cancel is not None and cancel.is_set():
+        reporter.cancel()
+        print(f"Review of {repo.full_name}#{pr.number} superseded, not posting its results")
+        return ReviewResult(repository=repo.full_name, number=pr.number, rules=len(checklist_items),
+                            seconds=time.perf_counter() - started, error="superseded")
+    comment_content = build_comment(outcomes, ollama=ollama, notes=notes)
+    comment_content += router.report()
+    comment_content += diff_stats.report()
+    comment_content += budget.report()
+    # only keep the state of rules that made it into the comment (not cancelled or timed out)
+    evaluated_keys = {rule_key(outcome.rule.text) for outcome in outcomes if outcome.evaluated}
+    with record_lock:
+        state.rules = {key: rule_state for key, rule_state in state.rules.items() if key in evaluated_keys}
+    comment_content += state.to_marker()
+
+    # Replace the progress with the final results
+    reporter.finish(comment_content)
+    if sum(preclassifier_stats.counts.values()):
+        print(preclassifier_stats.summary())
+    print(budget.summary())
+    if get_batch_size() > 1:
+        print(batcher.summary())
+
+    return ReviewResult(
+        repository=repo.full_name,
+        number=pr.number,
+        rules=len(checklist_items),
+        evaluated=sum(1 for outcome in outcomes if outcome.evaluated),
+        failed_mandatory=sum(1 for outcome in outcomes if outcome.failed_mandatory),
+        pending=sum(1 for outcome in outcomes if not outcome.evaluated and notes.get(outcome.rule.text) != NO_REVIEWABLE_CHANGES),
+        skipped=sum(1 for outcome in outcomes if not outcome.evaluated and notes.get(outcome.rule.text) == NO_REVIEWABLE_CHANGES),
+        cached=len(cached_verdicts),
+        carried=len(carried),
+        seconds=time.perf_counter() - started
+    )
+
+def main():
+    # test inputs source
+    rules_file_path = os.getenv('FILE_PATH')
+    # Get inputs from args if rules_file_path is not set
+    if not rules_file_path:
+        token = sys.argv[1]
+        rules_file_path = sys.argv[2]
+        openai_api_key = sys.argv[3] if len(sys.argv) > 3 else None
+    else:
+        # get from environment variables
+        token = os.getenv('GITHUB_TOKEN')
+        openai_api_key = os.getenv('OPENAI_API_KEY')
+
+    configure_llm(openai_api_key)
+
+    # GitHub repository details from environment variables
+    repository = os.getenv('GITHUB_REPOSITORY')
+    ref = os.getenv('GITHUB_REF')
+    pull_number = ref.split('/')[-2]
+    owner, repo_name = repository.split('/')
+
+    # Initialize GitHub API (pooled session, ETag revalidation and rate limit aware retries)
+    github = GitHubClient(token)
+    repo = github.get_repo(f"{owner}/{repo_name}")
+
+    # Get the pull request details
+    pr = repo.get_pull(int(pull_number))
+
+    result = review_pr(repo, pr, rules_file_path, ollama=not openai_api_key, cache=get_result_cache())
+    print(github.metrics.summary())
+    if result is None:
+        return
 
     # Fail the action if we have any remaining rules to check and we are not ollama
-    if remaining_items and openai_api_key:
+    if result.pending and openai_api_key:
         sys.exit(1)
-    #if not llm_response.complies:
 
 if __name__ == "__main__":
-    main()
+    # --profile wraps the run in cProfile; A11Y_TRACE=<file> writes a Chrome trace of its stages
+    profile = "--profile" in sys.argv
+    if profile:
+        sys.argv.remove("--profile")
+        enable_tracing()
+    run_traced(main, profile_path=os.getenv("A11Y_PROFILE_PATH", "a11y_checker.prof") if profile else None)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Review many PRs, across repositories, in one process.
+
+PRs are given as owner/repo#123 (or a PR URL), read from a file, or found with a GitHub search
+query. They are reviewed a few at a time, sharing one GitHub client (one connection pool, ETag
+cache and rate limit budget), one LLM configuration, one guideline index and one verdict
+cache, so only the first review pays for loading them. Each PR gets its usual comment; a
+summary per PR and the aggregate throughput are printed at the end.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+from a11y_checker import ReviewResult, configure_llm, review_pr
+from crew.diff_provider import GitHubDiffProvider
+from crew.github_client import GitHubClient
+from crew.result_cache import get_result_cache
+from crew.tracing import enable_tracing, run_traced
+
+PR_ID = re.compile(r"^(?:https://github\.com/)?([\w.-]+/[\w.-]+)(?:#|/pull/)(\d+)/?$")
+
+def parse_pr_id(value: str) -> Tuple[str, int]:
+    """Parse owner/repo#123, owner/repo/pull/123 or https://github.com/owner/repo/pull/123"""
+    match = PR_ID.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid PR id '{value}', expected owner/repo#number")
+    return match.group(1), int(match.group(2))
+
+def search_prs(github: GitHubClient, query: str, limit: Optional[int] = None) -> Iterator[Tuple[str, int]]:
+    """Open PRs matching a GitHub search query, e.g. 'org:my-org label:frontend'"""
+    if "is:pr" not in query:
+        query += " is:pr"
+    if "is:open" not in query and "is:closed" not in query and "is:merged" not in query:
+        query += " is:open"
+    for item in github.search_issues(query, limit):
+        yield item["repository_url"].split("/repos/", 1)[1], item["number"]
+
+def warm_up():
+    """Load the guideline index once, before the reviews start sharing it"""
+    started = time.perf_counter()
+    try:
+        from crew.wcag_rag import get_vector_store
+        store = get_vector_store()
+        store.open()
+        store.lexical
+    except Exception as e:
+        # the reviews load it on first use instead
+        print(f"Could not preload the guideline index: {e}")
+        return
+    print(f"Guideline index loaded in {time.perf_counter() - started:.1f}s")
+
+def review_one(github: GitHubClient, repository: str, number: int, rules_file_path: str, ollama: bool, cache) -> ReviewResult:
+    started = time.perf_counter()
+    try:
+        repo = github.get_repo(repository)
+        pr = repo.get_pull(number)
+        # each PR lives in another repository, so the diff always comes from the GitHub API
+        result = review_pr(repo, pr, rules_file_path, ollama=ollama, cache=cache, provider=GitHubDiffProvider(repo, pr))
+        if result is None:
+            result = ReviewResult(repository=repository, number=number, error=f"could not read {rules_file_path}")
+    except Exception as e:
+        print(f"Error reviewing {repository}#{number}: {e}")
+        result = ReviewResult(repository=repository, number=number, error=str(e))
+    result.seconds = time.perf_counter() - started
+    return result
+
+def summary(results: List[ReviewResult], seconds: float) -> str:
+    lines = [f"{'PR':<50} {'rules':>5} {'checked':>7} {'failed':>6} {'pending':>7} {'skipped':>7} {'cached':>6} {'time':>8}"]
+    for result in results:
+        name = f"{result.repository}#{result.number}"
+        if result.error:
+            lines.append(f"{name:<50} error: {result.error}")
+            continue
+        lines.append(f"{name:<50} {result.rules:>5} {result.evaluated:>7} {result.failed_mandatory:>6} "
+                     f"{result.pending:>7} {result.skipped:>7} {result.cached:>6} {result.seconds:>7.1f}s")
+    reviewed = [result for result in results if not result.error]
+    rules = sum(result.evaluated for result in reviewed)
+    minutes = max(seconds, 1e-9) / 60
+    lines.append(f"{len(reviewed)} of {len(results)} PR(s) reviewed in {seconds:.1f}s: "
+                 f"{len(reviewed) / minutes:.1f} PRs/min, {rules / minutes:.1f} rules/min")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Review many PRs in one process")
+    parser.add_argument("prs", nargs="*", help="owner/repo#number or PR URL")
+    parser.add_argument("--file", help="file with one PR id per line")
+    parser.add_argument("--search", help="GitHub search query for open PRs, e.g. 'org:my-org'")
+    parser.add_argument("--limit", type=int, help="maximum number of PRs taken from the search")
+    parser.add_argument("--rules-file", default=os.getenv("FILE_PATH"), help="rules file, read from each PR's base branch")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("A11Y_BATCH_WORKERS", "2")),
+                        help="PRs reviewed at the same time (each evaluates A11Y_CONCURRENCY rules at once)")
+    parser.add_argument("--json", help="write the per-PR results to this file")
+    args = parser.parse_args(argv)
+
+    # Load environment variables from .env file
+    load_dotenv()
+    if not args.rules_file:
+        parser.error("--rules-file (or FILE_PATH) is required")
+    token = os.getenv("GITHUB_TOKEN")
+    if not token:
+        raise ValueError("GITHUB_TOKEN not found in environment variables")
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+
+    github = GitHubClient(token)
+    targets = [parse_pr_id(value) for value in args.prs]
+    if args.file:
+        with open(args.file) as f:
+            targets.extend(parse_pr_id(line) for line in f if line.strip() and not line.startswith("#"))
+    if args.search:
+        targets.extend(search_prs(github, args.search, args.limit))
+    # the same PR given twice is reviewed once
+    targets = list(dict.fromkeys(targets))
+    if not targets:
+        parser.error("no PRs to review")
+    print(f"Reviewing {len(targets)} PR(s), {args.workers} at a time")
+
+    # State shared by every review
+    configure_llm(openai_api_key)
+    cache = get_result_cache()
+    warm_up()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        results = list(executor.map(
+            lambda target: review_one(github, target[0], target[1], args.rules_file, not openai_api_key, cache), targets
+        ))
+    seconds = time.perf_counter() - started
+
+    print(summary(results, seconds))
+    if cache:
+        print(f"Verdict cache: {cache.hits} hit(s), {cache.misses} miss(es)")
+    print(github.metrics.summary())
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([asdict(result) for result in results], f, indent=2)
+    return 1 if any(result.error for result in results) else 0
+
+if __name__ == "__main__":
+    # --profile wraps the run in cProfile; A11Y_TRACE=<file> writes a Chrome trace of its stages
+    profile = "--profile" in sys.argv
+    if profile:
+        sys.argv.remove("--profile")
+        enable_tracing()
+    sys.exit(run_traced(main, profile_path=os.getenv("A11Y_PROFILE_PATH", "batch_review.prof") if profile else None))
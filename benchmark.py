@@ -0,0 +1,731 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the WCAG retrieval pipeline, and a replay of recorded PRs through the
+whole review (`replay`) that fails when a stage regresses against benchmarks/baseline.json.
+
+Runs offline: embeddings and LLM answers are produced by deterministic fake models with a
+configurable per-request latency, so the numbers reflect the number of round trips and the
+local work.
+"""
+
+import argparse
+import contextlib
+import functools
+import hashlib
+import json
+import math
+import os
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import multiprocessing
+from crew.diff_provider import DiffProvider
+from crew.diff_routing import DiffRouter
+from crew.diff_stream import DiffStreamStats, iter_diff
+from crew.review_state import DEFAULT_BOT_LOGIN
+from crew.tracing import enable_tracing, get_tracer, span
+
+# measure the embedding round trips themselves, not the embedding cache
+os.environ.setdefault("A11Y_EMBEDDING_CACHE", "off")
+
+SAMPLE_DESCRIPTIONS = [
+    "Adds an image to the product card without alternative text",
+    "Changes the primary button color to a light grey on white background",
+    "Adds a dropdown menu that opens on hover and has no keyboard support",
+    "Adds a signup form with inputs that only use placeholders as labels",
+    "Adds an autoplaying promotional video without captions",
+    "Replaces headings with styled div elements",
+    "Adds aria-live region for status messages after saving",
+    "Adds a carousel that auto-advances every three seconds",
+    "Reduces the size of the close icon button to 16 pixels",
+    "Adds a modal dialog that does not trap or restore focus",
+]
+
+class FakeEmbeddings:
+    """Deterministic bag-of-words embeddings with a simulated per-request latency"""
+    def __init__(self, dimensions: int = 256, latency: float = 0.05):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.requests = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in re.findall(r"[a-z0-9]+", text.lower()):
+            bucket = int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16) % self.dimensions
+            vector[bucket] += 1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def build_store(embeddings: FakeEmbeddings):
+    from crew.wcag_rag import WCAGVectorStore
+    vs = WCAGVectorStore(persist_directory=tempfile.mkdtemp(prefix="wcag_bench_"), embeddings=embeddings)
+    vs.collection  # initializes the database
+    embeddings.requests = 0
+    return vs
+
+def bench_query_many(files: int, k: int, latency: float, repeat: int):
+    """Compare one query_similar_guidelines call per file against a single query_many call"""
+    embeddings = FakeEmbeddings(latency=latency)
+    vs = build_store(embeddings)
+    texts = [SAMPLE_DESCRIPTIONS[i % len(SAMPLE_DESCRIPTIONS)] + f" in component {i}" for i in range(files)]
+
+    timings = {}
+    requests = {}
+    for name, run in (
+        ("per-item", lambda: [vs.query_similar_guidelines(text, k=k) for text in texts]),
+        ("query_many", lambda: vs.query_many(texts, k=k)),
+    ):
+        embeddings.requests = 0
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        requests[name] = embeddings.requests // repeat
+
+    print(f"{files} files, k={k}, embedding latency {latency * 1000:.0f} ms")
+    for name in timings:
+        print(f"  {name:<12} {timings[name] * 1000:9.1f} ms  {requests[name]:4d} embedding requests")
+    print(f"  speedup      {timings['per-item'] / timings['query_many']:9.1f}x")
+
+def build_artifact(embeddings: FakeEmbeddings) -> str:
+    """Build an index artifact of the shipped corpus with the fake embeddings"""
+    from crew.embedding_cache import get_model_id
+    from crew.index_artifact import build_index_artifact
+    from crew.wcag_rag import load_guidelines, _guideline_chunks
+    ids, texts, metadatas = [], [], []
+    for guideline in load_guidelines():
+        chunk_ids, chunk_texts, chunk_metadatas = _guideline_chunks(guideline)
+        ids.extend(chunk_ids)
+        texts.extend(chunk_texts)
+        metadatas.extend(chunk_metadatas)
+    path = tempfile.mkdtemp(prefix="wcag_index_bench_")
+    latency, embeddings.latency = embeddings.latency, 0
+    build_index_artifact(path, ids, texts, metadatas, embeddings.embed_documents(texts), get_model_id(embeddings))
+    embeddings.latency = latency
+    return path
+
+def bench_backends(queries: int, k: int, repeat: int, mmap: bool):
+    """Compare search latency and memory of the Chroma and NumPy retrieval backends"""
+    from crew.wcag_rag import WCAGVectorStore
+    embeddings = FakeEmbeddings(latency=0)
+    index_path = build_artifact(embeddings)
+    texts = [SAMPLE_DESCRIPTIONS[i % len(SAMPLE_DESCRIPTIONS)] + f" in component {i}" for i in range(queries)]
+    query_embeddings = embeddings.embed_documents(texts)
+    os.environ["A11Y_INDEX_MMAP"] = "true" if mmap else "false"
+
+    print(f"Shipped corpus, {queries} queries, k={k}, mmap={mmap}")
+    for name in ("chroma", "numpy"):
+        os.environ["A11Y_RETRIEVAL_BACKEND"] = name
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        tracemalloc.start()
+        start = time.perf_counter()
+        vs = WCAGVectorStore(embeddings=embeddings, index_path=index_path)
+        backend = vs.backend
+        load_time = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+        single = min(_timed(lambda: [backend.search([vector], k) for vector in query_embeddings]) for _ in range(repeat))
+        batch = min(_timed(lambda: backend.search(query_embeddings, k)) for _ in range(repeat))
+        print(f"  {name:<7} load {load_time * 1000:8.1f} ms  "
+              f"per-query {single / queries * 1e6:8.1f} us  batch {batch * 1000:8.2f} ms  "
+              f"python peak {peak / 1024:8.0f} KiB  max RSS growth {rss_growth:8d} KiB")
+
+def synthetic_pr(files: int, lines: int):
+    """Lazily generate the changed files of a large, mostly generated PR"""
+    kinds = ["src/components/Widget{}.tsx", "src/styles/widget{}.css", "server/handlers/handler{}.py",
+             "src/generated/schema{}.min.js", "src/components/Form{}.vue"]
+    for i in range(files):
+        filename = kinds[i % len(kinds)].format(i)
+        body = "\n".join(f"+  <div className=\"row-{i}-{j}\" aria-label=\"Row {j}\">value {j}</div>" for j in range(lines))
+        yield filename, f"@@ -0,0 +1,{lines} @@\n{body}"
+
+def _diff_pipeline(mode: str, files: int, lines: int, budget: int, result):
+    stats = DiffStreamStats()
+    start = time.perf_counter()
+    if mode == "list":
+        # the previous behaviour: every patch loaded into one list before routing
+        router = DiffRouter(list(synthetic_pr(files, lines)))
+    else:
+        router = DiffRouter(iter_diff(synthetic_pr(files, lines), stats, token_budget=budget))
+    routed = router.route("Interactive elements have accessible names")
+    result.put({
+        "seconds": time.perf_counter() - start,
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "routed_files": len(routed),
+        "over_budget": len(stats.over_budget),
+    })
+
+def bench_diff_stream(files: int, lines: int, budget: int):
+    """Peak RSS of loading a synthetic PR as a list vs streaming it under a token budget"""
+    print(f"Synthetic PR: {files} files x {lines} lines, token budget {budget}")
+    context = multiprocessing.get_context("spawn")
+    for mode in ("list", "stream"):
+        # each mode runs in a fresh process so ru_maxrss is its own peak
+        result = context.Queue()
+        process = context.Process(target=_diff_pipeline, args=(mode, files, lines, budget, result))
+        process.start()
+        stats = result.get()
+        process.join()
+        print(f"  {mode:<7} {stats['seconds'] * 1000:8.0f} ms  peak RSS {stats['max_rss_kib'] / 1024:7.1f} MiB  "
+              f"{stats['routed_files']:5d} files routed  {stats['over_budget']:5d} over budget")
+
+BENCH_RULES = [
+    "Images have alternative text",
+    "Interactive elements have accessible names",
+    "Form inputs have visible labels",
+    "Text has sufficient color contrast",
+    "All functionality is available from a keyboard",
+    "Focus is visible on interactive elements",
+    "Headings and landmarks describe the page structure",
+    "ARIA roles and attributes are valid",
+    "Animations can be paused and respect reduced motion",
+    "Touch targets are at least 24 by 24 pixels",
+    "Videos have captions",
+    "Error messages are announced to screen readers",
+]
+
+class FakeLLM:
+    """Answers rule prompts with valid JSON (batches fail at invalid_rate); latency grows with the prompt and answer size"""
+    def __init__(self, latency: float, per_token: float, invalid_rate: float = 0.0):
+        self.latency = latency
+        self.per_token = per_token
+        self.invalid_rate = invalid_rate
+        self.calls = 0
+        self.tokens = 0
+        self._lock = multiprocessing.Lock()
+
+    def predict(self, prompt: str) -> str:
+        import random
+        from crew.prompt_budget import count_tokens
+        rules = re.findall(r"^\s*(\d+)\. ", prompt.split("Rules:")[-1], re.MULTILINE)
+        answer = json.dumps({"verdicts": [
+            {"rule": int(number), "complies": True, "score": 100, "affected_sections": []} for number in rules
+        ]})
+        tokens = count_tokens(prompt) + count_tokens(answer)
+        with self._lock:
+            self.calls += 1
+            self.tokens += tokens
+        time.sleep(self.latency + tokens * self.per_token)
+        if len(rules) > 1 and random.random() < self.invalid_rate:
+            return "Sorry, I can't evaluate that."
+        return answer
+
+def synthetic_ui_pr(files: int, lines: int):
+    """Changed files of a UI PR touching images, forms, buttons and styles"""
+    snippets = ['+<img src="avatar-{i}.png">', '+<label for="field-{i}">Name</label><input id="field-{i}">',
+                '+<button onClick={{save{i}}}>Save</button>', '+<h2 className="title-{i}">Section</h2>',
+                '+<div role="alert" aria-live="polite">Saved {i}</div>']
+    for i in range(files):
+        if i % 3 == 2:
+            body = "\n".join(f"+.card-{i}-{j} {{ color: #777; background: #fff; outline: none; }}" for j in range(lines))
+            yield f"src/styles/card{i}.css", f"@@ -0,0 +1,{lines} @@\n{body}"
+        else:
+            body = "\n".join(snippets[(i + j) % len(snippets)].format(i=f"{i}-{j}") for j in range(lines))
+            yield f"src/components/Card{i}.tsx", f"@@ -0,0 +1,{lines} @@\n{body}"
+
+def bench_batch_rules(files: int, lines: int, batch_size: int, latency: float, per_token: float,
+                      invalid_rate: float, concurrency: int):
+    """Total LLM tokens and wall time of per-rule vs batched rule evaluation"""
+    from crew.batch_validation import BatchEvaluator, plan_batches, validate_rules_batch
+    from crew.prompt_budget import PromptBudget
+    from crew.rule_engine import evaluate_rules
+
+    router = DiffRouter(list(synthetic_ui_pr(files, lines)))
+    budget = PromptBudget(budget=20000)
+    diffs = {rule: budget.fit(rule, router.route(rule)) for rule in BENCH_RULES}
+    items = [(rule, files_diff) for rule, files_diff in diffs.items() if files_diff]
+    rules = [SimpleNamespace(text=rule, type="warning") for rule, _ in items]
+    title, body = "Add the widget list", "Renders the widgets of the dashboard"
+
+    print(f"{len(rules)} rules on a synthetic PR ({files} files x {lines} lines), LLM latency "
+          f"{latency * 1000:.0f} ms + {per_token * 1e6:.0f} us/token, concurrency {concurrency}")
+    for name, size in (("per-rule", 1), (f"batch={batch_size}", batch_size)):
+        llm = FakeLLM(latency, per_token, invalid_rate if size > 1 else 0.0)
+        # the single-rule path is approximated with a one-rule prompt over the same diff
+        batcher = BatchEvaluator(
+            title, body, diffs, plan_batches(items, size, budget.budget),
+            validate_single=lambda rule, files_diff: validate_rules_batch(title, body, files_diff, [rule], llm=llm)[0],
+            validate_batch=lambda *args: validate_rules_batch(*args, llm=llm),
+        )
+        start = time.perf_counter()
+        outcomes = evaluate_rules(rules, lambda rule, abandoned: batcher.evaluate(rule.text), concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+        evaluated = sum(1 for outcome in outcomes if outcome.evaluated)
+        print(f"  {name:<9} {elapsed * 1000:8.0f} ms  {llm.calls:3d} LLM calls  {llm.tokens:8d} tokens  "
+              f"{evaluated}/{len(rules)} verdicts  {batcher.fallbacks} fallback(s)")
+
+def _corpus_startup(mode: str, cache_dir: str, result):
+    start = time.perf_counter()
+    from crew.lexical import BM25Index
+    from crew.wcag_corpus import DEFAULT_WCAG_FILE, WCAGGuideline, load_corpus
+    imported = time.perf_counter()
+    if mode == "json":
+        # the previous behaviour: json.load, one pydantic object per criterion, BM25 over to_text()
+        with open(DEFAULT_WCAG_FILE) as f:
+            data = json.load(f)
+        guidelines = []
+        for guideline in data["guidelines"]:
+            ref_id, title = guideline["name"].split(" ", 1)
+            guidelines.append(WCAGGuideline(ref_id=ref_id, title=title, description=guideline["description"],
+                                            url=guideline.get("url", ""), techniques=guideline.get("techniques", []),
+                                            failures=guideline.get("failures", [])))
+        index = BM25Index.build({guideline.ref_id: guideline.to_text() for guideline in guidelines})
+    else:
+        os.environ["A11Y_CORPUS_CACHE"] = cache_dir
+        index = load_corpus(DEFAULT_WCAG_FILE).lexical
+    loaded = time.perf_counter()
+    index.search(SAMPLE_DESCRIPTIONS[0])
+    result.put({"import": imported - start, "load": loaded - imported, "total": time.perf_counter() - start})
+
+def bench_corpus(repeat: int):
+    """Cold start (imports, corpus load, first lexical query) from the JSON file vs the binary corpus cache"""
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "corpus")
+        for mode in ("json", "cache-miss", "cache"):
+            imports, loads, totals = [], [], []
+            for _ in range(1 if mode == "cache-miss" else repeat):
+                if mode == "cache-miss" and os.path.exists(cache_dir):
+                    shutil.rmtree(cache_dir)
+                # a fresh process per run, so nothing is warm but the OS page cache
+                result = context.Queue()
+                process = context.Process(target=_corpus_startup, args=("json" if mode == "json" else "corpus", cache_dir, result))
+                process.start()
+                stats = result.get()
+                process.join()
+                imports.append(stats["import"])
+                loads.append(stats["load"])
+                totals.append(stats["total"])
+            print(f"  {mode:<10} import {min(imports) * 1000:7.1f} ms  load + index {min(loads) * 1000:7.1f} ms  "
+                  f"import to first query {min(totals) * 1000:7.1f} ms")
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+REPLAY_RULES_FILE = ".github/pr-rules.md"  # path the fixture checklist is served at
+# A metric regresses when it is above its baseline by more than the tolerance, by more than
+# SPREAD_FACTOR median absolute deviations (of the baseline or of this run) and by more than
+# the floors below
+SPREAD_FACTOR = 4.0
+NOISE_MS = 1.0
+NOISE_KIB = 32.0
+# settings that change which stages run or what they cost, recorded with the baseline
+REPLAY_ENV = ("A11Y_CONCURRENCY", "A11Y_SHARD_BY", "A11Y_PROMPT_TOKEN_BUDGET", "A11Y_CONTEXT_LINES",
+              "A11Y_RETRIEVAL_MODE", "A11Y_RETRIEVAL_BACKEND", "A11Y_PRECLASSIFY", "A11Y_COMMENT_INTERVAL")
+
+def load_fixtures(directory: str) -> Dict[str, Dict]:
+    """Recorded PRs ({"title", "body", "checklist", "files": [[filename, patch], ...]}) by file name"""
+    fixtures = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name)) as f:
+                fixtures[name[:-len(".json")]] = json.load(f)
+    return fixtures
+
+class FixtureProvider(DiffProvider):
+    """Serves a recorded PR: its checklist as the rules file and its changed files, after a simulated API latency"""
+    name = "fixture"
+
+    def __init__(self, fixture: Dict, latency: float):
+        self.fixture = fixture
+        self.latency = latency
+
+    def read_file(self, ref: str, path: str) -> str:
+        time.sleep(self.latency)
+        return self.fixture["checklist"]
+
+    def iter_files(self, base: str, head: str):
+        time.sleep(self.latency)
+        for filename, patch in self.fixture["files"]:
+            yield filename, patch
+
+class _FixtureComment:
+    def __init__(self, body: str, latency: float):
+        self.user = SimpleNamespace(login=DEFAULT_BOT_LOGIN)
+        self.body = body
+        self.latency = latency
+
+    def edit(self, body: str):
+        time.sleep(self.latency)
+        self.body = body
+
+class FixturePR:
+    """The parts of a GitHub pull request a review uses; comments are kept in memory"""
+    def __init__(self, fixture: Dict, latency: float):
+        self.number = 1
+        self.title = fixture["title"]
+        self.body = fixture.get("body") or ""
+        self.base = SimpleNamespace(ref="base", sha="0" * 40)
+        self.head = SimpleNamespace(ref="head", sha="1" * 40)
+        self.latency = latency
+        self.comments: List[_FixtureComment] = []
+
+    def get_issue_comments(self):
+        time.sleep(self.latency)
+        return list(self.comments)
+
+    def create_issue_comment(self, body: str):
+        time.sleep(self.latency)
+        comment = _FixtureComment(body, self.latency)
+        self.comments.append(comment)
+        return comment
+
+class FakeDescriber:
+    """Stands in for the LLM describing a diff for retrieval: a fixed description per file, after the LLM latency"""
+    def __init__(self, llm: FakeLLM):
+        self.llm = llm
+
+    def predict(self, prompt: str) -> str:
+        from crew.prompt_budget import count_tokens
+        file_name = re.search(r"File: (.*)", prompt).group(1)
+        description = SAMPLE_DESCRIPTIONS[int(hashlib.md5(file_name.encode("utf-8")).hexdigest(), 16) % len(SAMPLE_DESCRIPTIONS)]
+        time.sleep(self.llm.latency + (count_tokens(prompt) + count_tokens(description)) * self.llm.per_token)
+        return description
+
+def _import_checker():
+    """a11y_checker, importable without the LLM crew (the replay replaces validate_rule anyway)"""
+    try:
+        import crew.rule_validation  # noqa: F401
+    except ImportError:
+        import types
+        module = types.ModuleType("crew.rule_validation")
+        module.PRSchema = SimpleNamespace
+        module.validate_rule = None
+        sys.modules["crew.rule_validation"] = module
+    import a11y_checker
+    return a11y_checker
+
+def _use_fake_llm(checker, llm: FakeLLM):
+    """Send the single-rule and batched rule evaluations of the review to the fake LLM"""
+    from crew.batch_validation import BatchEvaluator, validate_rules_batch
+    checker.PRSchema = SimpleNamespace
+    checker.validate_rule = lambda pr, rule: validate_rules_batch(pr.title, pr.body, pr.files_diff, [rule], llm=llm)[0]
+    checker.BatchEvaluator = functools.partial(BatchEvaluator, validate_batch=lambda *args: validate_rules_batch(*args, llm=llm))
+
+def _fake_retrieval(llm: FakeLLM, embedding_latency: float):
+    """get_relevant_wcag_guidelines_many over a fresh store with fake embeddings, or None without the RAG dependencies"""
+    try:
+        import crew.wcag_rag as wcag_rag
+    except ImportError as e:
+        print(f"Retrieval stage skipped, the RAG dependencies are not installed: {e}")
+        return None
+    wcag_rag.get_llm = lambda: FakeDescriber(llm)
+    wcag_rag._vector_store = build_store(FakeEmbeddings(latency=embedding_latency))
+    return wcag_rag.get_relevant_wcag_guidelines_many
+
+def replay(checker, fixtures: Dict[str, Dict], retrieve, io_latency: float):
+    """Run every fixture through the stages of a review, each recorded as spans"""
+    for name, fixture in fixtures.items():
+        provider = FixtureProvider(fixture, io_latency)
+        with span("parse_checklist", "bench"):
+            checker.parse_checklist_items(fixture["checklist"])
+        with span("get_diff", "bench"):
+            files = checker.get_diff(provider, "base", "head")
+        if retrieve is not None:
+            with span("retrieval", "bench", files=len(files)):
+                retrieve(files)
+        result = checker.review_pr(SimpleNamespace(full_name=f"fixtures/{name}"), FixturePR(fixture, io_latency),
+                                   REPLAY_RULES_FILE, provider=provider)
+        if result is None or result.error:
+            raise RuntimeError(f"replay of {name} failed: {result and result.error}")
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _median_and_spread(values: List[float]):
+    """Median and median absolute deviation"""
+    median = _percentile(values, 0.5)
+    return median, _percentile([abs(value - median) for value in values], 0.5)
+
+def replay_config(fixtures: Dict[str, Dict], llm_latency: float, per_token: float, embedding_latency: float,
+                  io_latency: float, batch_size: int) -> Dict:
+    """The replayed workload: a baseline is only comparable under the same config"""
+    return {
+        "fixtures": {name: hashlib.sha256(json.dumps(fixture, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+                     for name, fixture in sorted(fixtures.items())},
+        "llm_latency": llm_latency, "per_token": per_token, "embedding_latency": embedding_latency,
+        "io_latency": io_latency, "batch_size": batch_size,
+        "env": {name: os.environ[name] for name in REPLAY_ENV if name in os.environ},
+    }
+
+def replay_environment(retrieval: bool) -> Dict:
+    """
+    The interpreter and the optional stages and dependencies. They don't make a baseline
+    unusable: the stages are compared one by one where both runs have them, and only the
+    totals (wall time, peak memory) need the same optional stages on both sides
+    """
+    from crew import prompt_budget
+    return {
+        "retrieval": retrieval,
+        "tiktoken": prompt_budget.tiktoken is not None,
+        "python": ".".join(map(str, sys.version_info[:2])),
+    }
+
+def totals_comparable(results: Dict, baseline: Dict) -> bool:
+    """Wall time and peak memory add up every stage, so they need the same stages and optional dependencies"""
+    optional = ("retrieval", "tiktoken")
+    return (set(results["stages"]) == set(baseline["stages"])
+            and all(results["environment"].get(key) == (baseline.get("environment") or {}).get(key) for key in optional))
+
+def compare_to_baseline(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Metrics that regressed: the median time per pass of each stage that ran in both, and when
+    the same stages ran, of the whole replay and the peak memory, each with a noise allowance
+    from the tolerance and the spread
+    """
+    checks = []
+    for name, stats in results["stages"].items():
+        if name in baseline["stages"]:
+            checks.append((f"{name} per pass", stats, baseline["stages"][name], NOISE_MS, "ms"))
+    if totals_comparable(results, baseline):
+        checks.append(("wall time per pass", results["wall"], baseline["wall"], NOISE_MS, "ms"))
+        checks.append(("peak Python memory", {"median": results["peak_kib"], "mad": 0.0},
+                       {"median": baseline["peak_kib"], "mad": 0.0}, NOISE_KIB, "KiB"))
+    regressions = []
+    for label, current, reference, floor, unit in checks:
+        allowed = max(reference["median"] * tolerance, SPREAD_FACTOR * max(reference["mad"], current["mad"]), floor)
+        if current["median"] > reference["median"] + allowed:
+            regressions.append(f"{label}: {current['median']:.1f} {unit} vs {reference['median']:.1f} {unit} "
+                               f"in the baseline (+{current['median'] - reference['median']:.1f}, {allowed:.1f} allowed)")
+    return regressions
+
+def bench_replay(fixtures_dir: str, repeat: int, llm_latency: float, per_token: float, embedding_latency: float,
+                 io_latency: float, batch_size: int, baseline_path: str, save_baseline: bool, tolerance: float,
+                 output: Optional[str], verbose: bool) -> int:
+    """
+    Replay recorded PRs through checklist parsing, diff ingestion, guideline retrieval and the
+    rule loop, offline, with a fake LLM and fake embeddings. Reports p50/p95 per stage, the wall
+    time per pass and the peak Python memory, and fails when the median time per pass of a
+    stage, of the whole replay or the peak memory regress past the baseline.
+    Returns 0, 1 on a regression, or 2 when the baseline can't be compared.
+    """
+    fixtures = load_fixtures(fixtures_dir)
+    if not fixtures:
+        print(f"No fixtures in {fixtures_dir}")
+        return 2
+    os.environ["A11Y_BATCH_SIZE"] = str(batch_size)
+    os.environ["A11Y_INCREMENTAL"] = "false"
+
+    llm = FakeLLM(llm_latency, per_token)
+    checker = _import_checker()
+    _use_fake_llm(checker, llm)
+    retrieve = _fake_retrieval(llm, embedding_latency)
+    config = replay_config(fixtures, llm_latency, per_token, embedding_latency, io_latency, batch_size)
+    environment = replay_environment(retrieve is not None)
+    tracer = get_tracer()
+    enable_tracing()
+    log = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+
+    print(f"Replaying {len(fixtures)} fixture(s) x {repeat}: LLM latency {llm_latency * 1000:.0f} ms "
+          f"+ {per_token * 1e6:.0f} us/token, embeddings {embedding_latency * 1000:.0f} ms, "
+          f"GitHub {io_latency * 1000:.0f} ms, batch size {batch_size}")
+    durations: Dict[str, List[float]] = {}  # every span, for the percentiles
+    per_pass: List[Dict[str, float]] = []  # time spent in each stage, per pass
+    walls = []
+    with log:
+        # warm-up pass: imports, corpus, lexical index
+        replay(checker, fixtures, retrieve, io_latency)
+        tracer.spans.clear()
+        for _ in range(repeat):
+            started = time.perf_counter()
+            replay(checker, fixtures, retrieve, io_latency)
+            walls.append((time.perf_counter() - started) * 1000)
+            totals: Dict[str, float] = {}
+            for recorded in tracer.spans:
+                durations.setdefault(recorded.name, []).append(recorded.seconds * 1000)
+                totals[recorded.name] = totals.get(recorded.name, 0.0) + recorded.seconds * 1000
+            per_pass.append(totals)
+            tracer.spans.clear()
+        # one more pass under tracemalloc, which slows the timed passes down
+        tracemalloc.start()
+        replay(checker, fixtures, retrieve, io_latency)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        tracer.spans.clear()
+
+    stages = {}
+    for name, values in sorted(durations.items()):
+        median, spread = _median_and_spread([totals.get(name, 0.0) for totals in per_pass])
+        stages[name] = {"count": len(values) // repeat, "p50_ms": _percentile(values, 0.5),
+                        "p95_ms": _percentile(values, 0.95), "median": median, "mad": spread}
+    wall, wall_spread = _median_and_spread(walls)
+    results = {
+        "config": config,
+        "environment": environment,
+        "repeat": repeat,
+        "stages": stages,
+        "wall": {"median": wall, "mad": wall_spread},
+        "peak_kib": peak / 1024,
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    baseline = None
+    if os.path.exists(baseline_path) and not save_baseline:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    comparable = baseline is not None and baseline.get("config") == config
+
+    print(f"  {'stage':<20} {'spans':>6} {'p50':>10} {'p95':>10} {'per pass':>10} {'baseline':>10}")
+    for name, stats in stages.items():
+        reference = baseline["stages"].get(name) if comparable else None
+        print(f"  {name:<20} {stats['count']:>6} {stats['p50_ms']:>7.1f} ms {stats['p95_ms']:>7.1f} ms "
+              f"{stats['median']:>7.1f} ms " + (f"{reference['median']:>7.1f} ms" if reference else f"{'-':>10}"))
+    print(f"  wall time per pass {wall:8.0f} ms (+/- {wall_spread:.0f}), peak Python memory {results['peak_kib']:8.0f} KiB, "
+          f"max RSS {results['max_rss_kib'] / 1024:6.1f} MiB, {llm.calls // (repeat + 2)} LLM calls per pass")
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {baseline_path}")
+        return 0
+    if baseline is None:
+        print(f"No baseline at {baseline_path}, run with --save-baseline to record one")
+        return 2
+    if not comparable:
+        differences = sorted(key for key in set(config) | set(baseline.get("config") or {})
+                             if config.get(key) != (baseline.get("config") or {}).get(key))
+        print(f"Not comparing: the baseline was recorded with other settings ({', '.join(differences)}); "
+              f"record one for this setup with --save-baseline")
+        return 2
+    recorded = baseline.get("environment") or {}
+    differences = [f"{key} {recorded.get(key)} -> {value}" for key, value in environment.items() if recorded.get(key) != value]
+    if differences:
+        print(f"Note: the baseline was recorded with {', '.join(differences)}")
+    missing = sorted(set(baseline["stages"]) ^ set(stages))
+    if missing:
+        print(f"Only comparing the stages that ran in both ({', '.join(missing)} ran in one of them); "
+              f"wall time and peak memory are not compared")
+    elif not totals_comparable(results, baseline):
+        print("Wall time and peak memory are not compared: the optional dependencies differ")
+    regressions = compare_to_baseline(results, baseline, tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regression against {baseline_path} (tolerance {tolerance:.0%})")
+    return 1 if regressions else 0
+
+def record_fixture(pr_id: str, rules_file: str, output: str):
+    """Save the checklist and the changed files of a GitHub PR as a replay fixture"""
+    from dotenv import load_dotenv
+    from crew.diff_provider import GitHubDiffProvider
+    from crew.github_client import GitHubClient
+    _import_checker()
+    from batch_review import parse_pr_id
+
+    load_dotenv()
+    token = os.getenv("GITHUB_TOKEN")
+    if not token:
+        raise ValueError("GITHUB_TOKEN not found in environment variables")
+    repository, number = parse_pr_id(pr_id)
+    repo = GitHubClient(token).get_repo(repository)
+    pr = repo.get_pull(number)
+    provider = GitHubDiffProvider(repo, pr)
+    base, head = provider.refs(pr)
+    fixture = {
+        "title": pr.title,
+        "body": pr.body or "",
+        "checklist": provider.read_file(base, rules_file),
+        "files": [[filename, patch] for filename, patch in provider.iter_files(base, head) if patch],
+    }
+    with open(output, "w") as f:
+        json.dump(fixture, f, indent=1)
+    print(f"{repository}#{number}: {len(fixture['files'])} changed files written to {output}")
+
+def _timed(run) -> float:
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    query_many = subparsers.add_parser("query-many", help="batched vs per-item guideline retrieval")
+    query_many.add_argument("--files", type=int, default=60)
+    query_many.add_argument("--k", type=int, default=3)
+    query_many.add_argument("--latency", type=float, default=0.05, help="seconds per embeddings request")
+    query_many.add_argument("--repeat", type=int, default=3)
+
+    backends = subparsers.add_parser("backends", help="Chroma vs NumPy retrieval backend")
+    backends.add_argument("--queries", type=int, default=60)
+    backends.add_argument("--k", type=int, default=3)
+    backends.add_argument("--repeat", type=int, default=5)
+    backends.add_argument("--mmap", action="store_true", help="memory-map the NumPy matrix")
+
+    diff_stream = subparsers.add_parser("diff-stream", help="list vs streaming diff ingestion on a synthetic PR")
+    diff_stream.add_argument("--files", type=int, default=5000)
+    diff_stream.add_argument("--lines", type=int, default=200)
+    diff_stream.add_argument("--budget", type=int, default=200000, help="token budget of the streaming pipeline")
+
+    batch_rules = subparsers.add_parser("batch-rules", help="per-rule vs batched LLM rule evaluation")
+    batch_rules.add_argument("--files", type=int, default=6)
+    batch_rules.add_argument("--lines", type=int, default=40)
+    batch_rules.add_argument("--batch-size", type=int, default=4)
+    batch_rules.add_argument("--latency", type=float, default=0.3, help="seconds per LLM call")
+    batch_rules.add_argument("--per-token", type=float, default=0.00005, help="seconds per prompt/answer token")
+    batch_rules.add_argument("--invalid-rate", type=float, default=0.0, help="share of batched answers that fail validation")
+    batch_rules.add_argument("--concurrency", type=int, default=4)
+
+    corpus = subparsers.add_parser("corpus", help="WCAG corpus load from JSON vs the binary cache")
+    corpus.add_argument("--repeat", type=int, default=5)
+
+    replay = subparsers.add_parser("replay", help="recorded PRs through the whole review, compared to a baseline")
+    replay.add_argument("--fixtures", default=os.path.join(BENCHMARKS_DIR, "fixtures"), help="directory of recorded PRs")
+    replay.add_argument("--repeat", type=int, default=15)
+    replay.add_argument("--llm-latency", type=float, default=0.02, help="seconds per LLM call")
+    replay.add_argument("--per-token", type=float, default=0.000002, help="seconds per prompt/answer token")
+    replay.add_argument("--embedding-latency", type=float, default=0.01, help="seconds per embeddings request")
+    replay.add_argument("--io-latency", type=float, default=0.005, help="seconds per GitHub request")
+    replay.add_argument("--batch-size", type=int, default=1, help="rules per LLM call (A11Y_BATCH_SIZE)")
+    replay.add_argument("--baseline", default=os.path.join(BENCHMARKS_DIR, "baseline.json"))
+    replay.add_argument("--save-baseline", action="store_true", help="record this run as the baseline")
+    replay.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown over the baseline (0.25 = 25%%)")
+    replay.add_argument("--output", help="also write the results to this JSON file")
+    replay.add_argument("--verbose", action="store_true", help="keep the review logs")
+
+    record = subparsers.add_parser("record", help="save a GitHub PR as a replay fixture (needs GITHUB_TOKEN)")
+    record.add_argument("pr", help="owner/repo#number or PR URL")
+    record.add_argument("--rules-file", default=os.getenv("FILE_PATH"), required=not os.getenv("FILE_PATH"))
+    record.add_argument("--output", required=True, help="e.g. benchmarks/fixtures/<name>.json")
+
+    args = parser.parse_args()
+    if args.benchmark == "query-many":
+        bench_query_many(args.files, args.k, args.latency, args.repeat)
+    elif args.benchmark == "backends":
+        bench_backends(args.queries, args.k, args.repeat, args.mmap)
+    elif args.benchmark == "diff-stream":
+        bench_diff_stream(args.files, args.lines, args.budget)
+    elif args.benchmark == "batch-rules":
+        bench_batch_rules(args.files, args.lines, args.batch_size, args.latency, args.per_token,
+                          args.invalid_rate, args.concurrency)
+    elif args.benchmark == "corpus":
+        bench_corpus(args.repeat)
+    elif args.benchmark == "replay":
+        return bench_replay(args.fixtures, args.repeat, args.llm_latency, args.per_token, args.embedding_latency,
+                            args.io_latency, args.batch_size, args.baseline, args.save_baseline, args.tolerance,
+                            args.output, args.verbose)
+    elif args.benchmark == "record":
+        record_fixture(args.pr, args.rules_file, args.output)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Build the prebuilt WCAG 2.2 guideline index artifact.
+
+The artifact (data/wcag_index by default) holds the chunk embeddings, their metadata, the
+embedding model id and a precomputed BM25 index, and is baked into the Docker image so the checker never has to embed the
+corpus at startup. Rebuild it whenever data/wcag_2_2_new.json or the embedding model changes.
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+from crew.index_artifact import DEFAULT_INDEX_PATH, IndexArtifactError, build_index_artifact, verify_index_artifact
+
+def build(output_dir: str, wcag_file: str):
+    from crew.wcag_rag import WCAGVectorStore, build_lexical_index, load_guidelines, _guideline_chunks
+
+    if not os.getenv("OPENAI_API_KEY"):
+        raise ValueError("OPENAI_API_KEY not found in .env file")
+
+    guidelines = load_guidelines(wcag_file)
+    ids, texts, metadatas = [], [], []
+    for guideline in guidelines:
+        chunk_ids, chunk_texts, chunk_metadatas = _guideline_chunks(guideline)
+        ids.extend(chunk_ids)
+        texts.extend(chunk_texts)
+        metadatas.extend(chunk_metadatas)
+
+    print(f"Embedding {len(texts)} guideline chunks...")
+    vs = WCAGVectorStore(index_path="")
+    embeddings = vs.embeddings.embed_documents(texts)
+    manifest = build_index_artifact(output_dir, ids, texts, metadatas, embeddings, vs.embedding_model, corpus_file=wcag_file,
+                                    lexical_index=build_lexical_index(guidelines).to_dict())
+    print(f"Index artifact written to {output_dir}: {manifest['count']} chunks, {manifest['dimensions']} dimensions, "
+          f"model {manifest['embedding_model']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or verify the WCAG 2.2 guideline index artifact")
+    parser.add_argument("--output", default=DEFAULT_INDEX_PATH, help="artifact directory")
+    parser.add_argument("--wcag-file", default="data/wcag_2_2_new.json")
+    parser.add_argument("--verify", action="store_true", help="only verify the checksums of an existing artifact")
+    args = parser.parse_args()
+
+    if args.verify:
+        try:
+            manifest = verify_index_artifact(args.output)
+        except IndexArtifactError as e:
+            print(f"Invalid guideline index: {e}")
+            sys.exit(1)
+        print(f"Guideline index at {args.output} is valid: {manifest['count']} chunks, model {manifest['embedding_model']}")
+        return
+
+    # Load environment variables from .env file
+    load_dotenv(Path(__file__).parent / ".env")
+    build(args.output, args.wcag_file)
+
+if __name__ == "__main__":
+    main()
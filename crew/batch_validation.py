@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel, ValidationError
+from .prompt_budget import count_tokens
+from .result_cache import SINGLE_MODE
+from .tracing import span
+from .diff_routing import split_hunks
+from .verdict import Verdict
+
+DEFAULT_BATCH_SIZE = 1  # one rule per LLM call
+# Bump whenever build_batch_prompt changes, so cached batched verdicts are no longer reused
+BATCH_PROMPT_VERSION = "1"
+
+class RuleVerdict(Verdict):
+    """Verdict of one rule in a batched response"""
+    rule: int  # number of the rule in the prompt, starting at 1
+
+class BatchVerdicts(BaseModel):
+    verdicts: List[RuleVerdict]
+
+class BatchValidationError(ValueError):
+    """The LLM answer for a batch of rules could not be used"""
+
+def get_batch_size() -> int:
+    """Rules evaluated per LLM call, from A11Y_BATCH_SIZE (1 disables batching)"""
+    return max(1, int(os.getenv("A11Y_BATCH_SIZE", DEFAULT_BATCH_SIZE)))
+
+def batch_mode() -> str:
+    """Evaluation mode of batched verdicts, part of their verdict cache key"""
+    return f"batch:{BATCH_PROMPT_VERSION}"
+
+def cache_modes() -> Tuple[str, ...]:
+    """Verdict cache modes a review may reuse: single-rule verdicts always, batched ones only when batching"""
+    return (batch_mode(), SINGLE_MODE) if get_batch_size() > 1 else (SINGLE_MODE,)
+
+def merge_diffs(diffs: List[List[Tuple[str, str]]]) -> List[Tuple[str, str]]:
+    """Union of the diffs routed to several rules (hunks already present for a file are not repeated)"""
+    merged: Dict[str, List[str]] = {}
+    for files_diff in diffs:
+        for filename, patch in files_diff:
+            hunks = merged.setdefault(filename, [])
+            for hunk in split_hunks(patch):
+                if hunk not in hunks:
+                    hunks.append(hunk)
+    return [(filename, '\n'.join(hunks)) for filename, hunks in merged.items()]
+
+def plan_batches(items: List[Tuple[str, List[Tuple[str, str]]]], size: int, max_tokens: Optional[int] = None) -> List[List[str]]:
+    """
+    Group rules, given as (rule text, routed diff) pairs in checklist order, into batches of at
+    most size rules whose merged diff stays within max_tokens. Rules are batched greedily
+    in order, so the plan is deterministic.
+    """
+    batches, current, current_diffs = [], [], []
+    for rule_text, files_diff in items:
+        if current:
+            merged = merge_diffs(current_diffs + [files_diff])
+            fits = max_tokens is None or sum(count_tokens(patch) for _, patch in merged) <= max_tokens
+            if len(current) >= size or not fits:
+                batches.append(current)
+                current, current_diffs = [], []
+        current.append(rule_text)
+        current_diffs.append(files_diff)
+    if current:
+        batches.append(current)
+    return batches
+
+def build_batch_prompt(title: str, body: str, files_diff: List[Tuple[str, str]], rules: List[str]) -> str:
+    diff = "\n\n".join(f"File: {filename}\nDiff:\n{patch}" for filename, patch in files_diff)
+    numbered_rules = "\n".join(f"{i}. {rule}" for i, rule in enumerate(rules, 1))
+    return f"""
+    You are an accessibility expert reviewing a pull request against several rules at once.
+
+    PR title: {title}
+    PR description: {body}
+
+    Changed files:
+    {diff}
+
+    Rules:
+    {numbered_rules}
+
+    Evaluate every rule independently against the changed files. Answer only with a JSON object
+    of the form {{"verdicts": [...]}}, with exactly one entry per rule:
+    {{"rule": <rule number>, "complies": <true or false>, "score": <0 to 100>,
+      "affected_sections": [{{"file": <file name>, "section": <code excerpt>,
+      "why_is_not_complying": <explanation>, "what_should_be_changed": [<suggested change>, ...]}}]}}
+    Use an empty affected_sections list when the rule complies.
+    """
+
+def parse_batch_response(text: str, count: int) -> List[Verdict]:
+    """Validate a batched answer and return one Verdict per rule, in prompt order"""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise BatchValidationError("no JSON object in the answer")
+    try:
+        batch = BatchVerdicts.model_validate(json.loads(text[start:end + 1]))
+    except (ValueError, ValidationError) as e:
+        raise BatchValidationError(f"invalid batch answer: {e}")
+    verdicts = {verdict.rule: verdict for verdict in batch.verdicts}
+    if sorted(verdicts) != list(range(1, count + 1)) or len(batch.verdicts) != count:
+        raise BatchValidationError(f"expected verdicts for rules 1-{count}, got {sorted(verdict.rule for verdict in batch.verdicts)}")
+    return [Verdict.model_validate(verdicts[i].model_dump(exclude={"rule"})) for i in range(1, count + 1)]
+
+def validate_rules_batch(title: str, body: str, files_diff: List[Tuple[str, str]], rules: List[str], llm=None) -> List[Verdict]:
+    """Evaluate several rules against the same diff with a single LLM call"""
+    if llm is None:
+        from .utils import get_llm
+        llm = get_llm()
+    answer = llm.predict(build_batch_prompt(title, body, files_diff, rules))
+    return parse_batch_response(answer, len(rules))
+
+class _Batch:
+    def __init__(self, rules: List[str], files_diff: List[Tuple[str, str]]):
+        self.rules = rules
+        self.files_diff = files_diff
+        self.lock = threading.Lock()
+        self.results: Optional[Dict[str, Verdict]] = None
+        self.failed = False
+
+class BatchEvaluator:
+    """
+    Evaluates planned batches of rules with one LLM call each.
+
+    evaluate() is called per rule (from the rule engine's worker threads): the first rule of a
+    batch to arrive makes the batched call, with the merged diff of the batch, and the others
+    wait for its result. When the batched answer fails validation, every rule of the batch falls
+    back to its own single-rule call with its own diff.
+    """
+    def __init__(self, title: str, body: str, diffs: Dict[str, List[Tuple[str, str]]], batches: List[List[str]],
+                 validate_single: Callable[[str, List[Tuple[str, str]]], object],
+                 validate_batch: Callable = validate_rules_batch):
+        self.title = title
+        self.body = body
+        self.diffs = diffs
+        self.validate_single = validate_single
+        self.validate_batch = validate_batch
+        self._batches: Dict[str, _Batch] = {}
+        for rules in batches:
+            if len(rules) > 1:
+                batch = _Batch(rules, merge_diffs([diffs[rule_text] for rule_text in rules]))
+                self._batches.update((rule_text, batch) for rule_text in rules)
+        self._lock = threading.Lock()
+        self.batch_calls = 0
+        self.single_calls = 0
+        self.fallbacks = 0
+        self.prompt_tokens = 0  # tokens of the batched prompts
+
+    def _single(self, rule_text: str):
+        with self._lock:
+            self.single_calls += 1
+        return self.validate_single(rule_text, self.diffs[rule_text])
+
+    def evaluate(self, rule_text: str):
+        batch = self._batches.get(rule_text)
+        if batch is None:
+            return self._single(rule_text)
+        with batch.lock:
+            if batch.results is None and not batch.failed:
+                files_diff = batch.files_diff
+                tokens_in = count_tokens(build_batch_prompt(self.title, self.body, files_diff, batch.rules))
+                with self._lock:
+                    self.batch_calls += 1
+                    self.prompt_tokens += tokens_in
+                try:
+                    with span("llm.validate_batch", "llm", rules=len(batch.rules), tokens_in=tokens_in) as call:
+                        verdicts = self.validate_batch(self.title, self.body, files_diff, batch.rules)
+                        call.set(tokens_out=sum(count_tokens(verdict.model_dump_json()) for verdict in verdicts))
+                    batch.results = dict(zip(batch.rules, verdicts))
+                    print(f"Evaluated {len(batch.rules)} rules in one call")
+                except Exception as e:
+                    print(f"Batched evaluation failed, falling back to one call per rule: {e}")
+                    batch.failed = True
+                    with self._lock:
+                        self.fallbacks += 1
+        if batch.results is not None:
+            return batch.results[rule_text]
+        return self._single(rule_text)
+
+    def mode(self, rule_text: str) -> str:
+        """How the verdict of an evaluated rule was produced (for the verdict cache)"""
+        batch = self._batches.get(rule_text)
+        return batch_mode() if batch is not None and batch.results is not None else SINGLE_MODE
+
+    def summary(self) -> str:
+        return (f"Batched evaluation: {self.batch_calls} batched call(s) ({self.prompt_tokens} prompt tokens), "
+                f"{self.single_calls} single-rule call(s), {self.fallbacks} fallback(s)")
@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+from typing import Optional
+from .review_state import DEFAULT_BOT_LOGIN
+from .tracing import span
+
+COMMENT_MARKER = "<!-- a11y-checker-comment -->"
+DEFAULT_COMMENT_INTERVAL = 10.0
+
+def get_comment_interval() -> float:
+    """Minimum seconds between two edits of the PR comment, from A11Y_COMMENT_INTERVAL"""
+    return max(0.0, float(os.getenv("A11Y_COMMENT_INTERVAL", DEFAULT_COMMENT_INTERVAL)))
+
+def find_bot_comment(pr, bot_login: Optional[str] = None):
+    """Return the last comment written by the bot that carries the comment marker, if any"""
+    bot_login = bot_login or os.getenv("A11Y_BOT_LOGIN", DEFAULT_BOT_LOGIN)
+    found = None
+    for comment in pr.get_issue_comments():
+        if comment.user.login == bot_login and COMMENT_MARKER in (comment.body or ""):
+            found = comment
+    return found
+
+class CommentReporter:
+    """
+    Keeps a single bot comment on the PR up to date.
+
+    The comment is found through a hidden marker (or created once), then edited as rule
+    verdicts arrive. Edits are batched by a background thread: update() only stores the latest
+    body, and it is written at most once every min_interval seconds. finish() writes the final
+    body right away.
+    """
+    def __init__(self, pr, min_interval: Optional[float] = None, bot_login: Optional[str] = None):
+        self.pr = pr
+        self.min_interval = get_comment_interval() if min_interval is None else min_interval
+        self.bot_login = bot_login
+        self.comment = None
+        self.edits = 0
+        self._looked_up = False
+        self._pending: Optional[str] = None
+        self._last_write = float("-inf")
+        self._finished = False
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+
+    def _write(self, body: str):
+        with span("comment.post", "io", size=len(body)):
+            self._write_comment(body)
+
+    def _write_comment(self, body: str):
+        body = f"{COMMENT_MARKER}\n{body}"
+        try:
+            if not self._looked_up:
+                self._looked_up = True
+                self.comment = find_bot_comment(self.pr, self.bot_login)
+            if self.comment is not None:
+                try:
+                    self.comment.edit(body)
+                    self.edits += 1
+                    return
+                except Exception as e:
+                    # most likely deleted in the meantime; post a new one
+                    print(f"Error updating comment, posting a new one: {e}")
+            self.comment = self.pr.create_issue_comment(body)
+            print("Comment posted on the PR.")
+        except Exception as e:
+            print(f"Error posting comment: {e}")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._finished:
+                    self._condition.wait()
+                if self._finished:
+                    return
+                # wait out the interval, collecting newer updates in the meantime
+                delay = self._last_write + self.min_interval - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                body, self._pending = self._pending, None
+                self._last_write = time.monotonic()
+            self._write(body)
+
+    def update(self, body: str):
+        """Schedule an edit with the current progress (only the latest body is written)"""
+        with self._condition:
+            if self._finished:
+                return
+            self._pending = body
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+            self._condition.notify()
+
+    def finish(self, body: str):
+        """Write the final body, dropping any progress update still waiting"""
+        self.cancel()
+        self._write(body)
+
+    def cancel(self):
+        """Stop updating the comment without writing anything else"""
+        with self._condition:
+            self._finished = True
+            self._pending = None
+            self._condition.notify()
+        if self._worker is not None:
+            self._worker.join()
@@ -0,0 +1,171 @@
+import os
+import subprocess
+from typing import Iterator, List, Optional, Tuple
+from .diff_stream import iter_compare_files, iter_pull_files
+
+class DiffProvider:
+    """
+    Where the PR diff and the rules file are read from.
+
+    iter_files() yields (filename, patch) pairs in the format of the GitHub compare API:
+    the patch only holds the hunks (starting at '@@'), and binary files have no patch.
+    """
+    name = "base"
+
+    def refs(self, pr) -> Tuple[str, str]:
+        """The (base, head) refs of a pull request, as understood by this provider"""
+        return pr.base.ref, pr.head.ref
+
+    def read_file(self, ref: str, path: str) -> str:
+        raise NotImplementedError
+
+    def iter_files(self, base: str, head: str) -> Iterator[Tuple[str, Optional[str]]]:
+        """Files changed on head since its merge base with base"""
+        raise NotImplementedError
+
+    def incremental_diff(self, last_sha: str, head_sha: str) -> Optional[List[Tuple[str, str]]]:
+        """Files changed since last_sha, or None when last_sha is not an ancestor of head_sha"""
+        raise NotImplementedError
+
+class GitHubDiffProvider(DiffProvider):
+    """
+    Reads everything through the GitHub API: the files of the pull request when it is given
+    (paged, up to 3000 files), otherwise the compare endpoint, and the contents endpoint
+    """
+    name = "github"
+
+    def __init__(self, repo, pr=None):
+        self.repo = repo
+        self.pr = pr
+
+    def read_file(self, ref: str, path: str) -> str:
+        return self.repo.get_contents(path, ref=ref).decoded_content.decode('utf-8')
+
+    def iter_files(self, base: str, head: str) -> Iterator[Tuple[str, Optional[str]]]:
+        if self.pr is not None and (base, head) == self.refs(self.pr):
+            # the PR files are the changes on head since its merge base with base
+            return iter_pull_files(self.pr)
+        return iter_compare_files(self.repo, base, head)
+
+    def incremental_diff(self, last_sha: str, head_sha: str) -> Optional[List[Tuple[str, str]]]:
+        comparison = self.repo.compare(last_sha, head_sha)
+        # a force-push or rebase makes the last reviewed commit diverge from the new head
+        if comparison.status not in ("ahead", "identical"):
+            return None
+        return [(file.filename, file.patch or "") for file in comparison.files]
+
+class LocalGitDiffProvider(DiffProvider):
+    """
+    Reads the diff and the rules file from a local clone (the workspace checked out by
+    actions/checkout), so no API calls are spent on them and large patches are never truncated.
+
+    Commits are addressed by sha, so the checkout needs the history of both the base and the
+    head of the PR (`fetch-depth: 0`).
+    """
+    name = "local"
+
+    def __init__(self, path: str = "."):
+        self.path = path
+
+    def _git(self, *args: str, check: bool = True) -> subprocess.CompletedProcess:
+        # the workspace is usually owned by another user inside the action container
+        return subprocess.run(
+            ["git", "-c", "safe.directory=*", "-c", "core.quotePath=false", "-C", self.path, *args],
+            capture_output=True, text=True, check=check
+        )
+
+    def refs(self, pr) -> Tuple[str, str]:
+        return pr.base.sha, pr.head.sha
+
+    def has_commit(self, ref: str) -> bool:
+        return self._git("rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}", check=False).returncode == 0
+
+    def read_file(self, ref: str, path: str) -> str:
+        return self._git("show", f"{ref}:{path}").stdout
+
+    def _diff(self, revisions: str) -> Iterator[Tuple[str, str]]:
+        # stream `git diff` and cut it into per-file patches without keeping the whole output
+        process = subprocess.Popen(
+            ["git", "-c", "safe.directory=*", "-c", "core.quotePath=false", "-C", self.path,
+             "diff", "--no-color", "--no-ext-diff", "--find-renames", revisions],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, errors="replace"
+        )
+        filename, hunks, in_hunks = None, [], False
+        completed = False
+        try:
+            for line in process.stdout:
+                line = line.rstrip('\n')
+                if line.startswith("diff --git "):
+                    if filename:
+                        yield filename, '\n'.join(hunks)
+                    filename, hunks, in_hunks = _path_from_header(line), [], False
+                elif in_hunks:
+                    hunks.append(line)
+                elif line.startswith("@@"):
+                    in_hunks = True
+                    hunks.append(line)
+                elif line.startswith("+++ ") and line[4:] != "/dev/null":
+                    filename = _strip_prefix(line[4:], "b/")
+                elif line.startswith("--- ") and line[4:] != "/dev/null" and filename is None:
+                    filename = _strip_prefix(line[4:], "a/")
+                elif line.startswith("rename to "):
+                    filename = line[len("rename to "):]
+            if filename:
+                yield filename, '\n'.join(hunks)
+            completed = True
+        finally:
+            if not completed:
+                # the caller stopped early (or reading failed): don't leave git running
+                process.kill()
+            process.stdout.close()
+            stderr = process.stderr.read()
+            process.stderr.close()
+            if process.wait() != 0 and completed:
+                raise RuntimeError(f"git diff {revisions} failed: {stderr.strip()}")
+
+    def iter_files(self, base: str, head: str) -> Iterator[Tuple[str, Optional[str]]]:
+        for filename, patch in self._diff(f"{base}...{head}"):
+            yield filename, patch or None
+
+    def incremental_diff(self, last_sha: str, head_sha: str) -> Optional[List[Tuple[str, str]]]:
+        if self._git("merge-base", "--is-ancestor", last_sha, head_sha, check=False).returncode != 0:
+            return None
+        return list(self._diff(f"{last_sha}..{head_sha}"))
+
+def _strip_prefix(path: str, prefix: str) -> str:
+    path = path.rstrip('\t')
+    return path[len(prefix):] if path.startswith(prefix) else path
+
+def _path_from_header(line: str) -> Optional[str]:
+    # "diff --git a/path b/path": only unambiguous when both paths are the same (no rename);
+    # otherwise the ---/+++ or "rename to" lines that follow set the name
+    paths = line[len("diff --git "):]
+    half = len(paths) // 2
+    if paths[half:half + 1] == " " and paths[:half].startswith("a/") and paths[half + 1:].startswith("b/") \
+            and paths[2:half] == paths[half + 3:]:
+        return paths[half + 3:]
+    return None
+
+def get_diff_source() -> str:
+    """Diff source selected with A11Y_DIFF_SOURCE: 'github' (default) or 'local'"""
+    source = os.getenv("A11Y_DIFF_SOURCE", "github").lower()
+    if source not in ("github", "local"):
+        raise ValueError(f"Unknown diff source '{source}', expected 'github' or 'local'")
+    return source
+
+def get_diff_provider(repo, pr=None) -> DiffProvider:
+    """
+    Return the diff provider selected with A11Y_DIFF_SOURCE.
+
+    The local provider reads the clone at A11Y_REPO_PATH (default: GITHUB_WORKSPACE, or the
+    current directory); when the commits of the PR are missing from it (e.g. a shallow
+    checkout) it falls back to the GitHub API.
+    """
+    if get_diff_source() == "local":
+        path = os.getenv("A11Y_REPO_PATH") or os.getenv("GITHUB_WORKSPACE") or "."
+        provider = LocalGitDiffProvider(path)
+        missing = [ref for ref in (provider.refs(pr) if pr is not None else []) if not provider.has_commit(ref)]
+        if not missing:
+            return provider
+        print(f"Commits {', '.join(missing)} not found in {path} (use fetch-depth: 0), using the GitHub API for the diff")
+    return GitHubDiffProvider(repo, pr)
@@ -0,0 +1,230 @@
+import os
+import re
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from typing import Dict, List, Optional, Tuple
+
+# File kinds that can affect accessibility and are sent to the rules
+MARKUP_EXTENSIONS = {".html", ".htm", ".jsx", ".tsx", ".vue", ".svelte", ".astro", ".hbs", ".handlebars",
+                     ".ejs", ".erb", ".njk", ".twig", ".php", ".jinja", ".j2", ".liquid", ".mdx", ".xml"}
+STYLE_EXTENSIONS = {".css", ".scss", ".sass", ".less", ".styl", ".pcss"}
+SCRIPT_EXTENSIONS = {".js", ".mjs", ".cjs", ".ts", ".mts", ".cts"}
+ASSET_EXTENSIONS = {".svg"}
+# Server-side code, configuration (including JSON and YAML, e.g. CI workflows) and docs;
+# files of unknown types may be templates and are routed
+CODE_EXTENSIONS = {".py", ".go", ".java", ".kt", ".scala", ".rs", ".c", ".h", ".cc", ".cpp", ".hpp", ".cs",
+                   ".swift", ".m", ".sql", ".sh", ".bash", ".ps1", ".toml", ".ini", ".cfg", ".lock",
+                   ".json", ".yml", ".yaml", ".gradle", ".tf", ".proto", ".md", ".rst", ".txt"}
+NON_UI_KINDS = {"noise", "code"}
+
+# Files that never carry reviewable changes
+NOISE_PATTERNS = [
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "*.lock", "go.sum", "npm-shrinkwrap.json",
+    "*.min.js", "*.min.css", "*.map", "*.snap", "dist/*", "build/*", "*/dist/*", "*/build/*",
+]
+
+# Scripts are only sent to the rules when they touch the DOM or the UI
+SCRIPT_UI_PATTERN = re.compile(
+    r"document\.|window\.|addEventListener|querySelector|innerHTML|textContent|classList|\.focus\(|\.blur\(|"
+    r"aria-|role\b|tabindex|createElement|render\(|<[a-zA-Z]|styled\.|css`|className|keydown|keyup|keypress",
+    re.IGNORECASE
+)
+
+# Rule topics: (words in the rule text, patterns a shard must contain for the topic to apply)
+RULE_TOPICS = {
+    "images": (
+        ["image", "img", "alt ", "alt-text", "alternative text", "icon", "svg", "picture", "figure", "non-text", "logo"],
+        r"<img|<svg|<picture|<figure|<canvas|alt=|background-image|role=[\"']img|\.(png|jpe?g|gif|webp|svg)\b|icon",
+    ),
+    "media": (
+        ["video", "audio", "caption", "transcript", "subtitle", "media"],
+        r"<video|<audio|<track|<iframe|<object|<embed|caption|autoplay|\.(mp4|webm|mp3|ogg|vtt)\b",
+    ),
+    "color": (
+        ["color", "colour", "contrast"],
+        r"color|colour|background|#[0-9a-f]{3,8}\b|rgba?\(|hsla?\(|opacity|theme|--[a-z-]+\s*:",
+    ),
+    "keyboard": (
+        ["keyboard", "focus", "tab order", "tabindex", "shortcut", "key "],
+        r"tabindex|focus|blur|onkey|keydown|keyup|keypress|onclick|@click|v-on:click|on:click|<button|<a\b|<input|"
+        r"<select|<textarea|role=|outline|accesskey|autofocus",
+    ),
+    "forms": (
+        ["form", "input", "label", "error", "validation", "field"],
+        r"<form|<input|<select|<textarea|<label|<fieldset|<legend|placeholder|required|aria-invalid|"
+        r"aria-describedby|htmlfor|for=|error|validat",
+    ),
+    "structure": (
+        ["heading", "landmark", "semantic", "structure", "list", "table", "title", "language", "lang"],
+        r"<h[1-6]|<main|<nav|<header|<footer|<aside|<section|<article|<ul|<ol|<li|<table|<th|<caption|<title|"
+        r"lang=|role=|<div|<span",
+    ),
+    "aria": (
+        ["aria", "role", "screen reader", "assistive"],
+        r"aria-|role=|<[a-z]|sr-only|visually-hidden",
+    ),
+    "motion": (
+        ["motion", "animation", "flash", "blink", "timing", "timeout", "auto-play", "autoplay"],
+        r"animation|transition|@keyframes|marquee|blink|prefers-reduced-motion|setTimeout|setInterval|autoplay",
+    ),
+    "layout": (
+        ["zoom", "reflow", "resize", "spacing", "target size", "touch", "responsive", "viewport"],
+        r"width|height|font-size|line-height|letter-spacing|margin|padding|@media|viewport|user-scalable|"
+        r"min-width|min-height|px|rem|em\b",
+    ),
+}
+
+# Rule words match whole words (and their plurals or -ed/-ing forms): "form" must not match "information"
+RULE_TOPIC_WORDS = {
+    topic: re.compile(r"\b(?:" + "|".join(re.escape(word.strip()) for word in words) + r")(?:s|es|ed|ing)?\b")
+    for topic, (words, _) in RULE_TOPICS.items()
+}
+
+@dataclass
+class DiffShard:
+    """A piece of the PR diff: a whole file patch or a single hunk"""
+    filename: str
+    patch: str
+    kind: str
+    hunk: Optional[int] = None  # hunk index within the file; None for whole-file shards
+
+def classify_file(filename: str) -> str:
+    """Classify a changed file by its path: markup, style, script, asset, noise, code or other"""
+    name = filename.lower()
+    basename = os.path.basename(name)
+    if any(fnmatch(name, pattern) or fnmatch(basename, pattern) for pattern in NOISE_PATTERNS):
+        return "noise"
+    extension = os.path.splitext(basename)[1]
+    if extension in MARKUP_EXTENSIONS:
+        return "markup"
+    if extension in STYLE_EXTENSIONS:
+        return "style"
+    if extension in SCRIPT_EXTENSIONS:
+        return "script"
+    if extension in ASSET_EXTENSIONS:
+        return "asset"
+    if extension in CODE_EXTENSIONS:
+        return "code"
+    return "other"
+
+def split_hunks(patch: str) -> List[str]:
+    """Split a unified diff patch (as returned by the GitHub compare API) into its hunks"""
+    hunks = []
+    current = []
+    for line in patch.split('\n'):
+        if line.startswith('@@') and current:
+            hunks.append('\n'.join(current))
+            current = []
+        current.append(line)
+    if current:
+        hunks.append('\n'.join(current))
+    return hunks
+
+def shard_diff(diff: List[Tuple[str, str]], by: str = "file") -> List[DiffShard]:
+    """Split the (filename, patch) list returned by get_diff into per-file or per-hunk shards"""
+    shards = []
+    for filename, patch in diff or []:
+        kind = classify_file(filename)
+        if by == "hunk":
+            for i, hunk in enumerate(split_hunks(patch)):
+                shards.append(DiffShard(filename=filename, patch=hunk, kind=kind, hunk=i))
+        else:
+            shards.append(DiffShard(filename=filename, patch=patch, kind=kind))
+    return shards
+
+def rule_topics(rule_text: str) -> List[str]:
+    """Return the topics a rule talks about, based on keywords in its text"""
+    text = rule_text.lower()
+    return [topic for topic, pattern in RULE_TOPIC_WORDS.items() if pattern.search(text)]
+
+def skip_reason(filename: str, patch: str, include: List[str], exclude: List[str], kind: Optional[str] = None) -> Optional[str]:
+    """Why a changed file (or hunk) is not sent to any rule, or None if it can be routed"""
+    if any(fnmatch(filename, glob) for glob in include):
+        return None
+    if any(fnmatch(filename, glob) for glob in exclude):
+        return "excluded by A11Y_EXCLUDE"
+    kind = kind or classify_file(filename)
+    if kind == "noise":
+        return "lockfile or generated file"
+    if kind == "code":
+        return "not a UI file"
+    if kind == "script" and not SCRIPT_UI_PATTERN.search(patch):
+        return "script without UI changes"
+    return None
+
+def env_globs(name: str) -> List[str]:
+    value = os.getenv(name, "")
+    return [glob.strip() for glob in value.split(",") if glob.strip()]
+
+class DiffRouter:
+    """
+    Routes diff shards to the rules that could plausibly be affected by them.
+
+    Shards are first filtered for the whole PR (noise such as lockfiles and minified bundles,
+    server-side code and docs, and the A11Y_EXCLUDE globs), and then per rule using a cheap
+    keyword prefilter on the rule topics. When no shard matches the topics of a rule, the rule
+    gets every shard: the prefilter only narrows, it never leaves a rule without a diff. Files
+    matching A11Y_INCLUDE are always sent to every rule.
+    """
+    def __init__(self, diff: List[Tuple[str, str]], by: Optional[str] = None,
+                 include: Optional[List[str]] = None, exclude: Optional[List[str]] = None):
+        self.by = by or os.getenv("A11Y_SHARD_BY", "file")
+        self.include = include if include is not None else env_globs("A11Y_INCLUDE")
+        self.exclude = exclude if exclude is not None else env_globs("A11Y_EXCLUDE")
+        self.shards: List[DiffShard] = []
+        self.skipped: Dict[str, str] = {}  # filename -> reason, for files not sent to any rule
+        self.rule_skips: Dict[str, List[str]] = {}  # rule text -> files not sent to that rule
+
+        for shard in shard_diff(diff, self.by):
+            reason = self._skip_reason(shard)
+            if reason:
+                self.skipped.setdefault(shard.filename, reason)
+            else:
+                self.shards.append(shard)
+        # a file is only reported as skipped if none of its hunks made it through
+        for shard in self.shards:
+            self.skipped.pop(shard.filename, None)
+
+    def _forced(self, shard: DiffShard) -> bool:
+        return any(fnmatch(shard.filename, glob) for glob in self.include)
+
+    def _skip_reason(self, shard: DiffShard) -> Optional[str]:
+        return skip_reason(shard.filename, shard.patch, self.include, self.exclude, kind=shard.kind)
+
+    def _matches(self, shard: DiffShard, topics: List[str]) -> bool:
+        if not topics or self._forced(shard):
+            return True
+        return any(re.search(RULE_TOPICS[topic][1], shard.patch, re.IGNORECASE) for topic in topics)
+
+    def _topic_shards(self, rule_text: str) -> List[DiffShard]:
+        topics = rule_topics(rule_text)
+        return [shard for shard in self.shards if self._matches(shard, topics)]
+
+    def related(self, rule_text: str) -> bool:
+        """Whether any shard matches the topics of a rule (without falling back to every shard)"""
+        return bool(self._topic_shards(rule_text))
+
+    def route(self, rule_text: str) -> List[Tuple[str, str]]:
+        """Return the (filename, patch) list to send for a rule, merging routed hunks per file"""
+        matched = self._topic_shards(rule_text)
+        if not matched:
+            # the keywords found nothing, which doesn't mean the changes are unrelated
+            matched = self.shards
+        files: Dict[str, List[str]] = {}
+        for shard in matched:
+            files.setdefault(shard.filename, []).append(shard.patch)
+        self.rule_skips[rule_text] = sorted({shard.filename for shard in self.shards} - set(files))
+        return [(filename, '\n'.join(patches)) for filename, patches in files.items()]
+
+    def report(self) -> str:
+        """Markdown summary of the files that were not sent to the rules"""
+        lines = []
+        for filename, reason in sorted(self.skipped.items()):
+            lines.append(f"- `{filename}`: {reason}")
+        for rule_text, filenames in self.rule_skips.items():
+            if filenames:
+                lines.append(f"- **{rule_text}**: skipped {len(filenames)} unrelated file(s): "
+                             + ", ".join(f"`{filename}`" for filename in filenames))
+        if not lines:
+            return ""
+        return "\n<details><summary>Skipped files</summary>\n\n" + "\n".join(lines) + "\n</details>\n"
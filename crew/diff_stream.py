@@ -0,0 +1,123 @@
+import os
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Tuple
+from .diff_routing import env_globs, skip_reason, split_hunks
+
+DEFAULT_MAX_PATCH_BYTES = 1024 * 1024
+DEFAULT_WINDOW_LINES = 400
+DEFAULT_TOKEN_BUDGET = 200000
+COMPARE_MAX_FILES = 300  # the compare API lists at most this many files
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+@dataclass
+class DiffStreamStats:
+    """What the streaming diff pipeline did with the files of a PR"""
+    files_seen: int = 0
+    files_yielded: int = 0
+    windows: int = 0
+    tokens: int = 0
+    skipped_by_path: List[str] = field(default_factory=list)
+    skipped_by_size: List[str] = field(default_factory=list)
+    over_budget: List[str] = field(default_factory=list)
+
+    def report(self) -> str:
+        """Markdown note for the PR comment when part of the diff was not reviewed"""
+        lines = []
+        if self.skipped_by_size:
+            lines.append(f"- {len(self.skipped_by_size)} file(s) with patches too large to review: "
+                         + ", ".join(f"`{filename}`" for filename in self.skipped_by_size[:20]))
+        if self.over_budget:
+            lines.append(f"- {len(self.over_budget)} file(s) not reviewed because the diff exceeded the token budget: "
+                         + ", ".join(f"`{filename}`" for filename in self.over_budget[:20]))
+        if not lines:
+            return ""
+        return "\n<details><summary>Files not reviewed</summary>\n\n" + "\n".join(lines) + "\n</details>\n"
+
+def iter_pull_files(pr) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Page through the changed files of a pull request (pulls/{number}/files), 100 files per
+    page, each page fetched and released before the next one. The endpoint lists up to 3000
+    files, against 300 for the compare API.
+    """
+    for file in pr.get_files():
+        yield file.filename, file.patch
+
+def iter_compare_files(repo, base: str, head: str) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Changed files between two refs from the compare API, used when there is no pull request.
+    The API only returns files with its first page, and at most 300 of them.
+    """
+    files = repo.compare_page(base, head).get("files") or []
+    if len(files) >= COMPARE_MAX_FILES:
+        print(f"The comparison of {base}...{head} lists {len(files)} files, the compare API limit; later files are not reviewed")
+    for file in files:
+        yield file["filename"], file.get("patch")
+
+def window_patch(patch: str, max_lines: int) -> List[str]:
+    """Split an oversized patch into windows of whole hunks of at most max_lines lines"""
+    windows, current, current_lines = [], [], 0
+    for hunk in split_hunks(patch):
+        lines = hunk.split('\n')
+        if len(lines) > max_lines:
+            # a single huge hunk is cut into line windows, each keeping the hunk header for context
+            header, body = lines[0], lines[1:]
+            pieces = [[header] + body[i:i + max_lines - 1] for i in range(0, len(body), max_lines - 1)]
+        else:
+            pieces = [lines]
+        for piece in pieces:
+            if current and current_lines + len(piece) > max_lines:
+                windows.append('\n'.join(current))
+                current, current_lines = [], 0
+            current.extend(piece)
+            current_lines += len(piece)
+    if current:
+        windows.append('\n'.join(current))
+    return windows
+
+def iter_diff(files: Iterable[Tuple[str, Optional[str]]], stats: Optional[DiffStreamStats] = None,
+              include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+              max_patch_bytes: Optional[int] = None, window_lines: Optional[int] = None,
+              token_budget: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Stream (filename, patch) pairs from an iterable of changed files.
+
+    Files that can't be routed to any rule (lockfiles, generated or non-UI files, A11Y_EXCLUDE
+    globs) are passed on with an empty patch so they can still be reported, patches over
+    A11Y_MAX_PATCH_BYTES are dropped, oversized patches are cut into hunk windows
+    (A11Y_WINDOW_LINES), and once A11Y_DIFF_TOKEN_BUDGET tokens have been yielded the remaining
+    files are only counted, so memory stays bounded however many files the PR touches.
+    """
+    stats = stats if stats is not None else DiffStreamStats()
+    include = include if include is not None else env_globs("A11Y_INCLUDE")
+    exclude = exclude if exclude is not None else env_globs("A11Y_EXCLUDE")
+    max_patch_bytes = max_patch_bytes or int(os.getenv("A11Y_MAX_PATCH_BYTES", DEFAULT_MAX_PATCH_BYTES))
+    window_lines = window_lines or int(os.getenv("A11Y_WINDOW_LINES", DEFAULT_WINDOW_LINES))
+    token_budget = token_budget or int(os.getenv("A11Y_DIFF_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+
+    for filename, patch in files:
+        stats.files_seen += 1
+        if not patch:
+            continue
+        if skip_reason(filename, patch, include, exclude):
+            stats.skipped_by_path.append(filename)
+            yield filename, ""
+            continue
+        if len(patch) > max_patch_bytes:
+            stats.skipped_by_size.append(filename)
+            continue
+        tokens = estimate_tokens(patch)
+        if stats.tokens + tokens > token_budget:
+            stats.over_budget.append(filename)
+            continue
+        stats.tokens += tokens
+        stats.files_yielded += 1
+        if patch.count('\n') >= window_lines:
+            for window in window_patch(patch, window_lines):
+                stats.windows += 1
+                yield filename, window
+        else:
+            stats.windows += 1
+            yield filename, patch
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from array import array
+from typing import List, Optional
+from .tracing import current_span
+
+DEFAULT_CACHE_FILE = "a11y_embedding_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 50000
+
+def default_cache_path() -> str:
+    """
+    The runner's temp directory ($RUNNER_TEMP) or the system one: never the current directory,
+    which in an action is the checked out workspace (GITHUB_WORKSPACE)
+    """
+    runner_temp = os.getenv("RUNNER_TEMP")
+    directory = runner_temp if runner_temp and os.path.isdir(runner_temp) else tempfile.gettempdir()
+    return os.path.join(directory, DEFAULT_CACHE_FILE)
+
+def get_model_id(embeddings) -> str:
+    """Identify an embeddings client by its model name (part of the cache key)"""
+    model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None)
+    return f"{type(embeddings).__name__}:{model or 'default'}"
+
+class EmbeddingCache:
+    """
+    Disk-backed cache of embedding vectors, keyed by (model, text hash).
+
+    Vectors are stored as float32 SQLite blobs, and the least recently used entries are
+    evicted once the cache holds more than max_entries vectors.
+    """
+    def __init__(self, path: Optional[str] = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, accessed REAL NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return the cached vector of each text, or None for the misses"""
+        hashes = [self.text_hash(text) for text in texts]
+        with self._lock:
+            found = {}
+            # stay below SQLite's limit of bound parameters per statement
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    (model, *batch)
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE embeddings SET accessed = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, text_hash) for text_hash in found]
+                )
+                self._db.commit()
+            vectors = []
+            for text_hash in hashes:
+                if text_hash in found:
+                    self.hits += 1
+                    vectors.append(array("f", found[text_hash]).tolist())
+                else:
+                    self.misses += 1
+                    vectors.append(None)
+            return vectors
+
+    def set_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        now = time.time()
+        rows = [(model, self.text_hash(text), array("f", vector).tobytes(), now) for text, vector in zip(texts, vectors)]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, accessed) VALUES (?, ?, ?, ?)", rows
+            )
+            self._db.execute(
+                "DELETE FROM embeddings WHERE rowid NOT IN (SELECT rowid FROM embeddings ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self._db.commit()
+
+    @property
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class CachedEmbeddings:
+    """Embeddings client wrapper that only sends cache misses to the wrapped client"""
+    def __init__(self, embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_id = get_model_id(embeddings)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(self.model_id, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        current_span().add("cache_hits", len(texts) - len(missing))
+        if missing:
+            # unique texts only, embedded in a single request
+            missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+            embedded = dict(zip(missing_texts, self.embeddings.embed_documents(missing_texts)))
+            self.cache.set_many(self.model_id, list(embedded), list(embedded.values()))
+            for i in missing:
+                vectors[i] = embedded[texts[i]]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get_many(self.model_id, [text])[0]
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.set_many(self.model_id, [text], [vector])
+        return vector
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Create the embedding cache configured by A11Y_EMBEDDING_CACHE (a SQLite file path,
+    a11y_embedding_cache.sqlite in $RUNNER_TEMP or the system temp directory by default, or
+    'off' to disable it)
+    """
+    path = os.getenv("A11Y_EMBEDDING_CACHE") or default_cache_path()
+    if not path or path.lower() in ("off", "false", "0", "none"):
+        return None
+    max_entries = int(os.getenv("A11Y_EMBEDDING_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+    try:
+        return EmbeddingCache(path, max_entries)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error opening embedding cache at {path}: {e}")
+        return None
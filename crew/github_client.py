@@ -0,0 +1,361 @@
+import base64
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+import requests
+from requests.adapters import HTTPAdapter
+from .tracing import span
+
+DEFAULT_API_URL = "https://api.github.com"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+WRITE_METHODS = {"POST", "PATCH", "PUT", "DELETE"}
+# ETag cache bounds: bodies larger than ETAG_MAX_BODY_BYTES and diff payloads (compare pages and
+# PR file lists, which hold every patch and are streamed) are never kept
+DEFAULT_ETAG_CACHE_BYTES = 8 * 1024 * 1024
+ETAG_MAX_BODY_BYTES = 256 * 1024
+UNCACHED_PATHS = re.compile(r"/compare/|/pulls/\d+/files")
+
+class GitHubError(Exception):
+    """A GitHub API request that failed (after retries, when the failure was transient)"""
+    def __init__(self, status: Optional[int], message: str):
+        super().__init__(f"GitHub API error {status}: {message}" if status else f"GitHub API error: {message}")
+        self.status = status
+
+@dataclass
+class GitHubMetrics:
+    """What the client did on the wire"""
+    requests: int = 0  # HTTP requests sent, retries included
+    retries: int = 0
+    not_modified: int = 0  # conditional requests answered with 304 (not counted against the rate limit)
+    rate_limited: int = 0  # responses that asked us to slow down (429, 403 rate limit)
+    wait_seconds: float = 0.0  # time spent sleeping before retries and between writes
+    rate_limit_remaining: Optional[int] = None
+
+    def summary(self) -> str:
+        remaining = "" if self.rate_limit_remaining is None else f", {self.rate_limit_remaining} calls left in the rate limit"
+        return (f"GitHub API: {self.requests} request(s), {self.not_modified} not modified, {self.retries} retried, "
+                f"{self.rate_limited} rate limited, {self.wait_seconds:.1f}s waiting{remaining}")
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Process-wide HTTP session, so every client reuses the same pool of keep-alive connections"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = int(os.getenv("A11Y_GITHUB_POOL_SIZE", "10"))
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+class GitHubClient:
+    """
+    Minimal GitHub REST client used by the checker.
+
+    Requests go through a shared pooled session. Small GET responses are cached with their ETag
+    (up to etag_cache_bytes in total, A11Y_GITHUB_ETAG_CACHE_BYTES) and revalidated with
+    If-None-Match, so unchanged resources come back as 304s that don't count against the rate
+    limit; diff payloads are not cached. Rate limited (429, or 403 with an exhausted or secondary rate limit)
+    and server errors are retried with exponential backoff, waiting for Retry-After or
+    X-RateLimit-Reset when GitHub sends them; writes are spaced out to avoid the secondary
+    rate limit on content creation. Writes are only retried when rate limited: after a 5xx or
+    a dropped connection the write may have gone through, and sending it again could post a
+    duplicate comment.
+    """
+    def __init__(self, token: Optional[str], base_url: Optional[str] = None, session: Optional[requests.Session] = None,
+                 max_retries: Optional[int] = None, max_wait: Optional[float] = None,
+                 write_interval: Optional[float] = None, timeout: float = 30.0,
+                 sleep: Callable[[float], None] = time.sleep, etag_cache_size: int = 1000,
+                 etag_cache_bytes: Optional[int] = None):
+        self.base_url = (base_url or os.getenv("GITHUB_API_URL") or DEFAULT_API_URL).rstrip("/")
+        self.session = session or get_session()
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("A11Y_GITHUB_MAX_RETRIES", "5"))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv("A11Y_GITHUB_MAX_WAIT", "600"))
+        self.write_interval = write_interval if write_interval is not None else float(os.getenv("A11Y_GITHUB_WRITE_INTERVAL", "1"))
+        self.timeout = timeout
+        self.sleep = sleep
+        self.headers = {"Accept": "application/vnd.github+json", "X-GitHub-Api-Version": "2022-11-28"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self.metrics = GitHubMetrics()
+        self._lock = threading.Lock()
+        self._etags: "OrderedDict[Tuple, Tuple[str, object, Dict, int]]" = OrderedDict()  # etag, data, links, bytes
+        self._etag_cache_size = etag_cache_size
+        self._etag_cache_bytes = etag_cache_bytes if etag_cache_bytes is not None else int(
+            os.getenv("A11Y_GITHUB_ETAG_CACHE_BYTES", DEFAULT_ETAG_CACHE_BYTES))
+        self._etag_bytes = 0
+        self._last_write = 0.0
+
+    def _url(self, path: str) -> str:
+        return path if path.startswith(("http://", "https://")) else f"{self.base_url}/{path.lstrip('/')}"
+
+    def _wait(self, seconds: float):
+        if seconds <= 0:
+            return
+        with self._lock:
+            self.metrics.wait_seconds += seconds
+        self.sleep(seconds)
+
+    def _retry_delay(self, response: Optional[requests.Response], attempt: int, write: bool = False) -> Optional[float]:
+        """Seconds to wait before retrying, or None if the request should not be retried"""
+        if response is None and write:
+            return None
+        if response is not None:
+            rate_limited = response.status_code == 429 or (
+                response.status_code == 403 and (
+                    response.headers.get("X-RateLimit-Remaining") == "0"
+                    or "Retry-After" in response.headers
+                    or "secondary rate limit" in response.text.lower()
+                )
+            )
+            if rate_limited:
+                with self._lock:
+                    self.metrics.rate_limited += 1
+            elif write or response.status_code not in RETRY_STATUSES:
+                return None
+            if "Retry-After" in response.headers:
+                try:
+                    return float(response.headers["Retry-After"])
+                except ValueError:
+                    pass
+            if response.headers.get("X-RateLimit-Remaining") == "0" and "X-RateLimit-Reset" in response.headers:
+                return max(0.0, float(response.headers["X-RateLimit-Reset"]) - time.time()) + 1
+            if rate_limited:
+                # secondary rate limit without any hint: GitHub asks for at least a minute
+                return 60.0 * (2 ** attempt)
+        # server errors and connection failures: exponential backoff with jitter
+        return min(2 ** attempt, 60) + random.uniform(0, 1)
+
+    def _space_writes(self):
+        with self._lock:
+            delay = self._last_write + self.write_interval - time.monotonic()
+        self._wait(delay)
+        with self._lock:
+            self._last_write = time.monotonic()
+
+    def request(self, method: str, path: str, params: Optional[Dict] = None, json: Optional[Dict] = None) -> requests.Response:
+        """Send a request, retrying transient failures; raises GitHubError for other error responses"""
+        return self._send(method, path, params, json)[0]
+
+    def _send(self, method: str, path: str, params: Optional[Dict] = None,
+              json: Optional[Dict] = None) -> Tuple[requests.Response, Optional[Tuple]]:
+        # returns the response and, for a 304, the cached (etag, data, links) it revalidated
+        with span("github.request", "io", method=method.upper(), path=self._url(path)[len(self.base_url):]) as request:
+            response, cached = self._send_with_retries(method, path, params, json, request)
+            request.set(status=response.status_code, cache_hits=int(cached is not None))
+            return response, cached
+
+    def _send_with_retries(self, method: str, path: str, params: Optional[Dict], json: Optional[Dict],
+                           request) -> Tuple[requests.Response, Optional[Tuple]]:
+        method = method.upper()
+        url = self._url(path)
+        cache_key = (url, tuple(sorted((params or {}).items())))
+        headers = dict(self.headers)
+        with self._lock:
+            cached = self._etags.get(cache_key) if method == "GET" else None
+        if cached:
+            headers["If-None-Match"] = cached[0]
+
+        attempt = 0
+        while True:
+            if method in WRITE_METHODS:
+                self._space_writes()
+            response, error = None, None
+            try:
+                with self._lock:
+                    self.metrics.requests += 1
+                response = self.session.request(method, url, params=params, json=json, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if response is not None:
+                remaining = response.headers.get("X-RateLimit-Remaining")
+                if remaining is not None and remaining.isdigit():
+                    with self._lock:
+                        self.metrics.rate_limit_remaining = int(remaining)
+                if response.status_code < 400:
+                    break
+            delay = self._retry_delay(response, attempt, write=method in WRITE_METHODS)
+            if delay is None or attempt >= self.max_retries or delay > self.max_wait:
+                if response is None:
+                    raise GitHubError(None, str(error))
+                raise GitHubError(response.status_code, _error_message(response))
+            with self._lock:
+                self.metrics.retries += 1
+            request.add("retries")
+            self._wait(delay)
+            attempt += 1
+
+        if method == "GET":
+            with self._lock:
+                if response.status_code == 304 and cached:
+                    self.metrics.not_modified += 1
+                    if cache_key in self._etags:
+                        self._etags.move_to_end(cache_key)
+                    return response, cached
+                self._cache_etag(cache_key, response)
+        return response, None
+
+    def _cache_etag(self, cache_key: Tuple, response: requests.Response):
+        # called with the lock held
+        previous = self._etags.pop(cache_key, None)
+        if previous:
+            self._etag_bytes -= previous[3]
+        size = len(response.content)
+        if (not response.headers.get("ETag") or size > ETAG_MAX_BODY_BYTES or size > self._etag_cache_bytes
+                or UNCACHED_PATHS.search(cache_key[0])):
+            return
+        self._etags[cache_key] = (response.headers["ETag"], response.json() if response.content else None,
+                                  dict(response.links), size)
+        self._etag_bytes += size
+        while len(self._etags) > self._etag_cache_size or self._etag_bytes > self._etag_cache_bytes:
+            _, evicted = self._etags.popitem(last=False)
+            self._etag_bytes -= evicted[3]
+
+    def get(self, path: str, params: Optional[Dict] = None) -> Tuple[object, Dict]:
+        """GET a JSON resource; returns (data, links), served from the ETag cache on a 304"""
+        response, cached = self._send("GET", path, params=params)
+        if cached:
+            return cached[1], cached[2]
+        return (response.json() if response.content else None), dict(response.links)
+
+    def paginate(self, path: str, params: Optional[Dict] = None) -> Iterator:
+        """Iterate over the items of a paginated list endpoint, following the Link headers"""
+        params = dict(params or {})
+        params.setdefault("per_page", 100)
+        data, links = self.get(path, params)
+        while True:
+            for item in data or []:
+                yield item
+            next_url = links.get("next", {}).get("url")
+            if not next_url:
+                return
+            data, links = self.get(next_url)
+
+    def post(self, path: str, json: Dict):
+        response = self.request("POST", path, json=json)
+        return response.json() if response.content else None
+
+    def patch(self, path: str, json: Dict):
+        response = self.request("PATCH", path, json=json)
+        return response.json() if response.content else None
+
+    def search_issues(self, query: str, limit: Optional[int] = None) -> Iterator[Dict]:
+        """Iterate over the items of an issue/PR search (GitHub caps a search at 1000 results)"""
+        data, links = self.get("search/issues", {"q": query, "per_page": 100})
+        count = 0
+        while True:
+            for item in (data or {}).get("items", []):
+                if limit is not None and count >= limit:
+                    return
+                count += 1
+                yield item
+            next_url = links.get("next", {}).get("url")
+            if not next_url:
+                return
+            data, links = self.get(next_url)
+
+    def get_repo(self, full_name: str) -> "Repository":
+        return Repository(self, full_name)
+
+def _error_message(response: requests.Response) -> str:
+    try:
+        return response.json().get("message", response.text)
+    except ValueError:
+        return response.text
+
+# Thin resource wrappers exposing the attributes the checker uses (named as in PyGithub)
+
+@dataclass
+class User:
+    login: str
+
+@dataclass
+class IssueComment:
+    id: int
+    body: str
+    user: User
+    url: str = ""
+    client: Optional[GitHubClient] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_json(cls, data: Dict, client: Optional[GitHubClient] = None) -> "IssueComment":
+        return cls(id=data["id"], body=data.get("body") or "", user=User(login=(data.get("user") or {}).get("login", "")),
+                   url=data.get("url", ""), client=client)
+
+    def edit(self, body: str):
+        self.client.patch(self.url, {"body": body})
+        self.body = body
+
+@dataclass
+class GitRef:
+    ref: str
+    sha: str
+
+@dataclass
+class ContentFile:
+    path: str
+    decoded_content: bytes
+
+@dataclass
+class File:
+    filename: str
+    patch: Optional[str] = None
+
+@dataclass
+class Comparison:
+    status: str
+    files: List[File] = field(default_factory=list)
+
+class Repository:
+    def __init__(self, client: GitHubClient, full_name: str):
+        self.client = client
+        self.full_name = full_name
+        self.url = f"{client.base_url}/repos/{full_name}"
+
+    def get_pull(self, number: int) -> "PullRequest":
+        data, _ = self.client.get(f"{self.url}/pulls/{number}")
+        return PullRequest(self, data)
+
+    def get_contents(self, path: str, ref: Optional[str] = None) -> ContentFile:
+        data, _ = self.client.get(f"{self.url}/contents/{quote(path)}", params={"ref": ref} if ref else None)
+        return ContentFile(path=path, decoded_content=base64.b64decode(data.get("content") or ""))
+
+    def compare_page(self, base: str, head: str, page: int = 1, per_page: int = 100) -> Dict:
+        data, _ = self.client.get(f"{self.url}/compare/{base}...{head}", params={"page": page, "per_page": per_page})
+        return data
+
+    def compare(self, base: str, head: str) -> Comparison:
+        data = self.compare_page(base, head)
+        return Comparison(status=data.get("status", ""),
+                          files=[File(filename=file["filename"], patch=file.get("patch")) for file in data.get("files") or []])
+
+class PullRequest:
+    def __init__(self, repo: Repository, data: Dict):
+        self.repo = repo
+        self.number = data["number"]
+        self.title = data.get("title") or ""
+        self.body = data.get("body") or ""
+        self.base = GitRef(ref=data["base"]["ref"], sha=data["base"]["sha"])
+        self.head = GitRef(ref=data["head"]["ref"], sha=data["head"]["sha"])
+        self.issue_url = f"{repo.url}/issues/{self.number}"
+
+    def get_files(self) -> Iterator[File]:
+        """Changed files, fetched one page at a time (GitHub lists up to 3000 files)"""
+        for data in self.repo.client.paginate(f"{self.repo.url}/pulls/{self.number}/files"):
+            yield File(filename=data["filename"], patch=data.get("patch"))
+
+    def get_issue_comments(self) -> Iterator[IssueComment]:
+        for data in self.repo.client.paginate(f"{self.issue_url}/comments"):
+            yield IssueComment.from_json(data, self.repo.client)
+
+    def create_issue_comment(self, body: str) -> IssueComment:
+        return IssueComment.from_json(self.repo.client.post(f"{self.issue_url}/comments", {"body": body}), self.repo.client)
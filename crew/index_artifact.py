@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Bump whenever the layout of the artifact files changes
+INDEX_FORMAT_VERSION = 1
+# data/wcag_index next to the crew package (in the repo and in the Docker image)
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "wcag_index")
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.f32"
+CHUNKS_FILE = "chunks.json"
+LEXICAL_FILE = "bm25.json"
+
+class IndexArtifactError(Exception):
+    """The guideline index artifact is missing, corrupted or incompatible with the runtime"""
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class IndexArtifact:
+    """
+    Prebuilt, read-only WCAG guideline index.
+
+    The artifact is a directory with a contiguous float32 matrix of chunk embeddings
+    (vectors.f32, row-major), the chunk ids, documents and metadata (chunks.json) and a
+    manifest with the format version, embedding model, dimensions and checksums of both files.
+    """
+    def __init__(self, path: str, manifest: Dict, ids: List[str], documents: List[str], metadatas: List[Dict], vectors: Optional[array]):
+        self.path = path
+        self.manifest = manifest
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.vectors = vectors
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.path, VECTORS_FILE)
+
+    @property
+    def lexical_path(self) -> Optional[str]:
+        """Precomputed BM25 index, if the artifact was built with one"""
+        return os.path.join(self.path, LEXICAL_FILE) if LEXICAL_FILE in self.manifest["checksums"] else None
+
+    @property
+    def embedding_model(self) -> str:
+        return self.manifest["embedding_model"]
+
+    @property
+    def dimensions(self) -> int:
+        return self.manifest["dimensions"]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def embeddings(self) -> List[List[float]]:
+        """Chunk embeddings as a list of rows"""
+        dimensions = self.dimensions
+        return [self.vectors[i * dimensions:(i + 1) * dimensions].tolist() for i in range(len(self.ids))]
+
+def build_index_artifact(output_dir: str, ids: List[str], documents: List[str], metadatas: List[Dict],
+                         embeddings: List[List[float]], embedding_model: str, corpus_file: Optional[str] = None,
+                         lexical_index: Optional[Dict] = None) -> Dict:
+    """Write an index artifact (optionally with a precomputed BM25 index) to output_dir and return its manifest"""
+    if not embeddings:
+        raise IndexArtifactError("Cannot build an index artifact without embeddings")
+    dimensions = len(embeddings[0])
+    os.makedirs(output_dir, exist_ok=True)
+
+    vectors = array("f")
+    for vector in embeddings:
+        if len(vector) != dimensions:
+            raise IndexArtifactError(f"Inconsistent embedding dimensions: {len(vector)} != {dimensions}")
+        vectors.extend(vector)
+    vectors_path = os.path.join(output_dir, VECTORS_FILE)
+    with open(vectors_path, "wb") as f:
+        vectors.tofile(f)
+
+    chunks_path = os.path.join(output_dir, CHUNKS_FILE)
+    with open(chunks_path, "w") as f:
+        json.dump({"ids": ids, "documents": documents, "metadatas": metadatas}, f)
+
+    checksums = {
+        VECTORS_FILE: _sha256_file(vectors_path),
+        CHUNKS_FILE: _sha256_file(chunks_path),
+    }
+    if lexical_index is not None:
+        lexical_path = os.path.join(output_dir, LEXICAL_FILE)
+        with open(lexical_path, "w") as f:
+            json.dump(lexical_index, f)
+        checksums[LEXICAL_FILE] = _sha256_file(lexical_path)
+
+    manifest = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "embedding_model": embedding_model,
+        "dimensions": dimensions,
+        "count": len(ids),
+        "corpus_sha256": _sha256_file(corpus_file) if corpus_file else None,
+        "checksums": checksums,
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+def read_manifest(path: str) -> Dict:
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise IndexArtifactError(f"No guideline index artifact found at {path}")
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != INDEX_FORMAT_VERSION:
+        raise IndexArtifactError(
+            f"Guideline index at {path} has format version {manifest.get('format_version')}, "
+            f"expected {INDEX_FORMAT_VERSION}; rebuild it with build_wcag_index.py"
+        )
+    return manifest
+
+def verify_index_artifact(path: str) -> Dict:
+    """Check the format version and the checksums of an artifact, and return its manifest"""
+    manifest = read_manifest(path)
+    for filename, checksum in manifest["checksums"].items():
+        file_path = os.path.join(path, filename)
+        if not os.path.exists(file_path):
+            raise IndexArtifactError(f"Guideline index at {path} is missing {filename}")
+        if _sha256_file(file_path) != checksum:
+            raise IndexArtifactError(f"Checksum mismatch for {filename} in the guideline index at {path}")
+    return manifest
+
+def load_index_artifact(path: str, embedding_model: Optional[str] = None, load_vectors: bool = True) -> IndexArtifact:
+    """
+    Load and verify an index artifact.
+
+    Args:
+        path (str): artifact directory
+        embedding_model (str): embedding model used at runtime; must match the one the
+            artifact was built with, since query and chunk vectors have to be comparable
+        load_vectors (bool): read vectors.f32 into memory; callers that memory-map the file
+            themselves can skip it
+
+    Raises:
+        IndexArtifactError: if the artifact is missing, corrupted or built with another model
+    """
+    manifest = verify_index_artifact(path)
+    if embedding_model and manifest["embedding_model"] != embedding_model:
+        raise IndexArtifactError(
+            f"Guideline index at {path} was built with the embedding model '{manifest['embedding_model']}', "
+            f"but the runtime uses '{embedding_model}'. Rebuild it with build_wcag_index.py or set A11Y_INDEX_PATH=off."
+        )
+    with open(os.path.join(path, CHUNKS_FILE), "r") as f:
+        chunks = json.load(f)
+    values = os.path.getsize(os.path.join(path, VECTORS_FILE)) // array("f").itemsize
+    if values != manifest["count"] * manifest["dimensions"] or len(chunks["ids"]) != manifest["count"]:
+        raise IndexArtifactError(f"Guideline index at {path} has {values} values for {len(chunks['ids'])} chunks, "
+                                 f"expected {manifest['count']} x {manifest['dimensions']}")
+    vectors = None
+    if load_vectors:
+        vectors = array("f")
+        with open(os.path.join(path, VECTORS_FILE), "rb") as f:
+            vectors.frombytes(f.read())
+    return IndexArtifact(path, manifest, chunks["ids"], chunks["documents"], chunks["metadatas"], vectors)
+
+def get_index_path() -> Optional[str]:
+    """
+    Artifact directory from A11Y_INDEX_PATH ('off' disables it), or the default data/wcag_index
+    if an artifact has been built there
+    """
+    path = os.getenv("A11Y_INDEX_PATH")
+    if path is not None:
+        return None if path.lower() in ("", "off", "false", "none") else path
+    return DEFAULT_INDEX_PATH if os.path.exists(os.path.join(DEFAULT_INDEX_PATH, MANIFEST_FILE)) else None
@@ -0,0 +1,125 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+# Code tokens mapped to the words the guidelines use for them (applied to queries only)
+CODE_SYNONYMS = {
+    "img": ["image", "alt", "text", "non-text"],
+    "svg": ["image", "non-text"],
+    "picture": ["image"],
+    "figure": ["image"],
+    "alt": ["alt", "text", "alternative"],
+    "aria": ["aria", "assistive", "name", "role"],
+    "role": ["role", "name", "value"],
+    "tabindex": ["keyboard", "focus", "order"],
+    "onclick": ["keyboard", "pointer"],
+    "click": ["keyboard", "pointer"],
+    "keydown": ["keyboard"],
+    "onkeydown": ["keyboard"],
+    "hover": ["pointer", "hover", "focus"],
+    "focus": ["focus", "visible", "keyboard"],
+    "outline": ["focus", "visible"],
+    "color": ["color", "contrast"],
+    "background": ["contrast", "color"],
+    "video": ["video", "captions", "media"],
+    "audio": ["audio", "captions", "media"],
+    "track": ["captions"],
+    "autoplay": ["audio", "control", "pause"],
+    "input": ["input", "label", "form"],
+    "label": ["label", "labels", "name"],
+    "placeholder": ["label", "instructions"],
+    "form": ["form", "input", "error"],
+    "h1": ["heading"], "h2": ["heading"], "h3": ["heading"], "h4": ["heading"], "h5": ["heading"], "h6": ["heading"],
+    "nav": ["navigation", "landmark"],
+    "lang": ["language"],
+    "animation": ["animation", "motion"],
+    "keyframes": ["animation", "motion", "flash"],
+    "transition": ["animation", "motion"],
+    "timeout": ["timing", "time", "limit"],
+    "settimeout": ["timing", "time", "limit"],
+    "setinterval": ["timing", "moving", "auto-updating"],
+    "font-size": ["resize", "text"],
+    "viewport": ["reflow", "resize", "zoom"],
+    "width": ["reflow", "target", "size"],
+    "height": ["target", "size"],
+}
+
+def _normalize(token: str) -> str:
+    # light plural folding, enough to match "images"/"image" or "labels"/"label"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+def tokenize(text: str, expand: bool = False) -> List[str]:
+    """Split text into normalized terms; hyphenated words also yield their parts (aria-label -> aria, label)"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        words = [token] + (token.split("-") if "-" in token else [])
+        if expand:
+            for word in list(words):
+                words.extend(CODE_SYNONYMS.get(word, []))
+        tokens.extend(_normalize(word) for word in words)
+    return tokens
+
+class BM25Index:
+    """Precomputed BM25 inverted index"""
+    def __init__(self, doc_ids: List[str], doc_lengths: List[int], postings: Dict[str, List[Tuple[int, int]]],
+                 k1: float = 1.5, b: float = 0.75):
+        self.doc_ids = doc_ids
+        self.doc_lengths = doc_lengths
+        self.postings = postings  # term -> [(document index, term frequency)]
+        self.k1 = k1
+        self.b = b
+        count = len(doc_ids)
+        self.average_length = (sum(doc_lengths) / count) if count else 0.0
+        self.idf = {
+            term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in postings.items()
+        }
+
+    @classmethod
+    def build(cls, documents: Dict[str, str], **kwargs) -> "BM25Index":
+        """Index documents given as {doc_id: text}"""
+        doc_ids, doc_lengths, postings = [], [], {}
+        for i, (doc_id, text) in enumerate(documents.items()):
+            terms = Counter(tokenize(text))
+            doc_ids.append(doc_id)
+            doc_lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                postings.setdefault(term, []).append((i, frequency))
+        return cls(doc_ids, doc_lengths, postings, **kwargs)
+
+    def to_dict(self) -> Dict:
+        return {"doc_ids": self.doc_ids, "doc_lengths": self.doc_lengths, "postings": self.postings,
+                "k1": self.k1, "b": self.b}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BM25Index":
+        postings = {term: [tuple(posting) for posting in docs] for term, docs in data["postings"].items()}
+        return cls(data["doc_ids"], data["doc_lengths"], postings, k1=data["k1"], b=data["b"])
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[str, float]]:
+        """Return the k best (doc_id, score) pairs for a query (code is expanded with CODE_SYNONYMS)"""
+        scores: Dict[int, float] = {}
+        for term, query_frequency in Counter(tokenize(query, expand=True)).items():
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            # repeated query terms count, but with diminishing returns
+            weight = idf * (1 + math.log(query_frequency))
+            for doc, frequency in self.postings[term]:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc] / self.average_length
+                scores[doc] = scores.get(doc, 0.0) + weight * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.doc_ids[doc], score) for doc, score in best]
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several rankings of ids into one, scoring each id with sum(1 / (k + rank))"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
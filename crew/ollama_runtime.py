@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import subprocess
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+import requests
+from .tracing import span
+
+DEFAULT_OLLAMA_URL = "http://127.0.0.1:11434"
+DEFAULT_OLLAMA_MODEL = "phi3:3.8b-mini-instruct-q8_0"
+DEFAULT_KEEP_ALIVE = "30m"  # how long the model stays in memory after its last request
+DEFAULT_READY_TIMEOUT = 60.0
+
+class OllamaError(RuntimeError):
+    """The local Ollama server or model could not be made ready"""
+
+def get_ollama_url() -> str:
+    return (os.getenv("OPENAI_API_BASE") or DEFAULT_OLLAMA_URL).rstrip("/")
+
+def get_ollama_model() -> str:
+    """Local model used when no OpenAI key is given, from A11Y_OLLAMA_MODEL"""
+    return os.getenv("A11Y_OLLAMA_MODEL", DEFAULT_OLLAMA_MODEL)
+
+class StartupTimer:
+    """Wall time of each startup phase, for the log"""
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.phases: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        started = self.clock()
+        try:
+            with span(f"startup.{name}", "startup"):
+                yield
+        finally:
+            self.phases.append((name, self.clock() - started))
+
+    def summary(self) -> str:
+        total = sum(seconds for _, seconds in self.phases)
+        return "Startup: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.phases) + f" (total {total:.1f}s)"
+
+def is_ready(url: str, timeout: float = 1.0) -> bool:
+    try:
+        return requests.get(f"{url}/api/version", timeout=timeout).status_code == 200
+    except requests.RequestException:
+        return False
+
+def wait_until_ready(url: str, timeout: float = DEFAULT_READY_TIMEOUT, process: Optional[subprocess.Popen] = None,
+                     sleep: Callable[[float], None] = time.sleep) -> float:
+    """Poll the server until it answers (backing off from 50ms to 1s); returns the seconds waited"""
+    started = time.monotonic()
+    interval = 0.05
+    while not is_ready(url):
+        if process is not None and process.poll() is not None:
+            raise OllamaError(f"ollama serve exited with code {process.returncode}")
+        if time.monotonic() - started > timeout:
+            raise OllamaError(f"Ollama at {url} not ready after {timeout:g}s")
+        sleep(interval)
+        interval = min(interval * 2, 1.0)
+    return time.monotonic() - started
+
+def has_model(url: str, model: str) -> bool:
+    response = requests.get(f"{url}/api/tags", timeout=10)
+    response.raise_for_status()
+    names = {entry.get("name") for entry in response.json().get("models", [])}
+    # "phi3" and "phi3:latest" are the same model
+    return model in names or (":" not in model and f"{model}:latest" in names)
+
+def pull_model(url: str, model: str):
+    """Pull a model through the server API, logging progress every 10%"""
+    print(f"Pulling Ollama model {model}...")
+    with requests.post(f"{url}/api/pull", json={"model": model, "stream": True}, stream=True, timeout=None) as response:
+        response.raise_for_status()
+        reported = -10
+        for line in response.iter_lines():
+            if not line:
+                continue
+            status = json.loads(line)
+            if status.get("error"):
+                raise OllamaError(f"could not pull {model}: {status['error']}")
+            if status.get("total") and status.get("completed") is not None:
+                percent = int(100 * status["completed"] / status["total"])
+                if percent >= reported + 10:
+                    reported = percent
+                    print(f"  {status.get('status', 'downloading')}: {percent}%")
+
+def load_model(url: str, model: str, keep_alive: str):
+    """Load the model into memory (a request without a prompt) and keep it there for keep_alive"""
+    response = requests.post(f"{url}/api/generate", json={"model": model, "keep_alive": keep_alive}, timeout=600)
+    response.raise_for_status()
+
+_server: Optional[subprocess.Popen] = None
+
+def start_server(url: str) -> subprocess.Popen:
+    """Start `ollama serve` in the background (models are read from OLLAMA_MODELS when set)"""
+    global _server
+    binary = shutil.which("ollama")
+    if binary is None:
+        raise OllamaError("ollama is not installed (see install_ollama.sh)")
+    env = dict(os.environ)
+    env.setdefault("OLLAMA_HOST", url.split("://", 1)[-1])
+    # keep the model loaded between the rules of a review (and between reviews in service mode)
+    env.setdefault("OLLAMA_KEEP_ALIVE", os.getenv("A11Y_OLLAMA_KEEP_ALIVE", DEFAULT_KEEP_ALIVE))
+    _server = subprocess.Popen([binary, "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    return _server
+
+def ensure_ollama(url: Optional[str] = None, model: Optional[str] = None, timer: Optional[StartupTimer] = None) -> StartupTimer:
+    """
+    Make the local model ready to answer: reuse a running Ollama server or start one and poll
+    until it answers, pull the model only if it isn't already there (baked into the image or in
+    a mounted OLLAMA_MODELS directory), then load it into memory with A11Y_OLLAMA_KEEP_ALIVE so
+    the first rule doesn't pay for it. Each phase is timed and the timings are logged.
+    """
+    url = url or get_ollama_url()
+    model = model or get_ollama_model()
+    timer = timer or StartupTimer()
+    keep_alive = os.getenv("A11Y_OLLAMA_KEEP_ALIVE", DEFAULT_KEEP_ALIVE)
+    ready_timeout = float(os.getenv("A11Y_OLLAMA_READY_TIMEOUT", DEFAULT_READY_TIMEOUT))
+
+    with timer.phase("server"):
+        if is_ready(url):
+            print(f"Reusing the Ollama server at {url}")
+        else:
+            print(f"Starting the Ollama server at {url}...")
+            wait_until_ready(url, ready_timeout, start_server(url))
+    with timer.phase("model"):
+        if has_model(url, model):
+            print(f"Ollama model {model} already available")
+        else:
+            pull_model(url, model)
+    with timer.phase("load"):
+        load_model(url, model, keep_alive)
+    print(timer.summary())
+    return timer
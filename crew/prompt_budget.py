@@ -0,0 +1,259 @@
+import hashlib
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from .diff_routing import classify_file, split_hunks
+from .diff_stream import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:  # the estimate is good enough to enforce a budget
+    tiktoken = None
+
+DEFAULT_CONTEXT_LINES = 2
+# Token budget for the diff sent with each rule, by model (leaves room for the prompts and the answer)
+MODEL_BUDGETS = {
+    "gpt-4o": 60000,
+    "gpt-4-turbo": 60000,
+    "gpt-4": 5000,
+    "gpt-3.5": 10000,
+}
+DEFAULT_BUDGET = 6000  # small local models (Ollama) have short context windows
+# Files that matter most for accessibility go first when the budget is tight
+KIND_PRIORITY = {"markup": 0, "asset": 1, "script": 2, "style": 3}
+MINIFIED_LINE_LENGTH = 500
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? @@(.*)$")
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when it's installed, or estimate them"""
+    global _encoding
+    if tiktoken is None:
+        return estimate_tokens(text)
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return len(_encoding.encode(text, disallowed_special=()))
+
+def get_prompt_budget() -> int:
+    """Diff token budget per rule: A11Y_PROMPT_TOKEN_BUDGET, or a default for the configured model"""
+    if os.getenv("A11Y_PROMPT_TOKEN_BUDGET"):
+        return int(os.getenv("A11Y_PROMPT_TOKEN_BUDGET"))
+    model = os.getenv("OPENAI_MODEL_NAME", "") if os.getenv("LLM_TYPE", "openai") == "openai" else ""
+    for prefix, budget in MODEL_BUDGETS.items():
+        if model.startswith(prefix):
+            return budget
+    return DEFAULT_BUDGET
+
+def is_minified(patch: str) -> bool:
+    return any(len(line) > MINIFIED_LINE_LENGTH for line in patch.split('\n'))
+
+def shorten_long_lines(patch: str, length: int = MINIFIED_LINE_LENGTH) -> str:
+    """Cut lines longer than length (minified code, inline SVG paths, data URIs) instead of dropping the file"""
+    return '\n'.join(
+        line if len(line) <= length else f"{line[:length]}... ({len(line) - length} more characters)"
+        for line in patch.split('\n')
+    )
+
+def truncate_hunk(hunk: str, max_tokens: int) -> Optional[str]:
+    """The start of a hunk that fits max_tokens, with a note of what was cut; None if not even one line fits"""
+    lines = hunk.split('\n')
+    note = "\\ ... {} more line(s) not sent (token budget)"
+    remaining = max_tokens - count_tokens(lines[0]) - count_tokens(note.format(len(lines)))
+    kept = [lines[0]]
+    for line in lines[1:]:
+        tokens = count_tokens(line) + 1  # the newline
+        if tokens > remaining:
+            break
+        kept.append(line)
+        remaining -= tokens
+    if len(kept) == 1:
+        return None
+    return '\n'.join(kept + [note.format(len(lines) - len(kept))])
+
+def _is_whitespace_only(lines: List[str]) -> bool:
+    removed = "".join("".join(line[1:].split()) for line in lines if line.startswith('-'))
+    added = "".join("".join(line[1:].split()) for line in lines if line.startswith('+'))
+    return removed == added
+
+def compact_hunk(hunk: str, context_lines: int = DEFAULT_CONTEXT_LINES) -> List[str]:
+    """
+    Trim the context of a hunk to context_lines around the changes, splitting it where long
+    unchanged runs are dropped. Returns no hunks when the change is whitespace-only.
+    """
+    lines = hunk.split('\n')
+    match = HUNK_HEADER.match(lines[0])
+    body = lines[1:]
+    while body and body[-1] == "":
+        body.pop()
+    if not match or _is_whitespace_only(body):
+        return [] if match else [hunk]
+    old_line, new_line, tail = int(match.group(1)), int(match.group(2)), match.group(3)
+
+    # old/new line number of every body line; '\' lines belong to the line before them
+    numbered = []
+    for line in body:
+        numbered.append((line, old_line, new_line))
+        if line.startswith('-'):
+            old_line += 1
+        elif line.startswith('+'):
+            new_line += 1
+        elif not line.startswith('\\'):
+            old_line += 1
+            new_line += 1
+    changes = [i for i, (line, _, _) in enumerate(numbered) if line[:1] in ('+', '-')]
+    keep = set()
+    for i in changes:
+        keep.update(range(max(0, i - context_lines), min(len(numbered), i + context_lines + 1)))
+    for i, (line, _, _) in enumerate(numbered):
+        if line.startswith('\\') and i - 1 in keep:
+            keep.add(i)
+
+    hunks, current = [], []
+    for i in range(len(numbered)):
+        if i in keep:
+            current.append(numbered[i])
+        elif current:
+            hunks.append(current)
+            current = []
+    if current:
+        hunks.append(current)
+
+    compacted = []
+    for piece in hunks:
+        old_count = sum(1 for line, _, _ in piece if not line.startswith(('+', '\\')))
+        new_count = sum(1 for line, _, _ in piece if not line.startswith(('-', '\\')))
+        _, old_start, new_start = piece[0]
+        header = f"@@ -{old_start},{old_count} +{new_start},{new_count} @@{tail}"
+        compacted.append('\n'.join([header] + [line for line, _, _ in piece]))
+    return compacted
+
+@dataclass
+class PromptUsage:
+    """Token accounting of the diff sent with one rule"""
+    rule: str
+    files: int = 0
+    raw_tokens: int = 0
+    sent_tokens: int = 0
+    dropped: Dict[str, str] = field(default_factory=dict)  # filename -> reason
+    duplicate_hunks: int = 0
+    truncated: List[str] = field(default_factory=list)  # files only partially sent
+
+    @property
+    def over_budget(self) -> bool:
+        """Changes were routed to the rule but none of them fit the budget"""
+        return self.files == 0 and "over the token budget" in self.dropped.values()
+
+class PromptBudget:
+    """
+    Fits the diff routed to a rule into a token budget.
+
+    Noise is stripped first (lockfiles and generated files, binary patches, whitespace-only
+    hunks, context beyond context_lines) and very long lines are cut, hunks repeated across
+    files are sent once, and hunks are then added by file priority (markup, assets, scripts,
+    styles; then smaller files and file name) until the budget runs out. The hunk that doesn't
+    fit is cut rather than left out. Usage is recorded per rule.
+    """
+    def __init__(self, budget: Optional[int] = None, context_lines: Optional[int] = None):
+        self.budget = budget if budget is not None else get_prompt_budget()
+        self.context_lines = context_lines if context_lines is not None else int(
+            os.getenv("A11Y_CONTEXT_LINES", DEFAULT_CONTEXT_LINES))
+        self.usage: Dict[str, PromptUsage] = {}
+        self._lock = threading.Lock()
+
+    def _drop_reason(self, filename: str, patch: str) -> Optional[str]:
+        if classify_file(filename) == "noise":
+            return "lockfile or generated file"
+        if "\x00" in patch or patch.startswith("Binary files"):
+            return "binary"
+        return None
+
+    def fit(self, rule_text: str, files_diff: List[Tuple[str, str]], reserved_tokens: int = 0) -> List[Tuple[str, str]]:
+        """Return the compacted (filename, patch) list to send for a rule"""
+        usage = PromptUsage(rule=rule_text)
+        seen_hunks: Dict[str, str] = {}
+        candidates = []  # (priority, filename, hunks with their token counts)
+        for position, (filename, patch) in enumerate(files_diff):
+            usage.raw_tokens += count_tokens(patch)
+            reason = self._drop_reason(filename, patch)
+            if reason:
+                usage.dropped[filename] = reason
+                continue
+            if is_minified(patch):
+                patch = shorten_long_lines(patch)
+                usage.truncated.append(filename)
+            hunks = []
+            for hunk in split_hunks(patch):
+                for piece in compact_hunk(hunk, self.context_lines):
+                    # the same change pasted in several files is only sent once
+                    digest = hashlib.sha256(piece.split('\n', 1)[-1].encode("utf-8")).hexdigest()
+                    if digest in seen_hunks:
+                        usage.duplicate_hunks += 1
+                        piece = piece.split('\n', 1)[0] + f"\n (same change as in {seen_hunks[digest]})"
+                    else:
+                        seen_hunks[digest] = filename
+                    hunks.append((piece, count_tokens(piece)))
+            if not hunks:
+                usage.dropped[filename] = "whitespace-only changes"
+                continue
+            total = sum(tokens for _, tokens in hunks)
+            priority = (KIND_PRIORITY.get(classify_file(filename), len(KIND_PRIORITY)), total, filename)
+            candidates.append((priority, position, filename, hunks))
+
+        remaining = self.budget - reserved_tokens
+        selected = {}
+        for _, position, filename, hunks in sorted(candidates):
+            kept = []
+            for piece, tokens in hunks:
+                if tokens > remaining:
+                    # send the start of the hunk rather than nothing
+                    piece = truncate_hunk(piece, remaining)
+                    if piece is not None:
+                        kept.append(piece)
+                        remaining -= count_tokens(piece)
+                    break
+                kept.append(piece)
+                remaining -= tokens
+            if not kept:
+                usage.dropped[filename] = "over the token budget"
+                continue
+            if kept[-1] != hunks[len(kept) - 1][0] or len(kept) < len(hunks):
+                if filename not in usage.truncated:
+                    usage.truncated.append(filename)
+            selected[position] = (filename, '\n'.join(kept))
+
+        compacted = [selected[position] for position in sorted(selected)]
+        usage.files = len(compacted)
+        usage.sent_tokens = sum(count_tokens(patch) for _, patch in compacted)
+        with self._lock:
+            self.usage[rule_text] = usage
+        return compacted
+
+    def over_budget(self, rule_text: str) -> bool:
+        """Whether the diff of a rule was emptied by the budget (the rule can't be evaluated)"""
+        usage = self.usage.get(rule_text)
+        return usage is not None and usage.over_budget
+
+    def summary(self) -> str:
+        """Per-rule token usage, for the logs"""
+        lines = [f"Prompt budget: {self.budget} tokens per rule"]
+        for usage in self.usage.values():
+            lines.append(f"  {usage.sent_tokens:>7} / {usage.raw_tokens:<7} tokens  {usage.files} file(s)  "
+                         f"{len(usage.dropped)} dropped  {usage.duplicate_hunks} duplicate hunk(s)  "
+                         f"{len(usage.truncated)} truncated  {usage.rule}")
+        return "\n".join(lines)
+
+    def report(self) -> str:
+        """Markdown note for the PR comment listing the files that didn't fit the budget"""
+        lines = []
+        for usage in self.usage.values():
+            over = [filename for filename, reason in usage.dropped.items() if reason == "over the token budget"]
+            if over or usage.truncated:
+                lines.append(f"- **{usage.rule}**: " + ", ".join(
+                    [f"`{filename}` (not sent)" for filename in over] + [f"`{filename}` (partially sent)" for filename in usage.truncated]
+                ))
+        if not lines:
+            return ""
+        return "\n<details><summary>Files over the token budget</summary>\n\n" + "\n".join(lines) + "\n</details>\n"
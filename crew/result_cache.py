@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+from .verdict import Verdict
+
+# Bump whenever the rule validation prompts change, so older verdicts are no longer reused
+# (2: verdicts are keyed by how they were evaluated, see SINGLE_MODE)
+PROMPT_VERSION = "2"
+# evaluation mode of verdicts produced by validate_rule, one rule per call; batched verdicts
+# use the mode of crew.batch_validation.batch_mode()
+SINGLE_MODE = "single"
+DEFAULT_MAX_ENTRIES = 5000
+
+def normalize_rule(rule_text: str) -> str:
+    """Normalize a rule so that whitespace or casing edits don't invalidate its cached verdicts"""
+    return " ".join(rule_text.split()).lower()
+
+def hash_patch(patch: str) -> str:
+    return hashlib.sha256(patch.encode("utf-8")).hexdigest()
+
+def get_model_name() -> str:
+    """Identify the LLM that produces the verdicts (part of the cache key)"""
+    return f"{os.getenv('LLM_TYPE', 'openai')}:{os.getenv('OPENAI_MODEL_NAME', 'default')}"
+
+class CacheBackend:
+    """Key/value storage for cached verdicts, with least-recently-used eviction"""
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+class SQLiteCacheBackend(CacheBackend):
+    """Stores verdicts in a local SQLite file"""
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)")
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM verdicts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE verdicts SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO verdicts (key, value, accessed) VALUES (?, ?, ?)", (key, value, time.time()))
+            self._db.execute(
+                "DELETE FROM verdicts WHERE key NOT IN (SELECT key FROM verdicts ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+class DirectoryCacheBackend(CacheBackend):
+    """Stores one JSON file per verdict, e.g. in a directory restored with actions/cache"""
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._file(key), "r") as f:
+                value = f.read()
+            # the modification time tracks the last access for the LRU eviction
+            os.utime(self._file(key))
+            return value
+        except OSError:
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            tmp_file = f"{self._file(key)}.{threading.get_ident()}.tmp"
+            with open(tmp_file, "w") as f:
+                f.write(value)
+            os.replace(tmp_file, self._file(key))
+            entries = [entry for entry in os.scandir(self.path) if entry.name.endswith(".json")]
+            if len(entries) > self.max_entries:
+                entries.sort(key=lambda entry: entry.stat().st_mtime)
+                for entry in entries[:len(entries) - self.max_entries]:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+class ResultCache:
+    """
+    Content-addressed cache of rule verdicts.
+
+    A verdict is keyed by the normalized rule text, the hash of every file patch sent to the
+    rule, the model name, the prompt version and the evaluation mode (a single-rule call or a
+    batched prompt), so an unchanged (or rebased) diff reuses the previous verdict without
+    calling the LLM, and batched verdicts are never replayed as single-rule ones.
+    """
+    def __init__(self, backend: CacheBackend, model: Optional[str] = None):
+        self.backend = backend
+        self.model = model or get_model_name()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # shared by concurrent reviews in batch mode
+
+    def key(self, rule_text: str, files_diff: List[Tuple[str, str]], mode: str = SINGLE_MODE) -> str:
+        payload = json.dumps({
+            "prompt_version": PROMPT_VERSION,
+            "mode": mode,
+            "model": self.model,
+            "rule": normalize_rule(rule_text),
+            "files": sorted((filename, hash_patch(patch)) for filename, patch in files_diff),
+        })
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, rule_text: str, files_diff: List[Tuple[str, str]], modes: Sequence[str] = (SINGLE_MODE,)) -> Optional[Verdict]:
+        """The cached verdict produced by the first of modes that has one"""
+        verdict = None
+        for mode in modes:
+            value = self.backend.get(self.key(rule_text, files_diff, mode))
+            try:
+                verdict = Verdict.model_validate_json(value) if value is not None else None
+            except ValueError:
+                verdict = None
+            if verdict is not None:
+                break
+        with self._lock:
+            if verdict is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return verdict
+
+    def set(self, rule_text: str, files_diff: List[Tuple[str, str]], response, mode: str = SINGLE_MODE) -> None:
+        verdict = Verdict.from_response(response)
+        self.backend.set(self.key(rule_text, files_diff, mode), verdict.model_dump_json())
+
+def get_result_cache() -> Optional[ResultCache]:
+    """
+    Create the verdict cache configured by A11Y_CACHE, or None when caching is disabled.
+
+    A11Y_CACHE is either 'sqlite:<file>' or 'dir:<directory>'; a bare path ending in .db/.sqlite
+    uses SQLite, any other path a directory. A11Y_CACHE_MAX_ENTRIES bounds the number of verdicts.
+    """
+    location = os.getenv("A11Y_CACHE")
+    if not location:
+        return None
+    max_entries = int(os.getenv("A11Y_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+    kind, _, path = location.partition(":")
+    if kind not in ("sqlite", "dir"):
+        path = location
+        kind = "sqlite" if location.endswith((".db", ".sqlite", ".sqlite3")) else "dir"
+    try:
+        if kind == "sqlite":
+            return ResultCache(SQLiteCacheBackend(path, max_entries))
+        return ResultCache(DirectoryCacheBackend(path, max_entries))
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error opening result cache at {location}: {e}")
+        return None
@@ -0,0 +1,121 @@
+import os
+from typing import Dict, List
+import numpy as np
+from .index_artifact import IndexArtifact
+
+class RetrievalBackend:
+    """
+    Nearest-neighbour search over the guideline chunks.
+
+    search() returns results in the same shape as chromadb's collection.query: a dict with
+    'ids', 'documents', 'metadatas' and 'distances', each holding one list per query. Every
+    backend reports cosine distances (1 - cosine similarity: 0 is the same direction, lower
+    is closer), so scores can be compared whichever backend produced them.
+    """
+    name = "base"
+
+    def search(self, query_embeddings: List[List[float]], k: int) -> Dict[str, List[List]]:
+        raise NotImplementedError
+
+def cosine_distances(query: List[float], vectors) -> np.ndarray:
+    """1 - cosine similarity between a query and each of the vectors"""
+    if len(vectors) == 0:
+        return np.empty(0, dtype=np.float32)
+    matrix = np.asarray(vectors, dtype=np.float32)
+    query = np.asarray(query, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    norms[norms == 0] = 1.0
+    return 1.0 - (matrix @ query) / norms
+
+class ChromaBackend(RetrievalBackend):
+    """
+    Search through a Chroma collection (HNSW index).
+
+    Chroma's distances depend on the space of the collection (squared L2 by default), so the
+    hits are rescored as cosine distances from their embeddings, like NumpyBackend.
+    """
+    name = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def search(self, query_embeddings: List[List[float]], k: int) -> Dict[str, List[List]]:
+        found = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=k,
+            include=["documents", "metadatas", "embeddings"]
+        )
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for row, query in enumerate(query_embeddings):
+            distances = cosine_distances(query, found["embeddings"][row])
+            order = np.argsort(distances, kind="stable")
+            for key in ("ids", "documents", "metadatas"):
+                results[key].append([found[key][row][i] for i in order])
+            results["distances"].append([float(distances[i]) for i in order])
+        return results
+
+class NumpyBackend(RetrievalBackend):
+    """
+    Exact cosine search with NumPy.
+
+    The corpus is only a few hundred chunks, so one matrix product against a contiguous
+    float32 matrix (optionally memory-mapped from the index artifact) is enough to score every
+    chunk for a whole batch of queries, without Chroma's client, SQLite and HNSW layers.
+    """
+    name = "numpy"
+
+    def __init__(self, matrix: np.ndarray, ids: List[str], documents: List[str], metadatas: List[Dict]):
+        self.matrix = matrix
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        # row norms are kept apart, so a read-only memory-mapped matrix is never modified
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        self.inverse_norms = (1.0 / norms).astype(np.float32)
+
+    @classmethod
+    def from_artifact(cls, artifact: IndexArtifact, mmap: bool = False) -> "NumpyBackend":
+        shape = (len(artifact), artifact.dimensions)
+        if mmap:
+            matrix = np.memmap(artifact.vectors_path, dtype=np.float32, mode="r", shape=shape)
+        else:
+            matrix = np.fromfile(artifact.vectors_path, dtype=np.float32).reshape(shape)
+        return cls(matrix, artifact.ids, artifact.documents, artifact.metadatas)
+
+    @classmethod
+    def from_collection(cls, collection) -> "NumpyBackend":
+        """Copy the vectors of a Chroma collection into a contiguous matrix"""
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        matrix = np.ascontiguousarray(np.asarray(data["embeddings"], dtype=np.float32))
+        return cls(matrix, list(data["ids"]), list(data["documents"]), list(data["metadatas"]))
+
+    def search(self, query_embeddings: List[List[float]], k: int) -> Dict[str, List[List]]:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        query_norms[query_norms == 0] = 1.0
+        # (queries x chunks) cosine similarities in a single matmul
+        similarities = (queries / query_norms) @ self.matrix.T * self.inverse_norms
+        k = min(k, similarities.shape[1])
+        if k == 0:
+            top = np.empty((len(queries), 0), dtype=np.intp)
+        else:
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for row, candidates in enumerate(top):
+            order = candidates[np.argsort(-similarities[row, candidates])]
+            results["ids"].append([self.ids[i] for i in order])
+            results["documents"].append([self.documents[i] for i in order])
+            results["metadatas"].append([self.metadatas[i] for i in order])
+            results["distances"].append([float(1.0 - similarities[row, i]) for i in order])
+        return results
+
+def get_backend_name() -> str:
+    """Retrieval backend selected with A11Y_RETRIEVAL_BACKEND: 'chroma' (default) or 'numpy'"""
+    name = os.getenv("A11Y_RETRIEVAL_BACKEND", "chroma").lower()
+    if name not in ("chroma", "numpy"):
+        raise ValueError(f"Unknown retrieval backend '{name}', expected 'chroma' or 'numpy'")
+    return name
+
+def use_mmap() -> bool:
+    return os.getenv("A11Y_INDEX_MMAP", "false").lower() in ("1", "true", "yes")
@@ -0,0 +1,293 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# pull_request actions that change what has to be reviewed
+REVIEW_ACTIONS = {"opened", "synchronize", "reopened", "ready_for_review"}
+LATENCY_WINDOW = 1000  # latest jobs kept for the latency quantiles
+JOB_COUNTERS = ("received", "ignored", "coalesced", "superseded", "completed", "cancelled", "failed")
+LOCAL_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+class JobCancelled(Exception):
+    """Raised by a review that stopped early because a newer event superseded its job"""
+
+@dataclass
+class ReviewJob:
+    """A PR waiting to be reviewed (or being reviewed) by the service"""
+    repository: str
+    number: int
+    head_sha: str = ""
+    delivery: str = ""  # X-GitHub-Delivery of the event that queued it
+    enqueued: float = field(default_factory=time.monotonic)
+    started: Optional[float] = None
+    cancel: threading.Event = field(default_factory=threading.Event, repr=False, compare=False)
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        return (self.repository.lower(), self.number)
+
+    def to_dict(self) -> Dict:
+        return {"repository": self.repository, "number": self.number, "head_sha": self.head_sha, "delivery": self.delivery}
+
+def _quantile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class ServiceMetrics:
+    """Counters and latency windows of the review service, rendered in the Prometheus text format"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.received = 0  # events that queued a review
+        self.ignored = 0  # events that don't need a review (other actions, other events)
+        self.coalesced = 0  # queued jobs replaced by a newer event for the same PR
+        self.superseded = 0  # running jobs cancelled by a newer event for the same PR
+        self.completed = 0
+        self.cancelled = 0  # reviews that stopped early because they were superseded
+        self.failed = 0
+        self.queue_depth = 0
+        self.running = 0
+        self.wait_seconds: Deque[float] = deque(maxlen=LATENCY_WINDOW)  # queued -> started
+        self.review_seconds: Deque[float] = deque(maxlen=LATENCY_WINDOW)  # started -> finished
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def set_queue(self, depth: int, running: int):
+        with self._lock:
+            self.queue_depth = depth
+            self.running = running
+
+    def observe(self, wait: float, review: float):
+        with self._lock:
+            self.wait_seconds.append(wait)
+            self.review_seconds.append(review)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            waits, reviews = list(self.wait_seconds), list(self.review_seconds)
+            snapshot = {name: getattr(self, name) for name in JOB_COUNTERS + ("queue_depth", "running")}
+        for name, values in (("wait_seconds", waits), ("review_seconds", reviews)):
+            snapshot[name] = {"p50": _quantile(values, 0.5), "p95": _quantile(values, 0.95), "count": len(values)}
+        return snapshot
+
+    def render(self) -> str:
+        snapshot = self.snapshot()
+        lines = []
+        for name in JOB_COUNTERS:
+            lines += [f"# TYPE a11y_jobs_{name}_total counter", f"a11y_jobs_{name}_total {snapshot[name]}"]
+        for name in ("queue_depth", "running"):
+            lines += [f"# TYPE a11y_{name} gauge", f"a11y_{name} {snapshot[name]}"]
+        for name in ("wait_seconds", "review_seconds"):
+            lines.append(f"# TYPE a11y_job_{name} summary")
+            for quantile, label in (("p50", "0.5"), ("p95", "0.95")):
+                lines.append(f'a11y_job_{name}{{quantile="{label}"}} {snapshot[name][quantile]:.3f}')
+            lines.append(f"a11y_job_{name}_count {snapshot[name]['count']}")
+        return "\n".join(lines) + "\n"
+
+class ReviewQueue:
+    """
+    FIFO of PR review jobs, coalesced per PR.
+
+    A new event for a PR that is still queued replaces the queued job (keeping its place in the
+    queue), and one for a PR that is being reviewed cancels the running job. A PR is never
+    reviewed by two workers at once: its next job waits until the running one finishes.
+    """
+    def __init__(self, metrics: Optional[ServiceMetrics] = None):
+        self.metrics = metrics or ServiceMetrics()
+        self._pending: "OrderedDict[Tuple[str, int], ReviewJob]" = OrderedDict()
+        self._running: Dict[Tuple[str, int], ReviewJob] = {}
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def _update_gauges(self):
+        self.metrics.set_queue(len(self._pending), len(self._running))
+
+    def submit(self, job: ReviewJob) -> ReviewJob:
+        with self._condition:
+            if job.key in self._pending:
+                self.metrics.count("coalesced")
+            self._pending[job.key] = job
+            running = self._running.get(job.key)
+            if running is not None and not running.cancel.is_set():
+                running.cancel.set()
+                self.metrics.count("superseded")
+            self._update_gauges()
+            self._condition.notify()
+        return job
+
+    def get(self) -> Optional[ReviewJob]:
+        """Next job whose PR isn't being reviewed, waiting for one; None once the queue is closed"""
+        with self._condition:
+            while True:
+                if self._closed:
+                    return None
+                key = next((key for key in self._pending if key not in self._running), None)
+                if key is not None:
+                    job = self._pending.pop(key)
+                    job.started = time.monotonic()
+                    self._running[key] = job
+                    self._update_gauges()
+                    return job
+                self._condition.wait()
+
+    def done(self, job: ReviewJob):
+        with self._condition:
+            if self._running.get(job.key) is job:
+                del self._running[job.key]
+            self._update_gauges()
+            # a job for the same PR may have been waiting for this one
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            for job in self._running.values():
+                job.cancel.set()
+            self._condition.notify_all()
+
+    def jobs(self) -> Dict[str, List[Dict]]:
+        with self._condition:
+            return {"pending": [job.to_dict() for job in self._pending.values()],
+                    "running": [job.to_dict() for job in self._running.values()]}
+
+def job_from_event(event: str, payload: Dict, delivery: str = "") -> Optional[ReviewJob]:
+    """ReviewJob for a GitHub webhook event, or None if the event doesn't need a review"""
+    if event != "pull_request" or payload.get("action") not in REVIEW_ACTIONS:
+        return None
+    pull_request = payload["pull_request"]
+    return ReviewJob(repository=payload["repository"]["full_name"], number=pull_request["number"],
+                     head_sha=pull_request.get("head", {}).get("sha", ""), delivery=delivery)
+
+def is_local_host(host: str) -> bool:
+    return host in LOCAL_HOSTS or host.startswith("127.")
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """Check the X-Hub-Signature-256 header of a webhook delivery"""
+    expected = "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return bool(signature) and hmac.compare_digest(expected, signature)
+
+class ReviewService:
+    """
+    Review PRs from GitHub webhooks with a pool of long-lived workers.
+
+    POST /webhook takes pull_request events (signed with the webhook secret when one is set) and
+    POST /reviews takes {"repository": "owner/repo", "number": 12}; both queue a job and answer
+    202 right away. Workers run review(job) one job at a time, so everything the review loads
+    (LLM client, guideline index, caches) stays warm between jobs; a review that stops because
+    its job was superseded raises JobCancelled and is counted as cancelled, not completed.
+    GET /metrics exposes the queue depth, the job counters and the wait and review latencies;
+    GET /jobs lists the queue.
+    """
+    def __init__(self, review: Callable[[ReviewJob], object], workers: int = 2, secret: Optional[str] = None):
+        self.review = review
+        self.secret = secret
+        self.metrics = ServiceMetrics()
+        self.queue = ReviewQueue(self.metrics)
+        self._workers = [threading.Thread(target=self._work, name=f"review-worker-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            print(f"Reviewing {job.repository}#{job.number} ({job.head_sha[:7] or 'latest'})")
+            try:
+                self.review(job)
+                self.metrics.count("completed")
+            except JobCancelled:
+                print(f"Review of {job.repository}#{job.number} superseded")
+                self.metrics.count("cancelled")
+            except Exception as e:
+                print(f"Error reviewing {job.repository}#{job.number}: {e}")
+                self.metrics.count("failed")
+            finally:
+                finished = time.monotonic()
+                self.metrics.observe(job.started - job.enqueued, finished - job.started)
+                self.queue.done(job)
+
+    def submit(self, job: ReviewJob) -> ReviewJob:
+        self.metrics.count("received")
+        return self.queue.submit(job)
+
+    def start(self, host: str = "127.0.0.1", port: int = 8080) -> ThreadingHTTPServer:
+        """Start the workers and the HTTP server (in a background thread); returns the server"""
+        for worker in self._workers:
+            worker.start()
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        threading.Thread(target=self._server.serve_forever, name="review-http", daemon=True).start()
+        return self._server
+
+    def stop(self, wait: bool = True):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        self.queue.close()
+        if wait:
+            for worker in self._workers:
+                if worker.is_alive():
+                    worker.join()
+
+def _make_handler(service: ReviewService):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, body, content_type: str = "application/json"):
+            data = (body if isinstance(body, str) else json.dumps(body)).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/healthz":
+                self._reply(200, {"status": "ok"})
+            elif self.path == "/metrics":
+                self._reply(200, service.metrics.render(), "text/plain; version=0.0.4")
+            elif self.path == "/jobs":
+                self._reply(200, service.queue.jobs())
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                return self._reply(400, {"error": "invalid JSON"})
+            if self.path == "/webhook":
+                if service.secret and not verify_signature(service.secret, body, self.headers.get("X-Hub-Signature-256")):
+                    return self._reply(401, {"error": "invalid signature"})
+                try:
+                    job = job_from_event(self.headers.get("X-GitHub-Event", ""), payload, self.headers.get("X-GitHub-Delivery", ""))
+                except (AttributeError, KeyError, TypeError):
+                    return self._reply(400, {"error": "malformed pull_request event"})
+                if job is None:
+                    service.metrics.count("ignored")
+                    return self._reply(200, {"queued": False})
+            elif self.path == "/reviews":
+                if service.secret and not verify_signature(service.secret, body, self.headers.get("X-Hub-Signature-256")):
+                    return self._reply(401, {"error": "invalid signature"})
+                try:
+                    job = ReviewJob(repository=payload["repository"], number=int(payload["number"]))
+                except (KeyError, TypeError, ValueError):
+                    return self._reply(400, {"error": "expected {\"repository\": \"owner/repo\", \"number\": <PR number>}"})
+            else:
+                return self._reply(404, {"error": "not found"})
+            service.submit(job)
+            self._reply(202, {"queued": True, "job": job.to_dict()})
+
+        def log_message(self, format, *args):
+            # the review logs are the interesting part; keep request logs out of them
+            pass
+
+    return Handler
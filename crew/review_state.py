@@ -0,0 +1,89 @@
+import base64
+import hashlib
+import json
+import os
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from .diff_routing import DiffRouter
+from .result_cache import normalize_rule, hash_patch
+from .verdict import Verdict
+
+STATE_MARKER = "a11y-checker-state"
+STATE_PATTERN = re.compile(r"<!-- " + STATE_MARKER + r": ([A-Za-z0-9+/=]+) -->")
+DEFAULT_BOT_LOGIN = "github-actions[bot]"
+
+def rule_key(rule_text: str) -> str:
+    return hashlib.sha256(normalize_rule(rule_text).encode("utf-8")).hexdigest()[:16]
+
+class RuleState(BaseModel):
+    """Verdict of a rule in a previous review, with the hashes of the file patches it was given"""
+    files: Dict[str, str] = {}
+    verdict: Verdict
+
+    @classmethod
+    def create(cls, files_diff: List[Tuple[str, str]], response) -> "RuleState":
+        return cls(
+            files={filename: hash_patch(patch) for filename, patch in files_diff},
+            verdict=Verdict.from_response(response)
+        )
+
+class ReviewState(BaseModel):
+    """State of the last review, stored in a hidden marker of the bot comment"""
+    head_sha: str
+    rules: Dict[str, RuleState] = {}
+
+    def to_marker(self) -> str:
+        # compressed and base64 encoded, so it stays small and can't close the html comment
+        data = zlib.compress(self.model_dump_json().encode("utf-8"))
+        return f"\n<!-- {STATE_MARKER}: {base64.b64encode(data).decode('ascii')} -->\n"
+
+    @classmethod
+    def from_comment(cls, body: str) -> Optional["ReviewState"]:
+        match = STATE_PATTERN.search(body or "")
+        if not match:
+            return None
+        try:
+            data = zlib.decompress(base64.b64decode(match.group(1)))
+            return cls.model_validate(json.loads(data))
+        except (ValueError, zlib.error) as e:
+            print(f"Ignoring unreadable review state: {e}")
+            return None
+
+    def carry_forward(self, rules: list, incremental_diff: List[Tuple[str, str]]) -> Dict[str, RuleState]:
+        """
+        Return the previous state of the rules that are not affected by the commits since
+        the last review: none of the files they reviewed changed, and none of the newly
+        changed files matches their topics (route() would fall back to every file, so it can't
+        tell).
+        """
+        changed = {filename for filename, _ in incremental_diff}
+        router = DiffRouter(incremental_diff)
+        carried = {}
+        for rule in rules:
+            previous = self.rules.get(rule_key(rule.text))
+            if previous is None:
+                continue
+            if set(previous.files) & changed or router.related(rule.text):
+                continue
+            carried[rule.text] = previous
+        return carried
+
+def is_incremental() -> bool:
+    return os.getenv("A11Y_INCREMENTAL", "false").lower() in ("1", "true", "yes")
+
+def find_review_state(pr, bot_login: Optional[str] = None) -> Optional[ReviewState]:
+    """Find the state of the last review in the comments written by the bot on the PR"""
+    bot_login = bot_login or os.getenv("A11Y_BOT_LOGIN", DEFAULT_BOT_LOGIN)
+    try:
+        state = None
+        for comment in pr.get_issue_comments():
+            # only trust the bot's own comments, anyone else could forge a passing state
+            if comment.user.login != bot_login:
+                continue
+            state = ReviewState.from_comment(comment.body) or state
+        return state
+    except Exception as e:
+        print(f"Error reading previous review state: {e}")
+        return None
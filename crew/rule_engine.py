@@ -0,0 +1,130 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RULE_TIMEOUT = 600.0
+
+@dataclass
+class RuleOutcome:
+    """Result of evaluating a single checklist rule"""
+    index: int
+    rule: Any
+    response: Any = None
+    error: Optional[str] = None
+    # set once the engine stops waiting for the rule (timed out, cancelled or discarded);
+    # its call may still be running and must not record anything after that
+    abandoned: threading.Event = field(default_factory=threading.Event, repr=False, compare=False)
+
+    @property
+    def evaluated(self) -> bool:
+        return self.response is not None
+
+    @property
+    def failed_mandatory(self) -> bool:
+        return self.evaluated and not self.response.complies and self.rule.type == 'mandatory'
+
+def get_concurrency() -> int:
+    """Read the rule concurrency limit from A11Y_CONCURRENCY"""
+    value = int(os.getenv("A11Y_CONCURRENCY", DEFAULT_CONCURRENCY))
+    return max(1, value)
+
+def get_rule_timeout() -> Optional[float]:
+    """Read the per-rule timeout (in seconds) from A11Y_RULE_TIMEOUT; 0 disables it"""
+    value = float(os.getenv("A11Y_RULE_TIMEOUT", DEFAULT_RULE_TIMEOUT))
+    return value if value > 0 else None
+
+async def _evaluate_all(rules, evaluate, concurrency, timeout, on_result) -> List[RuleOutcome]:
+    loop = asyncio.get_running_loop()
+    outcomes = [RuleOutcome(index=i, rule=rule) for i, rule in enumerate(rules)]
+    semaphore = asyncio.Semaphore(concurrency)
+    # the first (in checklist order) mandatory rule that failed so far; nothing after it is reported
+    cutoff = len(rules)
+
+    # mandatory rules go first, so a failing one cancels as much pending work as possible
+    order = sorted(range(len(rules)), key=lambda i: (rules[i].type != 'mandatory', i))
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def release_slot(_):
+        # runs in the worker thread once the call really returns, even after a timeout: a worker
+        # stuck in a hung call doesn't take new rules, so their timeouts never start while queued
+        try:
+            loop.call_soon_threadsafe(semaphore.release)
+        except RuntimeError:
+            pass  # the loop is closed: evaluate_rules already returned
+
+    async def run(i):
+        nonlocal cutoff
+        await semaphore.acquire()
+        if i > cutoff:
+            semaphore.release()
+            return
+        call = executor.submit(evaluate, rules[i], outcomes[i].abandoned)
+        call.add_done_callback(release_slot)
+        try:
+            outcomes[i].response = await asyncio.wait_for(asyncio.wrap_future(call), timeout)
+        except asyncio.TimeoutError:
+            outcomes[i].abandoned.set()
+            outcomes[i].error = f"timed out after {timeout:g}s"
+            print(f"Rule timed out: {rules[i].text}")
+        except Exception as e:
+            outcomes[i].error = str(e)
+            print(f"Error evaluating rule '{rules[i].text}': {e}")
+        if outcomes[i].failed_mandatory and i < cutoff:
+            cutoff = i
+            for j, task in tasks.items():
+                if j > cutoff and not task.done():
+                    task.cancel()
+        # results past a failed mandatory rule are discarded, so they are not reported either
+        if on_result and i <= cutoff:
+            try:
+                on_result(outcomes[i])
+            except Exception as e:
+                print(f"Error reporting rule '{rules[i].text}': {e}")
+
+    tasks = {i: asyncio.ensure_future(run(i)) for i in order}
+    try:
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+    finally:
+        # don't wait for calls that are no longer needed; queued ones are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    for outcome in outcomes[cutoff + 1:]:
+        outcome.abandoned.set()
+        outcome.response = None
+        outcome.error = None
+    return outcomes
+
+def evaluate_rules(rules: list, evaluate: Callable[[Any], Any], concurrency: Optional[int] = None, timeout: Optional[float] = None,
+                   on_result: Optional[Callable[[RuleOutcome], None]] = None) -> List[RuleOutcome]:
+    """
+    Evaluate checklist rules concurrently.
+
+    Mandatory rules are scheduled first. Once a mandatory rule fails, every rule that comes
+    after it in the checklist is cancelled (or discarded if already running), which matches
+    the sequential behaviour of stopping at the first mandatory failure.
+
+    Args:
+        rules (list): CheckListItem objects, in checklist order
+        evaluate (Callable): called with a rule and its abandoned event, returns the validation
+            response; the event is set when the rule times out or is discarded, and evaluate
+            must check it before recording anything (state, notes, cache)
+        concurrency (int): max number of rules evaluated at once (default: A11Y_CONCURRENCY)
+        timeout (float): per-rule timeout in seconds (default: A11Y_RULE_TIMEOUT), counted from
+            the moment a worker starts the rule; a timed-out call keeps its worker until it returns
+        on_result (Callable): called with each RuleOutcome as soon as the rule finishes
+            (evaluated, timed out or failed), in completion order
+
+    Returns:
+        List[RuleOutcome]: one outcome per rule, in checklist order; rules that were not
+        evaluated have no response and their abandoned event is set before this returns
+    """
+    if concurrency is None:
+        concurrency = get_concurrency()
+    if timeout is None:
+        timeout = get_rule_timeout()
+    return asyncio.run(_evaluate_all(rules, evaluate, concurrency, timeout, on_result))
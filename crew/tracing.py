@@ -0,0 +1,209 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+
+# span attributes summed in the summary table
+SUMMED_ATTRIBUTES = ("tokens_in", "tokens_out", "cache_hits", "retries")
+# spans kept in memory; a long-running service drops the oldest ones past this
+DEFAULT_MAX_SPANS = 100000
+
+@dataclass
+class Span:
+    """A timed stage of the review"""
+    name: str
+    category: str
+    start: float  # seconds, time.perf_counter()
+    thread: int
+    end: Optional[float] = None
+    attributes: Dict = field(default_factory=dict)
+
+    @property
+    def seconds(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, name: str, amount: int = 1):
+        self.attributes[name] = self.attributes.get(name, 0) + amount
+
+class _NoSpan:
+    """Returned by a disabled tracer, so instrumented code doesn't have to check"""
+    attributes: Dict = {}
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, name: str, amount: int = 1):
+        pass
+
+NO_SPAN = _NoSpan()
+
+class Tracer:
+    """
+    Records spans (wall time and attributes such as tokens in/out, cache hits and retries)
+    for every stage of a review, from any thread. The spans can be written as a Chrome trace
+    (chrome://tracing or https://ui.perfetto.dev) and summarized per stage. Only the latest
+    max_spans spans are kept (A11Y_TRACE_MAX_SPANS), so tracing a service doesn't grow forever.
+    """
+    def __init__(self, enabled: bool = True, max_spans: Optional[int] = None):
+        self.enabled = enabled
+        self.max_spans = max_spans or int(os.getenv("A11Y_TRACE_MAX_SPANS", DEFAULT_MAX_SPANS))
+        self.spans: Deque[Span] = deque(maxlen=self.max_spans)
+        self.dropped = 0  # oldest spans evicted once max_spans was reached
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()  # stack of the open spans of each thread
+
+    @contextmanager
+    def span(self, name: str, category: str = "review", **attributes) -> Iterator[Span]:
+        if not self.enabled:
+            yield NO_SPAN
+            return
+        span = Span(name=name, category=category, start=time.perf_counter(), thread=threading.get_ident(),
+                    attributes=dict(attributes))
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.end = time.perf_counter()
+            stack.pop()
+            with self._lock:
+                if len(self.spans) == self.max_spans:
+                    self.dropped += 1
+                self.spans.append(span)
+
+    def _stack(self) -> List[Span]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self):
+        """Innermost open span of the calling thread, to add attributes to it from deeper code"""
+        stack = self._stack() if self.enabled else None
+        return stack[-1] if stack else NO_SPAN
+
+    def to_chrome_trace(self) -> Dict:
+        with self._lock:
+            spans = list(self.spans)
+        threads = {thread: i for i, thread in enumerate(dict.fromkeys(span.thread for span in spans))}
+        events = [{
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",  # complete event
+            "ts": round((span.start - self.origin) * 1e6, 1),
+            "dur": round(span.seconds * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": threads[span.thread],
+            "args": {key: value if isinstance(value, (int, float, bool)) else str(value)
+                     for key, value in span.attributes.items()},
+        } for span in spans]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+        print(f"Trace written to {path}")
+
+    def summary(self) -> str:
+        """One row per stage: count, total/mean/max wall time and the summed attributes"""
+        with self._lock:
+            spans, dropped = list(self.spans), self.dropped
+        stages: Dict[str, List[Span]] = {}
+        for span in spans:
+            stages.setdefault(span.name, []).append(span)
+        header = f"{'stage':<24} {'count':>6} {'total':>9} {'mean':>9} {'max':>9} " + " ".join(
+            f"{name:>10}" for name in SUMMED_ATTRIBUTES)
+        lines = [header, "-" * len(header)]
+        for name, group in sorted(stages.items(), key=lambda item: -sum(span.seconds for span in item[1])):
+            durations = [span.seconds for span in group]
+            sums = [sum(span.attributes.get(attribute, 0) for span in group) for attribute in SUMMED_ATTRIBUTES]
+            lines.append(f"{name:<24} {len(group):>6} {sum(durations):>8.2f}s {sum(durations) / len(group):>8.3f}s "
+                         f"{max(durations):>8.3f}s " + " ".join(f"{value:>10}" for value in sums))
+        if dropped:
+            lines.append(f"({dropped} older span(s) dropped, see A11Y_TRACE_MAX_SPANS)")
+        return "\n".join(lines)
+
+def get_trace_path() -> Optional[str]:
+    """Chrome trace file written at the end of the run, from A11Y_TRACE"""
+    return os.getenv("A11Y_TRACE") or None
+
+def is_tracing_enabled() -> bool:
+    return bool(get_trace_path()) or os.getenv("A11Y_TRACE_SUMMARY", "false").lower() == "true"
+
+_tracer = Tracer(enabled=is_tracing_enabled())
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer (enabled by A11Y_TRACE or A11Y_TRACE_SUMMARY)"""
+    return _tracer
+
+def enable_tracing():
+    _tracer.enabled = True
+
+def current_span():
+    return _tracer.current()
+
+def span(name: str, category: str = "review", **attributes):
+    """Span on the process-wide tracer: `with span("diff.fetch") as s: ...; s.set(files=12)`"""
+    return _tracer.span(name, category, **attributes)
+
+def _profile_new_threads(profilers: List) -> Callable:
+    """threading.setprofile hook giving each thread started from now on its own cProfile profiler"""
+    import cProfile
+
+    def start(frame, event, arg):
+        # runs on the first event of the new thread, then hands the thread over to cProfile
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is already active in this thread
+            return
+        profilers.append(profiler)
+    return start
+
+def run_traced(func: Callable, profile_path: Optional[str] = None):
+    """
+    Run func (an entry point), then write the Chrome trace (A11Y_TRACE) and print the summary
+    table. With profile_path, the run is also wrapped in cProfile, including the threads it
+    starts (rule workers): the merged stats are saved there (for snakeviz or pstats) and the 25
+    most expensive calls are printed.
+    """
+    profiler = None
+    thread_profilers = []
+    if profile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        if sys.version_info < (3, 12):
+            # from 3.12 cProfile sees every thread (sys.monitoring); before, only the one enabling it
+            threading.setprofile(_profile_new_threads(thread_profilers))
+    try:
+        with span("run"):
+            return func()
+    finally:
+        if profiler is not None:
+            import pstats
+            threading.setprofile(None)
+            profiler.disable()
+            stats = pstats.Stats(profiler)
+            for thread_profiler in thread_profilers:
+                stats.add(thread_profiler)
+            stats.dump_stats(profile_path)
+            print(f"Profile written to {profile_path}")
+            stats.sort_stats("cumulative").print_stats(25)
+        if _tracer.enabled:
+            print(_tracer.summary())
+            if get_trace_path():
+                _tracer.write_chrome_trace(get_trace_path())
@@ -0,0 +1,116 @@
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List
+from .diff_routing import NON_UI_KINDS, SCRIPT_UI_PATTERN, classify_file
+
+# Accessibility signals found in changed lines, with the WCAG success criteria they point to
+SIGNALS = [
+    ("image", r"<(img|svg|picture|canvas|figure)\b|\balt\s*=|role\s*=\s*[\"']img|background-image", ["1.1.1"]),
+    ("media", r"<(video|audio|track)\b|\.(mp4|webm|mp3|ogg|wav|vtt)\b", ["1.2.1", "1.2.2", "1.2.3"]),
+    ("autoplay", r"\bautoplay\b", ["1.4.2", "2.2.2"]),
+    ("heading", r"<h[1-6]\b|role\s*=\s*[\"']heading|aria-level", ["1.3.1", "2.4.6"]),
+    ("landmark", r"<(main|nav|header|footer|aside|section)\b|role\s*=\s*[\"'](main|navigation|banner|contentinfo|region)", ["1.3.1", "2.4.1"]),
+    ("table", r"<(table|th|caption|thead)\b|\bscope\s*=", ["1.3.1"]),
+    ("list", r"<(ul|ol|dl)\b", ["1.3.1"]),
+    ("form-field", r"<(input|select|textarea)\b", ["1.3.1", "3.3.2", "4.1.2"]),
+    ("label", r"<label\b|\bhtmlFor\s*=|\bfor\s*=|aria-label(ledby)?\s*=", ["2.5.3", "3.3.2", "4.1.2"]),
+    ("placeholder", r"\bplaceholder\s*=", ["3.3.2"]),
+    ("autocomplete", r"\bautocomplete\s*=", ["1.3.5"]),
+    # error markup only: a bare "error" would also match console.error and catch (error)
+    ("form-error", r"aria-invalid|aria-errormessage|aria-describedby\s*=|role\s*=\s*[\"']alert|\brequired\b|setCustomValidity|:invalid\b|"
+                   r"class(Name)?\s*=\s*(\{[^}\n]*|\"[^\"\n]*|'[^'\n]*)\b(error|invalid)\b", ["3.3.1", "3.3.3"]),
+    ("aria", r"\baria-[a-z]+\s*[=:]|\brole\s*=", ["4.1.2"]),
+    ("live-region", r"aria-live|role\s*=\s*[\"'](status|alert|log)", ["4.1.3"]),
+    ("color", r"(^|[\s;{])(color|background(-color)?|border-color|fill|stroke)\s*:|#[0-9a-fA-F]{3,8}\b|rgba?\(|hsla?\(", ["1.4.1", "1.4.3", "1.4.11"]),
+    ("text-size", r"font-size\s*:|line-height\s*:|letter-spacing\s*:|word-spacing\s*:", ["1.4.4", "1.4.12"]),
+    ("viewport", r"user-scalable|maximum-scale|@media|overflow(-x)?\s*:\s*(hidden|scroll)", ["1.4.4", "1.4.10"]),
+    ("hover-content", r":hover|onMouseEnter|onMouseOver|@mouseenter|tooltip", ["1.4.13"]),
+    ("tabindex", r"tab[iI]ndex", ["2.1.1", "2.4.3"]),
+    ("focus-style", r"outline\s*:\s*(none|0)|:focus|focus-visible|\.focus\(", ["2.4.7", "2.4.11", "2.4.13"]),
+    ("motion", r"@keyframes|animation\s*:|transition\s*:|prefers-reduced-motion|<marquee|<blink", ["2.2.2", "2.3.1", "2.3.3"]),
+    ("timing", r"setTimeout|setInterval|http-equiv\s*=\s*[\"']refresh", ["2.2.1", "2.2.2"]),
+    ("link", r"<a\b|<Link\b|\bhref\s*=", ["2.4.4"]),
+    ("page-title", r"<title\b|document\.title|<Head\b", ["2.4.2"]),
+    ("language", r"\blang\s*=", ["3.1.1", "3.1.2"]),
+    ("iframe", r"<iframe\b", ["4.1.2"]),
+    ("shortcut", r"accesskey|key\s*===?\s*[\"'][a-zA-Z]|hotkey", ["2.1.4"]),
+    ("drag", r"draggable|onDrag|@drag|ondrag", ["2.5.7"]),
+    ("context-change", r"onFocus\s*=.*(location|navigate|submit)|onChange\s*=.*(location|navigate|submit)", ["3.2.1", "3.2.2"]),
+]
+COMPILED_SIGNALS = [(name, re.compile(pattern), ref_ids) for name, pattern, ref_ids in SIGNALS]
+
+CLICK_PATTERN = re.compile(r"onClick|@click|v-on:click|on:click|\(click\)|addEventListener\(\s*[\"']click", re.IGNORECASE)
+KEY_PATTERN = re.compile(r"onKey(Down|Up|Press)|@key(down|up|press)|v-on:key|on:key|\(key(down|up)\)|"
+                         r"addEventListener\(\s*[\"']key", re.IGNORECASE)
+NATIVE_INTERACTIVE_PATTERN = re.compile(r"<(button|a|input|select|textarea|summary)\b", re.IGNORECASE)
+POSITIVE_TABINDEX_PATTERN = re.compile(r"tab[iI]ndex\s*=\s*[\"'{]?\s*[1-9]")
+
+@dataclass
+class DiffClassification:
+    """Outcome of the static pre-classification of a file diff"""
+    file_name: str
+    kind: str  # "non_ui" (skip), "signals" (use ref_ids) or "ambiguous" (needs an LLM description)
+    signals: List[str] = field(default_factory=list)
+    ref_ids: List[str] = field(default_factory=list)
+
+def changed_lines(diff_content: str) -> List[str]:
+    """Added and removed lines of a unified diff (removing an alt or a label is a signal too)"""
+    return [
+        line[1:] for line in diff_content.split('\n')
+        if line[:1] in ('+', '-') and not line.startswith(('+++', '---'))
+    ]
+
+def classify_diff(diff_content: str, file_name: str) -> DiffClassification:
+    """Extract accessibility signals from a file diff and map them to WCAG ref_ids"""
+    kind = classify_file(file_name)
+    if kind in NON_UI_KINDS or (kind == "script" and not SCRIPT_UI_PATTERN.search(diff_content)):
+        return DiffClassification(file_name=file_name, kind="non_ui")
+
+    changed = '\n'.join(changed_lines(diff_content))
+    signals = []
+    ref_ids = []
+    for name, pattern, signal_ref_ids in COMPILED_SIGNALS:
+        if pattern.search(changed):
+            signals.append(name)
+            ref_ids.extend(signal_ref_ids)
+
+    # click handlers on non-interactive elements without a keyboard equivalent
+    for line in changed.split('\n'):
+        if CLICK_PATTERN.search(line) and not KEY_PATTERN.search(changed) and not NATIVE_INTERACTIVE_PATTERN.search(line):
+            signals.append("click-without-keyboard")
+            ref_ids.extend(["2.1.1", "4.1.2"])
+            break
+    if POSITIVE_TABINDEX_PATTERN.search(changed):
+        signals.append("positive-tabindex")
+        ref_ids.append("2.4.3")
+
+    if not signals:
+        return DiffClassification(file_name=file_name, kind="ambiguous")
+    return DiffClassification(file_name=file_name, kind="signals", signals=signals, ref_ids=list(dict.fromkeys(ref_ids)))
+
+class PreclassifierStats:
+    """Counts how many LLM description calls the pre-classifier avoided"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {"non_ui": 0, "signals": 0, "ambiguous": 0}
+
+    def record(self, classification: DiffClassification):
+        with self._lock:
+            self.counts[classification.kind] += 1
+
+    @property
+    def llm_calls_avoided(self) -> int:
+        return self.counts["non_ui"] + self.counts["signals"]
+
+    def summary(self) -> str:
+        total = sum(self.counts.values())
+        return (f"Pre-classifier: {total} file(s), {self.counts['non_ui']} skipped as non-UI, "
+                f"{self.counts['signals']} matched from static signals, {self.counts['ambiguous']} sent to the LLM "
+                f"({self.llm_calls_avoided} LLM description calls avoided)")
+
+preclassifier_stats = PreclassifierStats()
+
+def is_preclassifier_enabled() -> bool:
+    return os.getenv("A11Y_PRECLASSIFY", "true").lower() not in ("0", "false", "no", "off")
@@ -0,0 +1,33 @@
+from typing import List, Optional
+from pydantic import BaseModel
+
+class AffectedSection(BaseModel):
+    """A section of the PR that does not comply with a rule"""
+    file: Optional[str] = None
+    section: Optional[str] = None
+    why_is_not_complying: Optional[str] = None
+    what_should_be_changed: Optional[List[str]] = None
+
+class Verdict(BaseModel):
+    """Rule validation result, with the same shape as the responses returned by validate_rule"""
+    complies: bool
+    score: int = 100
+    affected_sections: Optional[List[AffectedSection]] = None
+
+    @classmethod
+    def from_response(cls, response) -> "Verdict":
+        """Build a Verdict from any validate_rule response (pydantic model or plain object)"""
+        if isinstance(response, cls):
+            return response
+        if hasattr(response, "model_dump"):
+            return cls.model_validate(response.model_dump())
+        sections = [
+            AffectedSection(
+                file=getattr(section, "file", None),
+                section=getattr(section, "section", None),
+                why_is_not_complying=getattr(section, "why_is_not_complying", None),
+                what_should_be_changed=getattr(section, "what_should_be_changed", None),
+            )
+            for section in getattr(response, "affected_sections", None) or []
+        ]
+        return cls(complies=response.complies, score=response.score, affected_sections=sections)
@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from .lexical import BM25Index
+
+# Bump whenever the layout of WCAGCorpus changes, so older cache files are rebuilt
+CORPUS_FORMAT_VERSION = 1
+CACHE_MAGIC = b"A11YCORPUS"
+
+# data/wcag_2_2_new.json next to the crew package (in the repo and in the Docker image)
+DEFAULT_WCAG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "wcag_2_2_new.json")
+
+class WCAGGuideline(BaseModel):
+    """Model for WCAG guideline"""
+    ref_id: str
+    title: str
+    description: str
+    url: str = ""
+    techniques: List[str] = []
+    failures: List[str] = []
+
+    def to_text(self) -> str:
+        # Add relevant keywords based on the guideline ID and title
+        keywords = []
+        categories = []
+
+        # Perceivable (1.x)
+        if self.ref_id.startswith("1.1"):
+            keywords.extend(["alt text", "image descriptions", "non-text content", "screen readers"])
+            categories.append("Text Alternatives")
+        elif self.ref_id.startswith("1.2"):
+            keywords.extend(["captions", "audio", "video", "multimedia", "transcripts"])
+            categories.append("Time-based Media")
+        elif self.ref_id.startswith("1.3"):
+            keywords.extend(["structure", "semantics", "headings", "labels", "relationships"])
+            categories.append("Adaptable Content")
+        elif self.ref_id.startswith("1.4"):
+            keywords.extend(["contrast", "color", "text size", "spacing", "visual presentation"])
+            categories.append("Distinguishable Content")
+
+        # Operable (2.x)
+        elif self.ref_id.startswith("2.1"):
+            keywords.extend(["keyboard", "navigation", "shortcuts", "input methods"])
+            categories.append("Keyboard Accessibility")
+        elif self.ref_id.startswith("2.2"):
+            keywords.extend(["timing", "animations", "auto-updates", "interruptions"])
+            categories.append("Time Limits")
+        elif self.ref_id.startswith("2.3"):
+            keywords.extend(["seizures", "flashing", "animations", "motion"])
+            categories.append("Seizures and Physical Reactions")
+        elif self.ref_id.startswith("2.4"):
+            keywords.extend(["navigation", "landmarks", "headings", "focus", "links"])
+            categories.append("Navigation")
+        elif self.ref_id.startswith("2.5"):
+            keywords.extend(["pointer", "touch", "gestures", "motion", "input methods"])
+            categories.append("Input Modalities")
+
+        # Understandable (3.x)
+        elif self.ref_id.startswith("3.1"):
+            keywords.extend(["language", "readability", "pronunciation"])
+            categories.append("Readable Content")
+        elif self.ref_id.startswith("3.2"):
+            keywords.extend(["predictable", "consistency", "navigation", "behavior"])
+            categories.append("Predictable Behavior")
+        elif self.ref_id.startswith("3.3"):
+            keywords.extend(["forms", "errors", "labels", "instructions", "validation"])
+            categories.append("Input Assistance")
+
+        # Robust (4.x)
+        elif self.ref_id.startswith("4.1"):
+            keywords.extend(["parsing", "compatibility", "aria", "status messages"])
+            categories.append("Compatibility")
+
+        keywords_str = ", ".join(keywords) if keywords else "No specific keywords"
+        categories_str = ", ".join(categories) if categories else "Uncategorized"
+
+        # Build techniques and failures sections
+        techniques_str = "\nTechniques:\n" + "\n".join(f"- {t}" for t in self.techniques) if self.techniques else ""
+        failures_str = "\nCommon Failures:\n" + "\n".join(f"- {f}" for f in self.failures) if self.failures else ""
+
+        return f"""
+        WCAG 2.2 Success Criterion {self.ref_id}: {self.title}
+
+        Description:
+        {self.description}
+
+        Categories: {categories_str}
+        Keywords: {keywords_str}{techniques_str}{failures_str}
+
+        This guideline helps ensure web content is accessible to users with disabilities by addressing:
+        - Users who rely on screen readers and assistive technologies
+        - Users with visual impairments
+        - Users with motor impairments
+        - Users with cognitive disabilities
+
+        Reference: {self.url or 'N/A'}
+        """
+
+class WCAGCorpus:
+    """
+    The WCAG corpus, parsed once into column tuples (one position per success criterion)
+    with indexes by ref_id, level and principle, the rendered to_text() of every criterion and
+    the BM25 index over those texts.
+
+    WCAGGuideline objects are shared by every caller (a corpus loaded from the cache file builds
+    them on first access), so retrieval resolves its hits with a dict lookup by ref_id.
+    """
+    __slots__ = ("source_hash", "ref_ids", "titles", "descriptions", "urls", "levels", "techniques", "failures",
+                 "texts", "lexical", "by_ref_id", "by_level", "by_principle", "_guidelines", "_lock")
+
+    def __init__(self, source_hash: str, rows: List[Tuple[str, str, str, str, str, Tuple[str, ...], Tuple[str, ...]]]):
+        self.source_hash = source_hash
+        self.ref_ids, self.titles, self.descriptions, self.urls, self.levels, self.techniques, self.failures = (
+            tuple(column) for column in zip(*rows)) if rows else ((),) * 7
+        self.texts: Tuple[str, ...] = ()
+        self.lexical: Optional[BM25Index] = None
+        self.by_ref_id: Dict[str, int] = {}
+        self.by_level: Dict[str, Tuple[int, ...]] = {}
+        self.by_principle: Dict[str, Tuple[int, ...]] = {}
+        self._build_indexes()
+        self._guidelines: List[Optional[WCAGGuideline]] = [self._materialize(i) for i in range(len(self.ref_ids))]
+        self.texts = tuple(guideline.to_text() for guideline in self._guidelines)
+        self.lexical = BM25Index.build(dict(zip(self.ref_ids, self.texts)))
+        self._lock = threading.Lock()
+
+    def _build_indexes(self):
+        self.by_ref_id = {ref_id: i for i, ref_id in enumerate(self.ref_ids)}
+        by_level, by_principle = {}, {}
+        for i, (ref_id, level) in enumerate(zip(self.ref_ids, self.levels)):
+            by_level.setdefault(level, []).append(i)
+            by_principle.setdefault(ref_id.split(".")[0], []).append(i)
+        self.by_level = {level: tuple(positions) for level, positions in by_level.items()}
+        self.by_principle = {principle: tuple(positions) for principle, positions in by_principle.items()}
+
+    def __len__(self) -> int:
+        return len(self.ref_ids)
+
+    def __contains__(self, ref_id: str) -> bool:
+        return ref_id in self.by_ref_id
+
+    # the lock and the materialized objects are not part of the cache file
+    def __getstate__(self):
+        return {"columns": (self.source_hash, self.ref_ids, self.titles, self.descriptions, self.urls, self.levels,
+                            self.techniques, self.failures, self.texts, self.lexical)}
+
+    def __setstate__(self, state):
+        (self.source_hash, self.ref_ids, self.titles, self.descriptions, self.urls, self.levels,
+         self.techniques, self.failures, self.texts, self.lexical) = state["columns"]
+        self._build_indexes()
+        self._guidelines = [None] * len(self.ref_ids)
+        self._lock = threading.Lock()
+
+    def _materialize(self, i: int) -> WCAGGuideline:
+        return WCAGGuideline(
+            ref_id=self.ref_ids[i],
+            title=self.titles[i],
+            description=self.descriptions[i],
+            url=self.urls[i],
+            techniques=list(self.techniques[i]),
+            failures=list(self.failures[i])
+        )
+
+    def _guideline_at(self, i: int) -> WCAGGuideline:
+        guideline = self._guidelines[i]
+        if guideline is None:
+            with self._lock:
+                guideline = self._guidelines[i]
+                if guideline is None:
+                    guideline = self._guidelines[i] = self._materialize(i)
+        return guideline
+
+    def get(self, ref_id: str) -> Optional[WCAGGuideline]:
+        i = self.by_ref_id.get(ref_id)
+        return None if i is None else self._guideline_at(i)
+
+    def text(self, ref_id: str) -> Optional[str]:
+        i = self.by_ref_id.get(ref_id)
+        return None if i is None else self.texts[i]
+
+    def guidelines(self) -> List[WCAGGuideline]:
+        return [self._guideline_at(i) for i in range(len(self.ref_ids))]
+
+    def with_level(self, level: str) -> List[WCAGGuideline]:
+        return [self._guideline_at(i) for i in self.by_level.get(level, ())]
+
+    def in_principle(self, principle: str) -> List[WCAGGuideline]:
+        """Guidelines of a principle, given by its number ('1' perceivable ... '4' robust)"""
+        return [self._guideline_at(i) for i in self.by_principle.get(principle, ())]
+
+def parse_corpus(data: bytes) -> WCAGCorpus:
+    """Parse the JSON corpus (data/wcag_2_2_new.json format)"""
+    rows = []
+    for guideline in json.loads(data)["guidelines"]:
+        # Extract ref_id and title from the name field (e.g., "1.1.1 Non-text Content")
+        ref_id, title = guideline["name"].split(" ", 1)
+        rows.append((
+            ref_id,
+            title,
+            guideline["description"],
+            guideline.get("url", f"https://www.w3.org/WAI/WCAG22/Understanding/{ref_id.lower()}.html"),
+            guideline.get("level", ""),
+            tuple(guideline.get("techniques", [])),
+            tuple(guideline.get("failures", []))
+        ))
+    return WCAGCorpus(hashlib.sha256(data).hexdigest(), rows)
+
+def get_corpus_cache_path(wcag_file: str, source_hash: str) -> Optional[str]:
+    """
+    Binary cache of the parsed corpus, named after the JSON file and its content hash, so every
+    source gets its own file: in the A11Y_CORPUS_CACHE directory, by default next to the JSON
+    file ('off' disables it)
+    """
+    value = os.getenv("A11Y_CORPUS_CACHE")
+    if value and value.lower() in ("off", "false", "0", "none"):
+        return None
+    stem = os.path.splitext(os.path.basename(wcag_file))[0]
+    return os.path.join(value or os.path.dirname(os.path.abspath(wcag_file)), f"{stem}.{source_hash[:16]}.corpus.pickle")
+
+def _read_cache(path: str, source_hash: str) -> Optional[WCAGCorpus]:
+    try:
+        with open(path, "rb") as f:
+            blob = f.read()
+    except OSError:
+        return None
+    header_size = len(CACHE_MAGIC) + 4 + 32
+    if len(blob) < header_size or not blob.startswith(CACHE_MAGIC):
+        return None
+    version = int.from_bytes(blob[len(CACHE_MAGIC):len(CACHE_MAGIC) + 4], "big")
+    checksum, payload = blob[len(CACHE_MAGIC) + 4:header_size], blob[header_size:]
+    if version != CORPUS_FORMAT_VERSION or hashlib.sha256(payload).digest() != checksum:
+        print(f"Ignoring outdated or corrupted corpus cache {path}")
+        return None
+    corpus = pickle.loads(payload)
+    return corpus if corpus.source_hash == source_hash else None
+
+def _write_cache(path: str, corpus: WCAGCorpus):
+    payload = pickle.dumps(corpus, protocol=pickle.HIGHEST_PROTOCOL)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temporary, "wb") as f:
+            f.write(CACHE_MAGIC + CORPUS_FORMAT_VERSION.to_bytes(4, "big") + hashlib.sha256(payload).digest() + payload)
+        os.replace(temporary, path)
+    except OSError as e:
+        # a read-only data directory just means the corpus is parsed on every start
+        print(f"Could not write the corpus cache {path}: {e}")
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+def load_corpus(wcag_file: str = DEFAULT_WCAG_FILE) -> WCAGCorpus:
+    """
+    Load the corpus from its binary cache when it matches the JSON file (same content hash,
+    format version and checksum), or parse the JSON file and refresh the cache.
+    """
+    with open(wcag_file, "rb") as f:
+        data = f.read()
+    source_hash = hashlib.sha256(data).hexdigest()
+    cache_path = get_corpus_cache_path(wcag_file, source_hash)
+    corpus = _read_cache(cache_path, source_hash) if cache_path else None
+    if corpus is None:
+        corpus = parse_corpus(data)
+        if cache_path:
+            _write_cache(cache_path, corpus)
+    return corpus
+
+_corpora: Dict[str, WCAGCorpus] = {}
+_corpora_lock = threading.Lock()
+
+def get_corpus(wcag_file: str = DEFAULT_WCAG_FILE) -> WCAGCorpus:
+    """Process-wide corpus for a JSON file, loaded once"""
+    path = os.path.abspath(wcag_file)
+    with _corpora_lock:
+        if path not in _corpora:
+            _corpora[path] = load_corpus(path)
+        return _corpora[path]
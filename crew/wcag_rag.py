@@ -4,220 +4,308 @@ from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import OllamaEmbeddings
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+import hashlib
 import json
 import os
-from pydantic import BaseModel
+import threading
 from .utils import get_llm
+from .embedding_cache import CachedEmbeddings, get_embedding_cache, get_model_id
+from .index_artifact import IndexArtifactError, get_index_path, load_index_artifact
+from .retrieval import ChromaBackend, NumpyBackend, RetrievalBackend, get_backend_name, use_mmap
+from .lexical import BM25Index, reciprocal_rank_fusion
+from .ui_signals import classify_diff, is_preclassifier_enabled, preclassifier_stats
+from .prompt_budget import count_tokens
+from .tracing import span
+from .wcag_corpus import DEFAULT_WCAG_FILE, WCAGCorpus, WCAGGuideline, get_corpus, load_corpus
 
-class WCAGGuideline(BaseModel):
-    """Model for WCAG guideline"""
-    ref_id: str
-    title: str
-    description: str
-    url: str = ""
-    techniques: List[str] = []
-    failures: List[str] = []
-
-    def to_text(self) -> str:
-        # Add relevant keywords based on the guideline ID and title
-        keywords = []
-        categories = []
-        
-        # Perceivable (1.x)
-        if self.ref_id.startswith("1.1"):
-            keywords.extend(["alt text", "image descriptions", "non-text content", "screen readers"])
-            categories.append("Text Alternatives")
-        elif self.ref_id.startswith("1.2"):
-            keywords.extend(["captions", "audio", "video", "multimedia", "transcripts"])
-            categories.append("Time-based Media")
-        elif self.ref_id.startswith("1.3"):
-            keywords.extend(["structure", "semantics", "headings", "labels", "relationships"])
-            categories.append("Adaptable Content")
-        elif self.ref_id.startswith("1.4"):
-            keywords.extend(["contrast", "color", "text size", "spacing", "visual presentation"])
-            categories.append("Distinguishable Content")
-            
-        # Operable (2.x)
-        elif self.ref_id.startswith("2.1"):
-            keywords.extend(["keyboard", "navigation", "shortcuts", "input methods"])
-            categories.append("Keyboard Accessibility")
-        elif self.ref_id.startswith("2.2"):
-            keywords.extend(["timing", "animations", "auto-updates", "interruptions"])
-            categories.append("Time Limits")
-        elif self.ref_id.startswith("2.3"):
-            keywords.extend(["seizures", "flashing", "animations", "motion"])
-            categories.append("Seizures and Physical Reactions")
-        elif self.ref_id.startswith("2.4"):
-            keywords.extend(["navigation", "landmarks", "headings", "focus", "links"])
-            categories.append("Navigation")
-        elif self.ref_id.startswith("2.5"):
-            keywords.extend(["pointer", "touch", "gestures", "motion", "input methods"])
-            categories.append("Input Modalities")
-            
-        # Understandable (3.x)
-        elif self.ref_id.startswith("3.1"):
-            keywords.extend(["language", "readability", "pronunciation"])
-            categories.append("Readable Content")
-        elif self.ref_id.startswith("3.2"):
-            keywords.extend(["predictable", "consistency", "navigation", "behavior"])
-            categories.append("Predictable Behavior")
-        elif self.ref_id.startswith("3.3"):
-            keywords.extend(["forms", "errors", "labels", "instructions", "validation"])
-            categories.append("Input Assistance")
-            
-        # Robust (4.x)
-        elif self.ref_id.startswith("4.1"):
-            keywords.extend(["parsing", "compatibility", "aria", "status messages"])
-            categories.append("Compatibility")
-            
-        keywords_str = ", ".join(keywords) if keywords else "No specific keywords"
-        categories_str = ", ".join(categories) if categories else "Uncategorized"
-        
-        # Build techniques and failures sections
-        techniques_str = "\nTechniques:\n" + "\n".join(f"- {t}" for t in self.techniques) if self.techniques else ""
-        failures_str = "\nCommon Failures:\n" + "\n".join(f"- {f}" for f in self.failures) if self.failures else ""
-        
-        return f"""
-        WCAG 2.2 Success Criterion {self.ref_id}: {self.title}
-        
-        Description:
-        {self.description}
-        
-        Categories: {categories_str}
-        Keywords: {keywords_str}{techniques_str}{failures_str}
-        
-        This guideline helps ensure web content is accessible to users with disabilities by addressing:
-        - Users who rely on screen readers and assistive technologies
-        - Users with visual impairments
-        - Users with motor impairments
-        - Users with cognitive disabilities
-        
-        Reference: {self.url or 'N/A'}
-        """
+# BM25 score above which hybrid retrieval trusts the lexical match and skips the embedding call
+DEFAULT_LEXICAL_MIN_SCORE = 12.0
+
+def load_guidelines(wcag_file: str = DEFAULT_WCAG_FILE) -> List[WCAGGuideline]:
+    """Load the WCAG 2.2 guidelines from the JSON file (through the binary corpus cache)"""
+    return load_corpus(wcag_file).guidelines()
+
+# Text splitter for chunking guidelines
+_text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=1000,
+    chunk_overlap=200,
+    length_function=len,
+    separators=["\n\n", "\n", " ", ""]
+)
+
+def _content_hash(guideline: WCAGGuideline) -> str:
+    return hashlib.sha256(guideline.to_text().encode("utf-8")).hexdigest()
+
+def _guideline_chunks(guideline: WCAGGuideline) -> Tuple[List[str], List[str], List[Dict]]:
+    """Split a guideline into chunks, with ids based on its ref_id so they stay stable across rebuilds"""
+    content_hash = _content_hash(guideline)
+    chunks = _text_splitter.create_documents([guideline.to_text()])
+    ids, texts, metadatas = [], [], []
+    for j, chunk in enumerate(chunks):
+        ids.append(f"wcag_{guideline.ref_id}_chunk_{j}")
+        texts.append(chunk.page_content)
+        metadatas.append({
+            "ref_id": guideline.ref_id,
+            "title": guideline.title,
+            "url": guideline.url,
+            "techniques": "|".join(guideline.techniques) if guideline.techniques else "",
+            "failures": "|".join(guideline.failures) if guideline.failures else "",
+            "content_hash": content_hash
+        })
+    return ids, texts, metadatas
 
 class WCAGVectorStore:
-    def __init__(self, persist_directory: str = ".chroma_db"):
+    """
+    WCAG guidelines vector store.
+
+    The store owns a single Chroma client, collection handle and embeddings client, which are
+    opened lazily on first use and shared by all queries. It is safe to use from several threads;
+    use get_vector_store() to share one instance across the whole process.
+    """
+    def __init__(self, persist_directory: str = ".chroma_db", embeddings=None, index_path: Optional[str] = None):
         self.persist_directory = persist_directory
-        # Use OpenAI embeddings with API key from environment
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        if not openai_api_key:
-            raise ValueError("OPENAI_API_KEY environment variable is not set")
-        self.embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
+        # Prebuilt read-only index artifact; None uses A11Y_INDEX_PATH or the default one, "" disables it
+        self.index_path = get_index_path() if index_path is None else (index_path or None)
+        self.retrieval_mode = get_retrieval_mode()
+        # The lexical-only mode never embeds anything
+        if embeddings is None and self.retrieval_mode != "lexical":
+            # Use OpenAI embeddings with API key from environment
+            openai_api_key = os.getenv("OPENAI_API_KEY")
+            if not openai_api_key:
+                raise ValueError("OPENAI_API_KEY environment variable is not set")
+            embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
+        self.embedding_model = get_model_id(embeddings) if embeddings is not None else None
+        # Unchanged guideline chunks and repeated queries are served from the embedding cache
+        self.embedding_cache = get_embedding_cache() if embeddings is not None else None
+        if self.embedding_cache:
+            embeddings = CachedEmbeddings(embeddings, self.embedding_cache)
+        self.embeddings = embeddings
         self.collection_name = "wcag_2_2_guidelines_new"
-        
-    def initialize_db(self, wcag_file: str = "data/wcag_2_2_new.json"):
-        """Initialize the vector store with WCAG 2.2 guidelines"""
-        # Load WCAG 2.2 guidelines from JSON file
-        with open(wcag_file, "r") as f:
-            wcag_data = json.load(f)
-        
-        # Convert guidelines to WCAGGuideline objects
-        guidelines = []
-        for guideline in wcag_data["guidelines"]:
-            # Extract ref_id and title from the name field (e.g., "1.1.1 Non-text Content")
-            name_parts = guideline["name"].split(" ", 1)
-            ref_id = name_parts[0]
-            title = name_parts[1]
-            
-            wcag_guideline = WCAGGuideline(
-                ref_id=ref_id,
-                title=title,
-                description=guideline["description"],
-                url=guideline.get("url", f"https://www.w3.org/WAI/WCAG22/Understanding/{ref_id.lower()}.html"),
-                techniques=guideline.get("techniques", []),
-                failures=guideline.get("failures", [])
+        self._lock = threading.RLock()
+        self._client = None
+        self._collection = None
+        self._vector_store = None
+        self._backend = None
+        self._lexical = None
+        self.backend_name = get_backend_name()
+        self.lexical_min_score = float(os.getenv("A11Y_LEXICAL_MIN_SCORE", DEFAULT_LEXICAL_MIN_SCORE))
+        self._stats = {"client_opens": 0, "collection_fetches": 0, "initializations": 0, "artifact_loads": 0, "queries": 0,
+                       "embedded_queries": 0, "lexical_only_queries": 0}
+
+    def _count(self, stat: str, amount: int = 1):
+        with self._lock:
+            self._stats[stat] += amount
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Connection and usage counters"""
+        with self._lock:
+            stats = dict(self._stats, open=self._client is not None)
+        if self.embedding_cache:
+            stats.update({f"embedding_cache_{key}": value for key, value in self.embedding_cache.stats.items()})
+        return stats
+
+    def open(self):
+        """Open the Chroma client (if not open yet) and return it"""
+        with self._lock:
+            if self._client is None:
+                if self.index_path:
+                    self._client = self._load_index_artifact()
+                else:
+                    self._client = chromadb.PersistentClient(path=self.persist_directory)
+                self._stats["client_opens"] += 1
+            return self._client
+
+    def _load_index_artifact(self):
+        # the vectors come from the artifact, so loading it makes no embedding calls
+        artifact = load_index_artifact(self.index_path, self.embedding_model)
+        client = chromadb.EphemeralClient()
+        collection = client.get_or_create_collection(name=self.collection_name)
+        collection.upsert(
+            ids=artifact.ids,
+            documents=artifact.documents,
+            metadatas=artifact.metadatas,
+            embeddings=artifact.embeddings()
+        )
+        self._collection = collection
+        self._stats["artifact_loads"] += 1
+        print(f"Loaded guideline index artifact from {self.index_path} ({len(artifact)} chunks)")
+        return client
+
+    def _check_writable(self):
+        if self.index_path:
+            raise IndexArtifactError(
+                f"The vector store is backed by the read-only index artifact at {self.index_path}; "
+                "set A11Y_INDEX_PATH=off to use the Chroma database instead"
             )
-            guidelines.append(wcag_guideline)
+
+    def close(self):
+        """Release the client and collection handles; they are reopened on next use"""
+        with self._lock:
+            self._collection = None
+            self._vector_store = None
+            self._backend = None
+            self._client = None
+
+    @property
+    def collection(self):
+        """Collection handle, initializing the database if the collection doesn't exist yet"""
+        with self._lock:
+            if self._collection is None:
+                client = self.open()
+                try:
+                    self._collection = client.get_collection(name=self.collection_name)
+                except ValueError:
+                    self.initialize_db()
+                    self._collection = client.get_collection(name=self.collection_name)
+                self._stats["collection_fetches"] += 1
+            return self._collection
+
+    @property
+    def backend(self) -> RetrievalBackend:
+        """Retrieval backend selected with A11Y_RETRIEVAL_BACKEND"""
+        with self._lock:
+            if self._backend is None:
+                if self.backend_name == "numpy":
+                    if self.index_path:
+                        # straight from the artifact, Chroma is never opened
+                        artifact = load_index_artifact(self.index_path, self.embedding_model, load_vectors=False)
+                        self._backend = NumpyBackend.from_artifact(artifact, mmap=use_mmap())
+                        self._stats["artifact_loads"] += 1
+                    else:
+                        self._backend = NumpyBackend.from_collection(self.collection)
+                else:
+                    self._backend = ChromaBackend(self.collection)
+            return self._backend
+
+    @property
+    def corpus(self) -> WCAGCorpus:
+        """The parsed WCAG corpus, shared by the whole process"""
+        return get_corpus()
+
+    @property
+    def guidelines(self) -> Dict[str, WCAGGuideline]:
+        """WCAG guidelines by ref_id"""
+        return {guideline.ref_id: guideline for guideline in self.corpus.guidelines()}
+
+    @property
+    def lexical(self) -> BM25Index:
+        """BM25 index over the guidelines, precomputed in the index artifact or built from the corpus"""
+        with self._lock:
+            if self._lexical is None:
+                artifact = load_index_artifact(self.index_path, load_vectors=False) if self.index_path else None
+                if artifact and artifact.lexical_path:
+                    with open(artifact.lexical_path, "r") as f:
+                        self._lexical = BM25Index.from_dict(json.load(f))
+                else:
+                    self._lexical = self.corpus.lexical
+            return self._lexical
+
+    @property
+    def vector_store(self) -> Chroma:
+        """LangChain wrapper around the shared client"""
+        with self._lock:
+            if self._vector_store is None:
+                self._vector_store = Chroma(
+                    client=self.open(),
+                    collection_name=self.collection_name,
+                    embedding_function=self.embeddings
+                )
+            return self._vector_store
         
-        # Create text splitter for chunking guidelines
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+    def initialize_db(self, wcag_file: str = DEFAULT_WCAG_FILE):
+        """Initialize the vector store with WCAG 2.2 guidelines"""
+        self._check_writable()
+        guidelines = load_guidelines(wcag_file)
         
         # Convert guidelines to text and create chunks
         texts = []
         metadatas = []
         ids = []
         
-        for i, guideline in enumerate(guidelines):
-            guideline_text = guideline.to_text()
-            chunks = text_splitter.create_documents([guideline_text])
-            
-            for j, chunk in enumerate(chunks):
-                texts.append(chunk.page_content)
-                metadatas.append({
-                    "ref_id": guideline.ref_id,
-                    "title": guideline.title,
-                    "url": guideline.url,
-                    "techniques": "|".join(guideline.techniques) if guideline.techniques else "",
-                    "failures": "|".join(guideline.failures) if guideline.failures else ""
-                })
-                ids.append(f"guideline_{i}_chunk_{j}")
-        
-        # Create vector store
-        self.vector_store = Chroma(
-            collection_name=self.collection_name,
-            embedding_function=self.embeddings,
-            persist_directory=self.persist_directory
-        )
+        for guideline in guidelines:
+            chunk_ids, chunk_texts, chunk_metadatas = _guideline_chunks(guideline)
+            ids.extend(chunk_ids)
+            texts.extend(chunk_texts)
+            metadatas.extend(chunk_metadatas)
         
-        # Add texts to vector store
-        self.vector_store.add_texts(
-            texts=texts,
-            metadatas=metadatas,
-            ids=ids
-        )
+        # Add texts to vector store (the persistent client writes them to disk)
+        with self._lock:
+            self.vector_store.add_texts(
+                texts=texts,
+                metadatas=metadatas,
+                ids=ids
+            )
+            self._collection = None
+            self._backend = None
+            self._stats["initializations"] += 1
+
+    def sync_db(self, wcag_file: str = DEFAULT_WCAG_FILE) -> Dict[str, int]:
+        """
+        Incrementally sync the vector store with the WCAG guidelines file.
+
+        Each chunk stores the hash of its guideline text, so only new or changed guidelines are
+        re-chunked, embedded and upserted, and chunks of removed guidelines are deleted.
         
-        # Persist the vector store
-        self.vector_store.persist()
+        Returns:
+            Dict[str, int]: number of added, updated, unchanged and deleted guidelines
+        """
+        self._check_writable()
+        guidelines = load_guidelines(wcag_file)
+        with self._lock:
+            collection = self.open().get_or_create_collection(name=self.collection_name)
+            existing = collection.get(include=["metadatas"])
+
+            # ref_id -> {chunk id: content hash} of what is stored today
+            stored: Dict[str, Dict[str, str]] = {}
+            stale_ids = []
+            for chunk_id, metadata in zip(existing["ids"], existing["metadatas"]):
+                if metadata and metadata.get("content_hash"):
+                    stored.setdefault(metadata["ref_id"], {})[chunk_id] = metadata["content_hash"]
+                else:
+                    # chunks written before content hashes and stable ids existed
+                    stale_ids.append(chunk_id)
+
+            stats = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+            ids, texts, metadatas = [], [], []
+            for guideline in guidelines:
+                content_hash = _content_hash(guideline)
+                previous = stored.pop(guideline.ref_id, {})
+                if previous and set(previous.values()) == {content_hash}:
+                    stats["unchanged"] += 1
+                    continue
+                chunk_ids, chunk_texts, chunk_metadatas = _guideline_chunks(guideline)
+                stats["updated" if previous else "added"] += 1
+                ids.extend(chunk_ids)
+                texts.extend(chunk_texts)
+                metadatas.extend(chunk_metadatas)
+                # the guideline may now have fewer chunks than before
+                stale_ids.extend(set(previous) - set(chunk_ids))
+
+            # whatever is left belongs to guidelines that were removed from the file
+            for chunks in stored.values():
+                stale_ids.extend(chunks)
+            stats["deleted"] = len(stored)
+
+            if stale_ids:
+                collection.delete(ids=stale_ids)
+            if ids:
+                collection.upsert(
+                    ids=ids,
+                    documents=texts,
+                    metadatas=metadatas,
+                    embeddings=self.embeddings.embed_documents(texts)
+                )
+            self._collection = None
+            self._vector_store = None
+            self._backend = None
+            self._stats["initializations"] += 1
+        return stats
 
     def query_similar_guidelines(self, code_description: str, k: int = 3) -> List[Dict]:
         """Query the vector store for similar WCAG guidelines based on code description"""
-        # Create vector store if not already created
-        if not hasattr(self, 'vector_store'):
-            self.vector_store = Chroma(
-                collection_name=self.collection_name,
-                embedding_function=self.embeddings,
-                persist_directory=self.persist_directory
-            )
-        
-        # Query vector store
-        results = self.vector_store.similarity_search_with_score(code_description, k=k)
-        
-        # Process results
-        guidelines = []
-        seen_refs = set()  # Track seen ref_ids to avoid duplicates
-        
-        for doc, score in results:
-            metadata = doc.metadata
-            ref_id = metadata['ref_id']
-            
-            # Skip if we've already seen this guideline
-            if ref_id in seen_refs:
-                continue
-            seen_refs.add(ref_id)
-            
-            # Create guideline object
-            guideline = WCAGGuideline(
-                ref_id=ref_id,
-                title=metadata['title'],
-                description=doc.page_content,
-                url=metadata.get('url', ''),
-                techniques=metadata.get('techniques', '').split("|") if metadata.get('techniques', '') else [],
-                failures=metadata.get('failures', '').split("|") if metadata.get('failures', '') else []
-            )
-            
-            guidelines.append({
-                'guideline': guideline,
-                'score': score,
-                'text': guideline.to_text()
-            })
-        
-        return guidelines
+        return self.query_many([code_description], k)[0]
 
     def query(self, query_text: str, k: int = 3) -> List[WCAGGuideline]:
         """
@@ -230,40 +318,179 @@ class WCAGVectorStore:
         Returns:
             List[WCAGGuideline]: List of relevant WCAG guidelines
         """
-        # Create Chroma client
-        client = chromadb.PersistentClient(path=self.persist_directory)
-        
-        # Try to get collection, initialize if it doesn't exist
-        try:
-            collection = client.get_collection(name=self.collection_name)
-        except ValueError:
-            self.initialize_db()
-            collection = client.get_collection(name=self.collection_name)
-        
-        # Get embeddings for query
-        query_embedding = self.embeddings.embed_query(query_text)
-        
-        # Query the collection
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=k,
-            include=["documents", "metadatas"]
-        )
-        
-        # Convert results to WCAGGuideline objects
+        return [result['guideline'] for result in self.query_many([query_text], k)[0]]
+
+    def query_many(self, texts: List[str], k: int = 3) -> List[List[Dict]]:
+        """
+        Query the vector store for several texts at once.
+
+        All texts are embedded with a single bulk embeddings request and searched with a single
+        backend search, instead of one embedding call and one search per text.
+
+        With A11Y_RETRIEVAL_MODE=lexical, guidelines are found with the BM25 index only and no
+        embedding call is made. With A11Y_RETRIEVAL_MODE=hybrid, texts whose best lexical
+        match scores at least A11Y_LEXICAL_MIN_SCORE are answered lexically, and the rest are
+        embedded and searched, fusing both rankings with reciprocal rank fusion.
+
+        Args:
+            texts (List[str]): The query texts (e.g. code descriptions, one per changed file)
+            k (int): Number of results to fetch per text (default: 3)
+
+        Returns:
+            List[List[Dict]]: For each input text, the deduplicated guidelines in the same
+            format as query_similar_guidelines
+        """
+        if not texts:
+            return []
+        self._count("queries")
+        if self.retrieval_mode == "vector":
+            return self._vector_search(texts, k)
+
+        lexical = [self.lexical.search(text, k) for text in texts]
+        # hybrid: only embed the texts the lexical index isn't confident about
+        results = [None] * len(texts)
+        uncertain = []
+        for i, matches in enumerate(lexical):
+            if self._lexically_confident(matches):
+                results[i] = self._lexical_results(matches)
+            else:
+                uncertain.append(i)
+        self._count("lexical_only_queries", len(texts) - len(uncertain))
+        if uncertain:
+            vector_results = self._vector_search([texts[i] for i in uncertain], k)
+            for i, vector in zip(uncertain, vector_results):
+                results[i] = self._fuse(lexical[i], vector, k)
+        return results
+
+    def guidelines_by_id(self, ref_ids: List[str]) -> List[Dict]:
+        """Guidelines for known ref_ids, in the query_similar_guidelines format (no search involved)"""
+        results = []
+        for ref_id in ref_ids:
+            guideline = self.corpus.get(ref_id)
+            if guideline:
+                results.append({'guideline': guideline, 'score': 0.0, 'text': self.corpus.text(ref_id)})
+        return results
+
+    def match_lexically(self, text: str, k: int = 3) -> Optional[List[Dict]]:
+        """
+        Match a text (e.g. a raw diff) with the BM25 index only, without any embedding call.
+
+        Returns the guidelines in the query_similar_guidelines format when the retrieval mode is
+        'lexical', or 'hybrid' and the best match is confident enough; None otherwise.
+        """
+        if self.retrieval_mode == "vector":
+            return None
+        matches = self.lexical.search(text, k)
+        if not self._lexically_confident(matches):
+            return None
+        self._count("lexical_only_queries")
+        return self._lexical_results(matches)
+
+    def _lexically_confident(self, matches: List[Tuple[str, float]]) -> bool:
+        if self.retrieval_mode == "lexical":
+            return True
+        return bool(matches) and matches[0][1] >= self.lexical_min_score
+
+    def _vector_search(self, texts: List[str], k: int) -> List[List[Dict]]:
+        self._count("embedded_queries", len(texts))
+        with span("rag.embed", "rag", texts=len(texts), tokens_in=sum(count_tokens(text) for text in texts)):
+            query_embeddings = self.embeddings.embed_documents(list(texts))
+        with span("rag.search", "rag", texts=len(texts)):
+            return _deduplicate_results(self.backend.search(query_embeddings, k), self.corpus)
+
+    def _lexical_results(self, matches: List[Tuple[str, float]]) -> List[Dict]:
+        results = []
+        best = matches[0][1] if matches else 1.0
+        for ref_id, score in matches:
+            results.append({
+                'guideline': self.corpus.get(ref_id),
+                # distance-like, like the vector results: 0 for the best match
+                'score': 1.0 - score / best,
+                'text': self.corpus.text(ref_id)
+            })
+        return results
+
+    def _fuse(self, lexical: List[Tuple[str, float]], vector: List[Dict], k: int) -> List[Dict]:
+        by_ref = {result['guideline'].ref_id: result for result in vector}
+        fused = reciprocal_rank_fusion([[ref_id for ref_id, _ in lexical], list(by_ref)])[:k]
+        results = []
+        best = fused[0][1] if fused else 1.0
+        for ref_id, score in fused:
+            result = by_ref.get(ref_id) or {'guideline': self.corpus.get(ref_id), 'text': self.corpus.text(ref_id)}
+            results.append({
+                'guideline': result['guideline'],
+                'score': 1.0 - score / best,
+                'text': result['text']
+            })
+        return results
+
+def _deduplicate_results(results: Dict, corpus: Optional[WCAGCorpus] = None) -> List[List[Dict]]:
+    """
+    Convert search results to guideline dicts, keeping the closest chunk of each guideline.
+    Hits are resolved by ref_id in the corpus; the chunk metadata is only parsed for ref_ids
+    the corpus doesn't know (an index built from another corpus).
+    """
+    all_guidelines = []
+    for docs, metadatas, distances in zip(results['documents'], results['metadatas'], results['distances']):
         guidelines = []
-        for doc, metadata in zip(results['documents'][0], results['metadatas'][0]):
-            guideline = WCAGGuideline(
-                ref_id=metadata['ref_id'],
-                title=metadata['title'],
-                description=doc,  # The document contains the description
-                url=metadata.get('url', ''),
-                techniques=metadata.get('techniques', '').split("|") if metadata.get('techniques', '') else [],
-                failures=metadata.get('failures', '').split("|") if metadata.get('failures', '') else []
-            )
-            guidelines.append(guideline)
-        
-        return guidelines
+        seen_refs = set()  # Track seen ref_ids to avoid duplicates
+        for doc, metadata, score in zip(docs, metadatas, distances):
+            if metadata['ref_id'] in seen_refs:
+                continue
+            seen_refs.add(metadata['ref_id'])
+            guideline = corpus.get(metadata['ref_id']) if corpus is not None else None
+            if guideline is None:
+                guideline = _guideline_from_metadata(doc, metadata)
+                text = guideline.to_text()
+            else:
+                text = corpus.text(metadata['ref_id'])
+            guidelines.append({
+                'guideline': guideline,
+                'score': score,
+                'text': text
+            })
+        all_guidelines.append(guidelines)
+    return all_guidelines
+
+def build_lexical_index(guidelines) -> BM25Index:
+    """BM25 index over the guideline texts (description, keywords, techniques and failures)"""
+    return BM25Index.build({guideline.ref_id: guideline.to_text() for guideline in guidelines})
+
+def get_retrieval_mode() -> str:
+    """Retrieval mode selected with A11Y_RETRIEVAL_MODE: 'vector' (default), 'lexical' or 'hybrid'"""
+    mode = os.getenv("A11Y_RETRIEVAL_MODE", "vector").lower()
+    if mode not in ("vector", "lexical", "hybrid"):
+        raise ValueError(f"Unknown retrieval mode '{mode}', expected 'vector', 'lexical' or 'hybrid'")
+    return mode
+
+def _guideline_from_metadata(doc: str, metadata: Dict) -> WCAGGuideline:
+    return WCAGGuideline(
+        ref_id=metadata['ref_id'],
+        title=metadata['title'],
+        description=doc,  # The document contains the description
+        url=metadata.get('url', ''),
+        techniques=metadata.get('techniques', '').split("|") if metadata.get('techniques', '') else [],
+        failures=metadata.get('failures', '').split("|") if metadata.get('failures', '') else []
+    )
+
+_vector_store: Optional[WCAGVectorStore] = None
+_vector_store_lock = threading.Lock()
+
+def get_vector_store() -> WCAGVectorStore:
+    """Process-wide WCAGVectorStore, created on first use"""
+    global _vector_store
+    with _vector_store_lock:
+        if _vector_store is None:
+            _vector_store = WCAGVectorStore()
+        return _vector_store
+
+def close_vector_store():
+    """Close and drop the process-wide WCAGVectorStore"""
+    global _vector_store
+    with _vector_store_lock:
+        if _vector_store is not None:
+            _vector_store.close()
+            _vector_store = None
 
 def generate_code_description(diff_content: str, file_name: str) -> str:
     """Generate a semantic description of code changes for better RAG matching"""
@@ -290,21 +517,57 @@ def generate_code_description(diff_content: str, file_name: str) -> str:
     of these changes. Focus on how they might affect users with different disabilities.
     """
     
-    llm = get_llm()
-    return llm.predict(prompt)
+    with span("rag.describe", "llm", file=file_name, tokens_in=count_tokens(prompt)) as call:
+        llm = get_llm()
+        description = llm.predict(prompt)
+        call.set(tokens_out=count_tokens(description))
+        return description
+
+def _match_without_llm(vs: WCAGVectorStore, diff_content: str, file_name: str) -> Optional[List[Dict]]:
+    """
+    Guidelines for diffs that don't need an LLM description: non-UI files (none), hunks with
+    static accessibility signals (their ref_ids) or confident lexical matches. None otherwise.
+    """
+    if is_preclassifier_enabled():
+        classification = classify_diff(diff_content, file_name)
+        preclassifier_stats.record(classification)
+        if classification.kind == "non_ui":
+            return []
+        if classification.kind == "signals":
+            return vs.guidelines_by_id(classification.ref_ids)
+    # Obvious diffs (an <img>, aria-* attributes, colors...) are matched lexically, offline
+    return vs.match_lexically(f"{file_name}\n{diff_content}")
 
 def get_relevant_wcag_guidelines(diff_content: str, file_name: str) -> List[Dict]:
     """
     Main function to get relevant WCAG guidelines for a code diff.
     Returns a list of relevant guidelines with their content and matching scores.
     """
-    # Initialize vector store if it doesn't exist
-    vs = WCAGVectorStore()
-    if not os.path.exists(vs.persist_directory):
-        vs.initialize_db()
-    
-    # Generate semantic description of the code changes
-    description = generate_code_description(diff_content, file_name)
-    
-    # Query similar guidelines
-    return vs.query_similar_guidelines(description)
+    with span("rag.file", "rag", file=file_name) as file_span:
+        # Shared vector store (the database is initialized on first use if it doesn't exist)
+        vs = get_vector_store()
+
+        matches = _match_without_llm(vs, diff_content, file_name)
+        if matches is not None:
+            file_span.set(source="static")
+            return matches
+
+        # Generate semantic description of the code changes
+        description = generate_code_description(diff_content, file_name)
+
+        # Query similar guidelines
+        file_span.set(source="search")
+        return vs.query_similar_guidelines(description)
+
+def get_relevant_wcag_guidelines_many(files_diff: List[Tuple[str, str]]) -> List[List[Dict]]:
+    """
+    Get relevant WCAG guidelines for every (file_name, diff_content) of a PR, embedding all
+    the code descriptions in one request and searching them in one query.
+    """
+    vs = get_vector_store()
+    results = [_match_without_llm(vs, diff_content, file_name) for file_name, diff_content in files_diff]
+    pending = [i for i, matches in enumerate(results) if matches is None]
+    descriptions = [generate_code_description(files_diff[i][1], files_diff[i][0]) for i in pending]
+    for i, matches in zip(pending, vs.query_many(descriptions)):
+        results[i] = matches
+    return results
@@ -7,11 +7,19 @@ export PYTHONUNBUFFERED=1 # this is to make sure that the output is not buffered
 if [ -z "$OPENAI_API_KEY" ]; then
   # export args as ENV variables
   export GITHUB_TOKEN=$GITHUB_TOKEN
-  echo "OpenAI API key not provided. Starting Ollama using Shell..."
+  echo "OpenAI API key not provided. Using a local model with Ollama..."
   /bin/sh -c /install_ollama.sh
 else
   echo "OpenAI API key provided. Skipping Ollama installation."
 fi
 
+# Service mode: Ollama, the guideline index and the caches stay loaded between reviews
+if [ "$A11Y_MODE" = "serve" ]; then
+  export GITHUB_TOKEN=$GITHUB_TOKEN
+  export OPENAI_API_KEY=$OPENAI_API_KEY
+  echo "Starting the review service..."
+  exec python -u /serve.py --host 0.0.0.0
+fi
+
 echo "Running the script... $@"
 python -u /a11y_checker.py "$@"
@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
 """
 Initialize the WCAG 2.2 vector store database.
-This script should be run once before using the a11y checker.
+This script should be run once before using the a11y checker, and again whenever the
+guidelines file changes: by default it only syncs the guidelines that changed
+(use --rebuild to recreate the database from scratch).
 """
 
+import argparse
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 from crew.wcag_rag import WCAGVectorStore
 
 def main():
+    parser = argparse.ArgumentParser(description="Initialize or sync the WCAG 2.2 vector store")
+    parser.add_argument("--rebuild", action="store_true", help="remove the database and rebuild it from scratch")
+    parser.add_argument("--wcag-file", default="data/wcag_2_2_new.json")
+    args = parser.parse_args()
+
     # Load environment variables from .env file
     env_path = Path(__file__).parent / ".env"
     load_dotenv(env_path)
@@ -17,18 +25,27 @@ def main():
     if not os.getenv("OPENAI_API_KEY"):
         raise ValueError("OPENAI_API_KEY not found in .env file")
     
+    db_path = Path(".chroma_db")
+    if not args.rebuild:
+        # Only re-embed new or changed guidelines, and delete removed ones
+        print("Syncing WCAG 2.2 vector store...")
+        vs = WCAGVectorStore(index_path="")
+        stats = vs.sync_db(wcag_file=args.wcag_file)
+        print(f"Vector store sync complete! {stats['added']} added, {stats['updated']} updated, "
+              f"{stats['unchanged']} unchanged, {stats['deleted']} deleted")
+        return
+
     print("Initializing WCAG 2.2 vector store...")
     
     # Remove existing database if it exists
-    db_path = Path(".chroma_db")
     if db_path.exists():
         print("Removing existing database at .chroma_db")
         import shutil
         shutil.rmtree(db_path)
     
     print("Creating new vector store with WCAG 2.2 guidelines...")
-    vs = WCAGVectorStore()
-    vs.initialize_db(wcag_file="data/wcag_2_2_new.json")  # Use the new WCAG data file
+    vs = WCAGVectorStore(index_path="")
+    vs.initialize_db(wcag_file=args.wcag_file)  # Use the new WCAG data file
     print("Vector store initialization complete!")
 
 if __name__ == "__main__":
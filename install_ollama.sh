@@ -1,10 +1,10 @@
 #!/bin/sh
-echo "OpenAI API key not provided. Installing Ollama..."
+# Installs the Ollama binary when it's missing. Starting the server, pulling the model and
+# loading it are done by the checker (crew/ollama_runtime.py), which reuses a running server
+# and a model that is already pulled (baked into the image or in a mounted OLLAMA_MODELS).
+if command -v ollama > /dev/null 2>&1; then
+  echo "Ollama already installed."
+  exit 0
+fi
+echo "Installing Ollama..."
 curl -fsSL https://ollama.com/install.sh | sh
-sleep 10
-echo "Starting Ollama server in background thread..."
-ollama serve > /dev/null 2>&1 &
-sleep 10
-echo "Downloading Ollama model... 4.1 GB"
-ollama pull "phi3:3.8b-mini-instruct-q8_0" > /dev/null 2>&1
-sleep 10
\ No newline at end of file
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Run the checker as a long-lived review service.
+
+Point a GitHub webhook (pull_request events) at http://<host>:<port>/webhook, or queue reviews
+with POST /reviews {"repository": "owner/repo", "number": 12}. The LLM, guideline index and
+verdict cache are loaded once and shared by every review; see crew/review_service.py.
+"""
+
+import argparse
+import os
+import signal
+import threading
+from dotenv import load_dotenv
+from a11y_checker import configure_llm, review_pr
+from batch_review import warm_up
+from crew.diff_provider import GitHubDiffProvider
+from crew.github_client import GitHubClient
+from crew.result_cache import get_result_cache
+from crew.review_service import JobCancelled, ReviewJob, ReviewService, is_local_host
+
+def make_review(github: GitHubClient, rules_file: str, cache=None, ollama: bool = False):
+    """The review(job) run by the service workers: review_pr on the job's PR, through the GitHub API"""
+    def review(job: ReviewJob):
+        repo = github.get_repo(job.repository)
+        pr = repo.get_pull(job.number)
+        result = review_pr(repo, pr, rules_file, ollama=ollama, cache=cache,
+                           provider=GitHubDiffProvider(repo, pr), cancel=job.cancel)
+        if result is None:
+            raise RuntimeError(f"could not read {rules_file}")
+        if result.error == "superseded":
+            raise JobCancelled(result.error)
+    return review
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Review PRs from GitHub webhooks")
+    parser.add_argument("--host", default=os.getenv("A11Y_SERVICE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("A11Y_SERVICE_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("A11Y_SERVICE_WORKERS", "2")),
+                        help="PRs reviewed at the same time")
+    parser.add_argument("--rules-file", default=os.getenv("FILE_PATH"), help="rules file, read from each PR's base branch")
+    args = parser.parse_args(argv)
+
+    # Load environment variables from .env file
+    load_dotenv()
+    if not args.rules_file:
+        parser.error("--rules-file (or FILE_PATH) is required")
+    secret = os.getenv("A11Y_WEBHOOK_SECRET")
+    if not secret and not is_local_host(args.host):
+        # anyone who can reach the port could queue reviews of any repository the token can see
+        parser.error(f"A11Y_WEBHOOK_SECRET is required when listening on {args.host}; "
+                     "set it (and the same secret on the webhook) or listen on 127.0.0.1")
+    token = os.getenv("GITHUB_TOKEN")
+    if not token:
+        raise ValueError("GITHUB_TOKEN not found in environment variables")
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+
+    # State shared by every review, kept warm between jobs
+    configure_llm(openai_api_key)
+    github = GitHubClient(token)
+    cache = get_result_cache()
+    warm_up()
+
+    service = ReviewService(make_review(github, args.rules_file, cache, ollama=not openai_api_key),
+                            workers=args.workers, secret=secret)
+    server = service.start(args.host, args.port)
+    print(f"Listening on http://{server.server_address[0]}:{server.server_address[1]} with {args.workers} worker(s)")
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    print("Stopping: running reviews are cancelled, queued ones are dropped")
+    service.stop()
+    print(service.metrics.render())
+    print(github.metrics.summary())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import subprocess
+from types import SimpleNamespace
+import pytest
+from crew.diff_provider import GitHubDiffProvider, LocalGitDiffProvider, get_diff_provider
+
+def git(path, *args):
+    return subprocess.run(
+        ["git", "-C", str(path), "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+@pytest.fixture
+def repo(tmp_path):
+    """A local clone with a base commit on main and a feature branch with two commits on top"""
+    git(tmp_path, "init", "-q", "-b", "main")
+    (tmp_path / "rules.md").write_text("- [ ] Images have alt text\n")
+    (tmp_path / "Button.jsx").write_text("export const Button = () => <button>Save</button>;\n")
+    (tmp_path / "old_name.css").write_text(".a { color: red; }\n" * 5)
+    (tmp_path / "removed.html").write_text("<p>bye</p>\n")
+    git(tmp_path, "add", "-A")
+    git(tmp_path, "commit", "-q", "-m", "base")
+    base = git(tmp_path, "rev-parse", "HEAD")
+
+    git(tmp_path, "checkout", "-q", "-b", "feature")
+    (tmp_path / "Button.jsx").write_text("export const Button = () => <button aria-label=\"Save\">Save</button>;\n")
+    git(tmp_path, "commit", "-q", "-am", "label the button")
+    first = git(tmp_path, "rev-parse", "HEAD")
+    (tmp_path / "Logo.jsx").write_text("export const Logo = () => <img src=\"logo.png\" />;\n")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG\r\n\x1a\n\x00\x00binary")
+    git(tmp_path, "mv", "old_name.css", "new name.css")
+    git(tmp_path, "rm", "-q", "removed.html")
+    git(tmp_path, "add", "-A")
+    git(tmp_path, "commit", "-q", "-m", "add the logo")
+    head = git(tmp_path, "rev-parse", "HEAD")
+    return SimpleNamespace(path=tmp_path, base=base, first=first, head=head)
+
+def make_pr(repo):
+    return SimpleNamespace(base=SimpleNamespace(ref="main", sha=repo.base), head=SimpleNamespace(ref="feature", sha=repo.head))
+
+def test_iter_files_matches_the_compare_api_format(repo):
+    provider = LocalGitDiffProvider(str(repo.path))
+    files = dict(provider.iter_files(*provider.refs(make_pr(repo))))
+
+    assert set(files) == {"Button.jsx", "Logo.jsx", "logo.png", "new name.css", "removed.html"}
+    assert files["Button.jsx"].startswith("@@")
+    assert '+export const Button = () => <button aria-label="Save">Save</button>;' in files["Button.jsx"]
+    assert files["Logo.jsx"].splitlines()[1] == '+export const Logo = () => <img src="logo.png" />;'
+    assert files["removed.html"].splitlines()[1] == "-<p>bye</p>"
+    # binary files and pure renames have no patch
+    assert files["logo.png"] is None
+    assert files["new name.css"] is None
+
+def test_iter_files_only_has_changes_since_the_merge_base(repo):
+    # main moves on after the branch point: its changes are not part of the PR
+    git(repo.path, "checkout", "-q", "main")
+    (repo.path / "Footer.jsx").write_text("export const Footer = () => <footer />;\n")
+    git(repo.path, "add", "-A")
+    git(repo.path, "commit", "-q", "-m", "footer")
+    base = git(repo.path, "rev-parse", "HEAD")
+
+    provider = LocalGitDiffProvider(str(repo.path))
+    assert "Footer.jsx" not in dict(provider.iter_files(base, repo.head))
+
+def test_read_file_and_has_commit(repo):
+    provider = LocalGitDiffProvider(str(repo.path))
+    assert provider.read_file(repo.base, "rules.md") == "- [ ] Images have alt text\n"
+    assert provider.has_commit(repo.head)
+    assert not provider.has_commit("0" * 40)
+
+def test_incremental_diff(repo):
+    provider = LocalGitDiffProvider(str(repo.path))
+    files = dict(provider.incremental_diff(repo.first, repo.head))
+    assert "Logo.jsx" in files and "Button.jsx" not in files
+
+    # a force-push: the last reviewed commit is no longer an ancestor of the head
+    git(repo.path, "checkout", "-q", "-b", "rewritten", repo.base)
+    (repo.path / "Button.jsx").write_text("export const Button = () => <button>Store</button>;\n")
+    git(repo.path, "commit", "-q", "-am", "rewrite")
+    assert provider.incremental_diff(repo.first, git(repo.path, "rev-parse", "HEAD")) is None
+
+def test_stopping_early_does_not_fail(repo):
+    provider = LocalGitDiffProvider(str(repo.path))
+    files = provider.iter_files(repo.base, repo.head)
+    assert next(files)[0]
+    files.close()
+
+def test_get_diff_provider_falls_back_to_github_without_the_commits(repo, monkeypatch):
+    monkeypatch.setenv("A11Y_DIFF_SOURCE", "local")
+    monkeypatch.setenv("A11Y_REPO_PATH", str(repo.path))
+    assert isinstance(get_diff_provider(None, make_pr(repo)), LocalGitDiffProvider)
+
+    missing = SimpleNamespace(base=SimpleNamespace(ref="main", sha=repo.base), head=SimpleNamespace(ref="feature", sha="1" * 40))
+    assert isinstance(get_diff_provider(None, missing), GitHubDiffProvider)
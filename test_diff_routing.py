@@ -0,0 +1,19 @@
+from crew.diff_routing import DiffRouter, classify_file
+
+def test_config_files_are_not_ui_files():
+    assert classify_file(".github/workflows/ci.yml") == "code"
+    assert classify_file("docker-compose.yaml") == "code"
+    assert classify_file("tsconfig.json") == "code"
+    assert classify_file("pnpm-lock.yaml") == "noise"
+
+def test_config_files_are_not_routed_to_the_rules():
+    router = DiffRouter([
+        (".github/workflows/ci.yml", "@@ -1 +1 @@\n-runs-on: ubuntu-22.04\n+runs-on: ubuntu-latest"),
+        ("package.json", "@@ -2 +2 @@\n-  \"version\": \"1.0.0\",\n+  \"version\": \"1.1.0\","),
+        ("src/Logo.jsx", "@@ -0,0 +1 @@\n+export const Logo = () => <img src=\"logo.png\" />;"),
+    ], include=[], exclude=[])
+
+    assert router.skipped == {".github/workflows/ci.yml": "not a UI file", "package.json": "not a UI file"}
+    # a rule the prefilter finds nothing for falls back to the UI diff only
+    assert [filename for filename, _ in router.route("Headings are nested in order")] == ["src/Logo.jsx"]
+    assert [filename for filename, _ in router.route("Images have alt text")] == ["src/Logo.jsx"]
@@ -0,0 +1,186 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from crew.github_client import GitHubClient, GitHubError
+
+class StubGitHub:
+    """
+    A local HTTP server answering each path with a scripted list of responses, in order
+    (the last one repeats), and recording the requests it got
+    """
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _answer(self):
+                stub.requests.append((self.command, self.path, dict(self.headers)))
+                responses = stub.routes.get(self.path.split("?")[0], [(404, {}, {"message": "Not Found"})])
+                status, headers, body = responses.pop(0) if len(responses) > 1 else responses[0]
+                if callable(body):
+                    status, headers, body = body(self)
+                payload = b"" if body is None else json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = _answer
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def route(self, path, *responses):
+        self.routes[path] = list(responses)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def etag_route(etag, body):
+    """200 with the ETag, or 304 when the request already has it"""
+    def answer(request):
+        if request.headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, None
+        return 200, {"ETag": etag}, body
+    return answer
+
+@pytest.fixture
+def github():
+    stub = StubGitHub()
+    yield stub
+    stub.stop()
+
+@pytest.fixture
+def sleeps():
+    return []
+
+def make_client(github, sleeps, **kwargs):
+    kwargs.setdefault("max_retries", 3)
+    return GitHubClient("token", base_url=github.url, session=requests.Session(), sleep=sleeps.append,
+                        write_interval=0, **kwargs)
+
+def test_etag_revalidation_serves_the_cached_body(github, sleeps):
+    github.route("/repos/o/r/pulls/1", (200, {}, etag_route('"v1"', {"number": 1})))
+    client = make_client(github, sleeps)
+
+    assert client.get("repos/o/r/pulls/1") == ({"number": 1}, {})
+    assert client.get("repos/o/r/pulls/1") == ({"number": 1}, {})
+    assert "If-None-Match" not in github.requests[0][2]
+    assert github.requests[1][2]["If-None-Match"] == '"v1"'
+    assert client.metrics.not_modified == 1
+    assert client.metrics.requests == 2
+
+def test_diff_payloads_are_not_cached(github, sleeps):
+    github.route("/repos/o/r/pulls/1/files", (200, {}, etag_route('"files"', [{"filename": "a.jsx", "patch": "@@"}])))
+    github.route("/repos/o/r/compare/main...head", (200, {}, etag_route('"compare"', {"files": []})))
+    client = make_client(github, sleeps)
+
+    for _ in range(2):
+        client.get("repos/o/r/pulls/1/files")
+        client.get("repos/o/r/compare/main...head")
+    assert all("If-None-Match" not in headers for _, _, headers in github.requests)
+    assert client.metrics.not_modified == 0
+
+def test_etag_cache_is_bounded_by_bytes(github, sleeps):
+    for n in range(3):
+        github.route(f"/repos/o/r/issues/{n}", (200, {}, etag_route(f'"{n}"', {"body": "x" * 100})))
+    client = make_client(github, sleeps, etag_cache_bytes=250)
+
+    for n in range(3):
+        client.get(f"repos/o/r/issues/{n}")
+    # two bodies fit: the oldest one was evicted and is fetched in full again
+    client.get("repos/o/r/issues/0")
+    client.get("repos/o/r/issues/2")
+    assert "If-None-Match" not in github.requests[3][2]
+    assert github.requests[4][2]["If-None-Match"] == '"2"'
+
+def test_retry_after_is_honoured_on_429(github, sleeps):
+    github.route("/repos/o/r", (429, {"Retry-After": "7"}, {"message": "slow down"}), (200, {}, {"full_name": "o/r"}))
+    client = make_client(github, sleeps)
+
+    assert client.get("repos/o/r")[0] == {"full_name": "o/r"}
+    assert sleeps == [7.0]
+    assert client.metrics.rate_limited == 1
+    assert client.metrics.retries == 1
+
+def test_secondary_rate_limit_on_403(github, sleeps):
+    github.route("/repos/o/r", (403, {}, {"message": "You have exceeded a secondary rate limit"}), (200, {}, {}))
+    client = make_client(github, sleeps)
+
+    client.get("repos/o/r")
+    assert sleeps == [60.0]
+    assert client.metrics.rate_limited == 1
+
+def test_server_errors_back_off_exponentially(github, sleeps):
+    github.route("/repos/o/r", (502, {}, {"message": "bad gateway"}), (503, {}, {"message": "unavailable"}), (200, {}, {}))
+    client = make_client(github, sleeps)
+
+    client.get("repos/o/r")
+    assert len(sleeps) == 2
+    assert 1 <= sleeps[0] < 2 and 2 <= sleeps[1] < 3
+    assert client.metrics.rate_limited == 0
+
+def test_gives_up_after_max_retries(github, sleeps):
+    github.route("/repos/o/r", (500, {}, {"message": "boom"}))
+    client = make_client(github, sleeps, max_retries=2)
+
+    with pytest.raises(GitHubError) as error:
+        client.get("repos/o/r")
+    assert error.value.status == 500
+    assert client.metrics.requests == 3
+    assert len(sleeps) == 2
+
+def test_waits_longer_than_max_wait_are_not_retried(github, sleeps):
+    github.route("/repos/o/r", (429, {"Retry-After": "3600"}, {"message": "slow down"}), (200, {}, {}))
+    client = make_client(github, sleeps, max_wait=60)
+
+    with pytest.raises(GitHubError) as error:
+        client.get("repos/o/r")
+    assert error.value.status == 429
+    assert sleeps == []
+
+def test_client_errors_are_not_retried(github, sleeps):
+    client = make_client(github, sleeps)
+
+    with pytest.raises(GitHubError) as error:
+        client.get("repos/o/missing")
+    assert error.value.status == 404
+    assert "Not Found" in str(error.value)
+    assert client.metrics.requests == 1 and sleeps == []
+
+def test_paginate_follows_link_headers(github, sleeps):
+    github.route("/repos/o/r/pulls/1/files", (200, {"Link": f'<{github.url}/repos/o/r/pulls/1/files/2>; rel="next"'},
+                                              [{"filename": "a.jsx"}]))
+    github.route("/repos/o/r/pulls/1/files/2", (200, {}, [{"filename": "b.jsx"}]))
+    client = make_client(github, sleeps)
+
+    assert [item["filename"] for item in client.paginate("repos/o/r/pulls/1/files")] == ["a.jsx", "b.jsx"]
+    assert "per_page=100" in github.requests[0][1]
+
+def test_writes_are_not_retried_on_server_errors(github, sleeps):
+    # the comment may have been created before the 502: posting it again would duplicate it
+    github.route("/repos/o/r/issues/1/comments", (502, {}, {"message": "bad gateway"}), (201, {}, {"id": 1}))
+    client = make_client(github, sleeps)
+
+    with pytest.raises(GitHubError) as error:
+        client.post("repos/o/r/issues/1/comments", {"body": "hi"})
+    assert error.value.status == 502
+    assert len(github.requests) == 1 and sleeps == []
+
+def test_writes_are_retried_when_rate_limited(github, sleeps):
+    github.route("/repos/o/r/issues/1/comments", (403, {}, {"message": "You have exceeded a secondary rate limit"}),
+                 (201, {}, {"id": 1}))
+    client = make_client(github, sleeps)
+
+    assert client.post("repos/o/r/issues/1/comments", {"body": "hi"}) == {"id": 1}
+    assert len(github.requests) == 2 and sleeps == [60.0]
@@ -0,0 +1,156 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+import pytest
+import requests
+from crew.review_service import JobCancelled, ReviewJob, ReviewQueue, ReviewService
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.01)
+
+def test_queued_jobs_are_coalesced_in_place():
+    queue = ReviewQueue()
+    queue.submit(ReviewJob("o/a", 1, head_sha="old"))
+    queue.submit(ReviewJob("o/b", 2))
+    queue.submit(ReviewJob("O/A", 1, head_sha="new"))
+
+    first = queue.get()
+    assert (first.repository, first.number, first.head_sha) == ("O/A", 1, "new")
+    assert queue.get().repository == "o/b"
+    assert queue.metrics.coalesced == 1
+
+def test_a_new_event_cancels_the_running_review():
+    queue = ReviewQueue()
+    queue.submit(ReviewJob("o/a", 1, head_sha="old"))
+    running = queue.get()
+    newer = queue.submit(ReviewJob("o/a", 1, head_sha="new"))
+    queue.submit(ReviewJob("o/a", 1, head_sha="newest"))
+
+    assert running.cancel.is_set()
+    assert not newer.cancel.is_set()
+    # the running job is only superseded once; the queued one was coalesced
+    assert queue.metrics.superseded == 1
+    assert queue.metrics.coalesced == 1
+
+def test_a_pr_is_never_reviewed_twice_at_once():
+    queue = ReviewQueue()
+    queue.submit(ReviewJob("o/a", 1))
+    running = queue.get()
+    queue.submit(ReviewJob("o/a", 1, head_sha="new"))
+    queue.submit(ReviewJob("o/b", 2))
+
+    # the other PR goes first, the newer job for o/a waits for the running one
+    assert queue.get().repository == "o/b"
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(queue.get()))
+    waiter.start()
+    time.sleep(0.1)
+    assert got == []
+    queue.done(running)
+    waiter.join(timeout=5)
+    assert got[0].head_sha == "new"
+
+def test_close_cancels_running_jobs_and_releases_workers():
+    queue = ReviewQueue()
+    queue.submit(ReviewJob("o/a", 1))
+    running = queue.get()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(queue.get()))
+    waiter.start()
+    queue.close()
+    waiter.join(timeout=5)
+    assert got == [None]
+    assert running.cancel.is_set()
+
+@pytest.fixture
+def service_factory():
+    services = []
+
+    def start(review, workers=2, secret=None):
+        service = ReviewService(review, workers=workers, secret=secret)
+        server = service.start(port=0)
+        services.append(service)
+        return service, f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for service in services:
+        service.stop()
+
+def test_superseded_reviews_are_counted_as_cancelled(service_factory):
+    started = threading.Event()
+
+    def review(job):
+        if job.head_sha == "old":
+            started.set()
+            if not job.cancel.wait(timeout=5):
+                raise AssertionError("the old review was not cancelled")
+            raise JobCancelled("superseded")
+
+    service, _ = service_factory(review)
+    service.submit(ReviewJob("o/a", 1, head_sha="old"))
+    started.wait(timeout=5)
+    service.submit(ReviewJob("o/a", 1, head_sha="new"))
+    wait_for(lambda: service.metrics.completed + service.metrics.cancelled == 2)
+
+    snapshot = service.metrics.snapshot()
+    assert (snapshot["superseded"], snapshot["cancelled"], snapshot["completed"], snapshot["failed"]) == (1, 1, 1, 0)
+    assert "a11y_jobs_cancelled_total 1" in service.metrics.render()
+
+def test_workers_never_overlap_on_the_same_pr(service_factory):
+    lock = threading.Lock()
+    active, overlaps, reviewed = set(), [], []
+
+    def review(job):
+        with lock:
+            if job.key in active:
+                overlaps.append(job.key)
+            active.add(job.key)
+        time.sleep(0.05)
+        with lock:
+            active.discard(job.key)
+            reviewed.append(job.key)
+
+    service, _ = service_factory(review, workers=4)
+    for sha in range(5):
+        service.submit(ReviewJob("o/a", 1, head_sha=str(sha)))
+        service.submit(ReviewJob("o/b", 2, head_sha=str(sha)))
+        time.sleep(0.02)
+    wait_for(lambda: service.metrics.queue_depth == 0 and service.metrics.running == 0)
+
+    assert overlaps == []
+    assert service.metrics.failed == 0
+    # coalescing: far fewer reviews than events
+    assert len(reviewed) < 10
+
+def test_webhook_requires_a_valid_signature(service_factory):
+    reviewed = []
+    service, url = service_factory(lambda job: reviewed.append(job), secret="s3cret")
+    body = json.dumps({"action": "synchronize", "repository": {"full_name": "o/a"},
+                       "pull_request": {"number": 3, "head": {"sha": "abc"}}}).encode()
+    headers = {"X-GitHub-Event": "pull_request", "Content-Type": "application/json"}
+
+    assert requests.post(f"{url}/webhook", data=body, headers=headers).status_code == 401
+    signature = "sha256=" + hmac.new(b"s3cret", body, hashlib.sha256).hexdigest()
+    response = requests.post(f"{url}/webhook", data=body, headers={**headers, "X-Hub-Signature-256": signature})
+    assert response.status_code == 202
+    wait_for(lambda: reviewed)
+    assert (reviewed[0].repository, reviewed[0].number, reviewed[0].head_sha) == ("o/a", 3, "abc")
+
+def test_events_that_need_no_review_are_ignored(service_factory):
+    service, url = service_factory(lambda job: None)
+    response = requests.post(f"{url}/webhook", json={"action": "closed"}, headers={"X-GitHub-Event": "pull_request"})
+    assert response.json() == {"queued": False}
+    assert service.metrics.ignored == 1 and service.metrics.received == 0
+
+def test_malformed_webhook_events_are_rejected(service_factory):
+    service, url = service_factory(lambda job: None)
+    headers = {"X-GitHub-Event": "pull_request"}
+    for payload in ({"action": "opened"}, {"action": "opened", "pull_request": {"number": 1}}, {"action": "opened", "repository": None}):
+        response = requests.post(f"{url}/webhook", json=payload, headers=headers)
+        assert response.status_code == 400
+    assert service.metrics.received == 0
@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+from crew.review_state import ReviewState, RuleState, rule_key
+from crew.verdict import Verdict
+
+ALT_TEXT = "Images must have alternative text"
+CONTRAST = "Text must have sufficient color contrast"
+
+LOGO = ("src/Logo.tsx", '@@ -1 +1 @@\n-<img src="logo.png" />\n+<img src="logo.png" alt="Acme" />')
+THEME = ("src/theme.css", "@@ -1 +1 @@\n-.title { color: #777; }\n+.title { color: #333; }")
+
+def make_state():
+    return ReviewState(head_sha="abc", rules={
+        rule_key(ALT_TEXT): RuleState.create([LOGO], Verdict(complies=True)),
+        rule_key(CONTRAST): RuleState.create([THEME], Verdict(complies=True)),
+    })
+
+def rules(*texts):
+    return [SimpleNamespace(text=text, type="mandatory") for text in texts]
+
+def test_unrelated_ui_change_carries_verdicts_forward():
+    # a text-only change to another component matches neither rule's topics
+    footer = ("src/Footer.tsx", "@@ -1 +1 @@\n-<p>Copyright 2023</p>\n+<p>Copyright 2024</p>")
+    carried = make_state().carry_forward(rules(ALT_TEXT, CONTRAST), [footer])
+    assert set(carried) == {ALT_TEXT, CONTRAST}
+
+def test_changes_matching_a_rule_topic_are_reviewed_again():
+    hero = ("src/Hero.tsx", '@@ -1 +1 @@\n-<p>Hi</p>\n+<img src="hero.png" />')
+    carried = make_state().carry_forward(rules(ALT_TEXT, CONTRAST), [hero])
+    assert set(carried) == {CONTRAST}
+
+def test_changes_to_reviewed_files_are_reviewed_again():
+    theme = ("src/theme.css", "@@ -1 +1 @@\n-.title { margin: 0; }\n+.title { margin: 4px; }")
+    carried = make_state().carry_forward(rules(ALT_TEXT, CONTRAST), [theme])
+    assert set(carried) == {ALT_TEXT}
@@ -0,0 +1,44 @@
+import threading
+import time
+from types import SimpleNamespace
+from crew.rule_engine import evaluate_rules
+
+def make_rules(*types):
+    return [SimpleNamespace(text=f"rule {i}", type=rule_type) for i, rule_type in enumerate(types)]
+
+def passing(rule, abandoned):
+    return SimpleNamespace(complies=True)
+
+def test_results_keep_checklist_order():
+    outcomes = evaluate_rules(make_rules("optional", "mandatory", "optional"), passing, concurrency=2, timeout=5)
+    assert [outcome.index for outcome in outcomes] == [0, 1, 2]
+    assert all(outcome.evaluated for outcome in outcomes)
+
+def test_a_hung_rule_does_not_time_out_the_rules_queued_behind_it():
+    durations = {"rule 0": 1.0, "rule 1": 0.05, "rule 2": 0.05}
+
+    def evaluate(rule, abandoned):
+        time.sleep(durations[rule.text])
+        return SimpleNamespace(complies=True)
+
+    outcomes = evaluate_rules(make_rules("optional", "optional", "optional"), evaluate, concurrency=1, timeout=0.3)
+    assert outcomes[0].error == "timed out after 0.3s"
+    assert outcomes[0].abandoned.is_set()
+    assert [outcome.error for outcome in outcomes[1:]] == [None, None]
+    assert all(outcome.evaluated for outcome in outcomes[1:])
+
+def test_rules_after_a_failed_mandatory_rule_are_discarded():
+    started = []
+    lock = threading.Lock()
+
+    def evaluate(rule, abandoned):
+        with lock:
+            started.append(rule.text)
+        return SimpleNamespace(complies=rule.text != "rule 0")
+
+    outcomes = evaluate_rules(make_rules("mandatory", "optional", "optional"), evaluate, concurrency=1, timeout=5)
+    assert outcomes[0].failed_mandatory
+    assert not outcomes[1].evaluated and not outcomes[2].evaluated
+    assert outcomes[1].abandoned.is_set() and outcomes[2].abandoned.is_set()
+    # with one worker, the failing mandatory rule runs first and nothing else is started
+    assert started == ["rule 0"]
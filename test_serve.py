@@ -0,0 +1,116 @@
+import base64
+import json
+import sys
+import threading
+import types
+from types import SimpleNamespace
+import pytest
+import requests
+from crew.github_client import GitHubClient
+from crew.review_service import JobCancelled, ReviewJob, ReviewService
+from crew.verdict import Verdict
+from test_github_client import StubGitHub
+from test_review_service import wait_for
+
+try:
+    import crew.rule_validation  # noqa: F401
+except ImportError:
+    # the LLM crew isn't needed, validate_rule is replaced below (as in benchmark.py)
+    module = types.ModuleType("crew.rule_validation")
+    module.PRSchema = SimpleNamespace
+    module.validate_rule = None
+    sys.modules["crew.rule_validation"] = module
+import a11y_checker
+import serve
+
+RULES = "- [x] Images have alt text\n- [ ] Buttons have an accessible name\n"
+PATCHES = [
+    {"filename": "Logo.jsx", "patch": "@@ -0,0 +1 @@\n+export const Logo = () => <img src=\"logo.png\" />;"},
+    {"filename": "Save.jsx", "patch": "@@ -0,0 +1 @@\n+export const Save = () => <button>Save</button>;"},
+]
+
+@pytest.fixture
+def github(monkeypatch):
+    """A PR on the stub GitHub with the rules file, its files and a comment thread that records what is written"""
+    monkeypatch.setenv("A11Y_COMMENT_INTERVAL", "0")
+    stub = StubGitHub()
+    stub.comments = []
+    pull = {"number": 1, "title": "Add the logo", "body": "",
+            "base": {"ref": "main", "sha": "b" * 40}, "head": {"ref": "feature", "sha": "h" * 40}}
+
+    def comments(request):
+        if request.command == "GET":
+            return 200, {}, []
+        body = json.loads(request.rfile.read(int(request.headers["Content-Length"])))["body"]
+        stub.comments.append(body)
+        return 201, {}, {"id": 7, "body": body, "url": f"{stub.url}/repos/o/r/issues/comments/7"}
+
+    def edit(request):
+        stub.comments.append(json.loads(request.rfile.read(int(request.headers["Content-Length"])))["body"])
+        return 200, {}, {}
+
+    stub.route("/repos/o/r/pulls/1", (200, {}, pull))
+    stub.route("/repos/o/r/contents/rules.md", (200, {}, {"content": base64.b64encode(RULES.encode()).decode()}))
+    stub.route("/repos/o/r/pulls/1/files", (200, {}, PATCHES))
+    stub.route("/repos/o/r/issues/1/comments", (200, {}, comments))
+    stub.route("/repos/o/r/issues/comments/7", (200, {}, edit))
+    yield stub
+    stub.stop()
+
+def use_llm(monkeypatch, validate_rule):
+    monkeypatch.setattr(a11y_checker, "PRSchema", SimpleNamespace)
+    monkeypatch.setattr(a11y_checker, "validate_rule", validate_rule)
+
+def final_comments(github):
+    return [body for body in github.comments if "updated as the review progresses" not in body]
+
+def make_review(github):
+    client = GitHubClient("token", base_url=github.url, session=requests.Session(), write_interval=0)
+    return serve.make_review(client, "rules.md")
+
+def test_review_posts_the_verdicts_on_the_pr(github, monkeypatch):
+    rules = []
+    use_llm(monkeypatch, lambda pr, rule: rules.append(rule) or Verdict(complies=True, score=100))
+
+    make_review(github)(ReviewJob("o/r", 1))
+
+    assert sorted(rules) == ["Buttons have an accessible name", "Images have alt text"]
+    assert len(final_comments(github)) == 1
+    assert "Images have alt text" in final_comments(github)[0]
+
+def test_a_superseded_review_is_cancelled_and_leaves_the_comment_to_the_newer_one(github, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def validate_rule(pr, rule):
+        # the first review is stuck in its LLM calls until a newer event supersedes it
+        started.set()
+        release.wait(timeout=5)
+        return Verdict(complies=True, score=100)
+
+    use_llm(monkeypatch, validate_rule)
+    monkeypatch.setenv("A11Y_CONCURRENCY", "1")
+    review = make_review(github)
+    cancelled = []
+
+    def tracked(job):
+        try:
+            review(job)
+        except JobCancelled:
+            cancelled.append(job.head_sha)
+            raise
+
+    service = ReviewService(tracked, workers=2)
+    service.start(port=0)
+    try:
+        service.submit(ReviewJob("o/r", 1, head_sha="old"))
+        assert started.wait(timeout=5)
+        service.submit(ReviewJob("o/r", 1, head_sha="new"))
+        release.set()
+        wait_for(lambda: service.metrics.completed + service.metrics.cancelled == 2)
+    finally:
+        service.stop()
+
+    assert cancelled == ["old"]
+    assert (service.metrics.cancelled, service.metrics.completed, service.metrics.failed) == (1, 1, 0)
+    # only the newer review wrote its results
+    assert len(final_comments(github)) == 1
@@ -1,17 +1,102 @@
+import argparse
 import json
 import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from openai import OpenAI
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import time
 
-def get_techniques_and_failures(client: OpenAI, ref_id: str, title: str, description: str, guideline_description: str = "", special_cases: List[str] = None) -> Tuple[str, List[str], List[str]]:
+DEFAULT_JOURNAL_SUFFIX = ".journal.jsonl"
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows bursts of up to `capacity` requests, refilled at `rate`
+    requests per second, so concurrent workers share one request budget instead of sleeping
+    a fixed time after every call.
+    """
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+def parse_content(content: str) -> Tuple[str, List[str], List[str]]:
+    """Parse the DESCRIPTION / TECHNIQUES / FAILURES sections of a generated answer"""
+    techniques = []
+    failures = []
+    current_section = None
+    description_lines = []
+
+    for line in content.split('\n'):
+        line = line.strip()
+        if line == 'DESCRIPTION':
+            current_section = 'description'
+        elif line == 'TECHNIQUES':
+            current_section = 'techniques'
+        elif line == 'FAILURES':
+            current_section = 'failures'
+        elif line:
+            if current_section == 'description':
+                description_lines.append(line)
+            elif current_section == 'techniques' and line.startswith('- '):
+                techniques.append(line[2:])
+            elif current_section == 'failures' and line.startswith('- '):
+                failures.append(line[2:])
+
+    return ' '.join(description_lines), techniques, failures
+
+class IncompleteAnswer(ValueError):
+    """The model answered without one of the DESCRIPTION / TECHNIQUES / FAILURES sections"""
+
+def _is_transient(error: Exception) -> bool:
+    """Rate limits (429), server errors (5xx), connection failures and incomplete answers are retried"""
+    if isinstance(error, IncompleteAnswer):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    # OpenAI's APIConnectionError (and its APITimeoutError subclass) have no HTTP status
+    return isinstance(error, (ConnectionError, TimeoutError)) or any(
+        cls.__name__ == "APIConnectionError" for cls in type(error).__mro__)
+
+def _retry_after(error: Exception) -> Optional[float]:
+    # OpenAI rate limit errors carry the HTTP response and its Retry-After header
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after")) if headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
+
+def get_techniques_and_failures(client, ref_id: str, title: str, description: str, guideline_description: str = "",
+                                special_cases: List[str] = None, limiter: Optional[TokenBucket] = None,
+                                retries: int = 3, backoff: float = 2.0, model: str = "gpt-4o",
+                                sleep: Callable[[float], None] = time.sleep) -> Tuple[str, List[str], List[str]]:
     """
     Use OpenAI to generate relevant techniques and failures for a WCAG criterion.
-    Rate limits requests to avoid hitting OpenAI's rate limits.
+    Requests go through the shared rate limiter; transient failures (rate limits, server and
+    connection errors) and unparseable answers are retried with exponential backoff, and the
+    error is raised right away for anything else or once the retries are exhausted.
     """
-    print(f"\nGenerating content for {ref_id} - {title}")
-    print(f"Description: {description[:100]}...")
+    print(f"Generating content for {ref_id} - {title}")
     
     # Build context with guideline description and special cases
     context = f"Guideline Context: {guideline_description}\n" if guideline_description else ""
@@ -44,61 +129,31 @@ FAILURES
 - Not providing alternative text for images
 """
     
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a WCAG accessibility expert."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=700
-        )
-        
-        # Parse response
-        content = response.choices[0].message.content
-        description = ""
-        techniques = []
-        failures = []
-        
-        current_section = None
-        description_lines = []
-        
-        for line in content.split('\n'):
-            line = line.strip()
-            if line == 'DESCRIPTION':
-                current_section = 'description'
-            elif line == 'TECHNIQUES':
-                current_section = 'techniques'
-            elif line == 'FAILURES':
-                current_section = 'failures'
-            elif line:
-                if current_section == 'description':
-                    description_lines.append(line)
-                elif current_section == 'techniques' and line.startswith('- '):
-                    techniques.append(line[2:])
-                elif current_section == 'failures' and line.startswith('- '):
-                    failures.append(line[2:])
-        
-        description = ' '.join(description_lines)
-        
-        print("\nGenerated content:")
-        print("Description:", description)
-        print("\nTechniques:")
-        for t in techniques:
-            print(f"  - {t}")
-        print("Failures:")
-        for f in failures:
-            print(f"  - {f}")
-        
-        # Sleep to avoid rate limits (1 second between requests)
-        print("\nWaiting a second before next request...")
-        time.sleep(1)
-        
-        return description, techniques, failures
-    except Exception as e:
-        print(f"Error generating content for {ref_id}: {str(e)}")
-        return "", [], []
+    attempt = 0
+    while True:
+        try:
+            if limiter:
+                limiter.acquire()
+            response = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": "You are a WCAG accessibility expert."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=700
+            )
+            description, techniques, failures = parse_content(response.choices[0].message.content)
+            if not description or not techniques or not failures:
+                raise IncompleteAnswer("incomplete answer (missing description, techniques or failures)")
+            return description, techniques, failures
+        except Exception as e:
+            if attempt >= retries or not _is_transient(e):
+                raise
+            delay = _retry_after(e) or backoff * (2 ** attempt) + random.uniform(0, backoff)
+            print(f"Error generating content for {ref_id} (attempt {attempt + 1}): {e}, retrying in {delay:.1f}s")
+            sleep(delay)
+            attempt += 1
 
 def extract_success_criteria(data: List[Dict]) -> List[Dict]:
     """Extract all success criteria from the old WCAG format"""
@@ -118,57 +173,188 @@ def extract_success_criteria(data: List[Dict]) -> List[Dict]:
                 })
     return criteria
 
-def main():
-    # Load environment variables from .env file
-    load_dotenv()
-    
-    # Initialize OpenAI client
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    if not openai_api_key:
-        raise ValueError("OPENAI_API_KEY not found in environment variables")
-    client = OpenAI(api_key=openai_api_key)
-    
-    # Load original WCAG data
-    with open("data/wcag.json", "r") as f:
-        data = json.load(f)
-    
-    # Extract success criteria
-    criteria = extract_success_criteria(data)
-    
-    # Generate techniques and failures for each criterion
-    guidelines = []
+class Journal:
+    """Append-only JSONL checkpoint of the criteria generated so far (one line per criterion)"""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict]:
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a run killed mid-write leaves a truncated last line; that criterion is redone
+                    continue
+                entries[entry["ref_id"]] = entry
+        return entries
+
+    def append(self, entry: Dict):
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def _split_name(name: str) -> Tuple[str, str]:
+    return name.split(" ")[0], " ".join(name.split(" ")[1:])
+
+def transform(criteria: List[Dict], client, journal: Journal, workers: int = 4, limiter: Optional[TokenBucket] = None,
+              only: Optional[List[str]] = None, retries: int = 3, model: str = "gpt-4o",
+              previous: Optional[Dict[str, Dict]] = None) -> Tuple[List[Dict], List[str]]:
+    """
+    Generate the guidelines of every criterion concurrently, checkpointing each one to the journal.
+
+    Criteria already in the journal are reused (unless selected with only), so a crashed run
+    resumes where it stopped; criteria outside of only, and criteria that failed, are taken
+    from the journal or from the previous output. Returns the guidelines in criteria order and
+    the ref_ids that failed.
+    """
+    done = journal.load()
+    previous = previous or {}
+    selected = set(only) if only else None
+    todo = []
     for criterion in criteria:
-        name = criterion["name"]
-        ref_id = name.split(" ")[0]
-        title = " ".join(name.split(" ")[1:])
-        
+        ref_id, _ = _split_name(criterion["name"])
+        if selected is not None:
+            if ref_id in selected:
+                todo.append(criterion)
+        elif ref_id not in done:
+            todo.append(criterion)
+    print(f"{len(criteria)} criteria, {len(todo)} to generate with {workers} worker(s)")
+
+    generated = {}
+    failed = []
+
+    def generate(criterion):
+        ref_id, title = _split_name(criterion["name"])
         description, techniques, failures = get_techniques_and_failures(
             client,
             ref_id,
             title,
             criterion["description"],
             criterion["guideline_description"],
-            criterion.get("special_cases", [])
+            criterion.get("special_cases", []),
+            limiter=limiter,
+            retries=retries,
+            model=model
         )
-        
-        guidelines.append({
-            "name": name,
+        entry = {
+            "ref_id": ref_id,
+            "name": criterion["name"],
             "level": criterion["level"],
-            "description": description or criterion["description"],  # Fall back to original if generation fails
+            "description": description,
             "url": criterion["url"],
             "techniques": techniques,
             "failures": failures
-        })
-    
+        }
+        journal.append(entry)
+        return entry
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(generate, criterion): criterion for criterion in todo}
+        for i, future in enumerate(as_completed(futures), 1):
+            ref_id, _ = _split_name(futures[future]["name"])
+            try:
+                generated[ref_id] = future.result()
+                print(f"[{i}/{len(todo)}] {ref_id} done")
+            except Exception as e:
+                failed.append(ref_id)
+                print(f"[{i}/{len(todo)}] Error generating content for {ref_id}: {e}")
+
+    guidelines = []
+    for criterion in criteria:
+        ref_id, _ = _split_name(criterion["name"])
+        entry = generated.get(ref_id) or done.get(ref_id) or previous.get(ref_id)
+        if entry:
+            guidelines.append({key: entry[key] for key in ("name", "level", "description", "url", "techniques", "failures")})
+        else:
+            # Fall back to the original description if generation failed and there is no previous output
+            guidelines.append({
+                "name": criterion["name"],
+                "level": criterion["level"],
+                "description": criterion["description"],
+                "url": criterion["url"],
+                "techniques": [],
+                "failures": []
+            })
+    return guidelines, sorted(failed)
+
+def main(argv: Optional[List[str]] = None, client=None):
+    parser = argparse.ArgumentParser(description="Generate descriptions, techniques and failures for every WCAG success criterion")
+    parser.add_argument("--input", default="data/wcag.json")
+    parser.add_argument("--output", default="data/wcag_2_2_new.json")
+    parser.add_argument("--journal", help=f"checkpoint file (default: <output>{DEFAULT_JOURNAL_SUFFIX})")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=60, help="maximum OpenAI requests per minute")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--only", help="comma separated ref_ids to (re)generate, e.g. 1.1.1,1.4.3")
+    parser.add_argument("--fresh", action="store_true", help="ignore the journal of a previous run")
+    args = parser.parse_args(argv)
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+    # Initialize OpenAI client
+    if client is None:
+        from openai import OpenAI
+        openai_api_key = os.getenv("OPENAI_API_KEY")
+        if not openai_api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables")
+        # retries are handled here, with the shared rate limiter
+        client = OpenAI(api_key=openai_api_key, max_retries=0)
+
+    # Load original WCAG data
+    with open(args.input, "r") as f:
+        data = json.load(f)
+
+    # Extract success criteria
+    criteria = extract_success_criteria(data)
+    only = [ref_id.strip() for ref_id in args.only.split(",") if ref_id.strip()] if args.only else None
+    if only:
+        unknown = set(only) - {_split_name(criterion["name"])[0] for criterion in criteria}
+        if unknown:
+            raise ValueError(f"Unknown ref_ids: {', '.join(sorted(unknown))}")
+
+    journal = Journal(args.journal or args.output + DEFAULT_JOURNAL_SUFFIX)
+    if args.fresh:
+        journal.remove()
+    # the existing output stands in for whatever isn't generated now (not selected, or failed)
+    previous = {}
+    if os.path.exists(args.output):
+        with open(args.output, "r") as f:
+            previous = {_split_name(guideline["name"])[0]: guideline for guideline in json.load(f)["guidelines"]}
+
+    limiter = TokenBucket(rate=args.rpm / 60.0, capacity=max(1, args.workers))
+    guidelines, failed = transform(criteria, client, journal, workers=args.workers, limiter=limiter, only=only,
+                                   retries=args.retries, model=args.model, previous=previous)
+
+    if failed:
+        # keep the existing output intact; what did succeed is in the journal for the next run
+        print(f"\n{len(failed)} criteria failed ({', '.join(failed)}); {args.output} was not written, "
+              f"run again to resume from {journal.path}")
+        return 1
+
     # Save transformed data
     output = {
         "guidelines": guidelines
     }
-    
-    with open("data/wcag_2_2_new.json", "w") as f:
+
+    with open(args.output, "w") as f:
         json.dump(output, f, indent=4)
-    
-    print("\nTransformation complete! New data saved to data/wcag_2_2_new.json")
+
+    journal.remove()
+    print(f"\nTransformation complete! New data saved to {args.output}")
+    return 0
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())